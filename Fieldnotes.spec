@@ -11,7 +11,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=datas,
-    hiddenimports=['PyQt6', 'PyQt6.QtCore', 'PyQt6.QtGui', 'PyQt6.QtWidgets', 'PyQt6.QtPrintSupport', 'PyQt6.sip', 'docx', 'docx.oxml', 'docx.oxml.ns', 'pandas', 'sqlite3', 'database', 'gui', 'exporter', 'theme', 'logger', 'difflib', 'ai_backend', 'ai_prompts', 'ai_widgets'],
+    hiddenimports=['PyQt6', 'PyQt6.QtCore', 'PyQt6.QtGui', 'PyQt6.QtWidgets', 'PyQt6.QtPrintSupport', 'PyQt6.sip', 'docx', 'docx.oxml', 'docx.oxml.ns', 'pandas', 'sqlite3', 'database', 'dedup', 'backup', 'write_queue', 'relevance', 'query_log', 'sync', 'gui', 'exporter', 'theme', 'logger', 'difflib', 'ai_backend', 'ai_prompts', 'ai_widgets'],
     hookspath=['hooks'],
     hooksconfig={},
     runtime_hooks=['hooks/rthook_qt_permissions.py'],
@@ -0,0 +1,606 @@
+"""
+增量备份模块 - 按页内容寻址、压缩去重的数据库快照
+
+每次备份在一个读事务中取得数据库的一致内存镜像（不写磁盘），再按数据库页切分：
+每页以 SHA-256 作为对象名、zlib 压缩后存入 objects/ 目录，已存在的页不再写入。
+快照清单（snapshots/*.json）只记录相对上一快照变化的页，多个快照组成一条链，
+链长达到 MAX_CHAIN_LENGTH 后重新生成完整清单作为新链的起点。
+超过 MEMORY_IMAGE_MAX_BYTES 的数据库改用在线备份 API 写出临时副本再切页，以限制内存占用。
+保留策略以整条链为单位清理，删除清单后回收不再被引用的页对象。
+写入页对象到写入清单之间持有仓库锁（<root>/lock），清理与回收在同一把锁下进行，
+不会把正在创建的快照的页对象当作无引用删除（多个线程、进程或命令行同时操作同一仓库时）。
+
+命令行用法：
+    python backup.py list
+    python backup.py create <数据库路径>
+    python backup.py verify [快照ID]
+    python backup.py restore <快照ID> <目标路径> [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# 默认备份目录
+DEFAULT_BACKUP_DIR = os.path.join(os.path.expanduser("~"), ".fieldnote", "backups")
+
+# 快照清单格式版本
+MANIFEST_VERSION = 1
+
+# 一条快照链的最大快照数（含起点的完整快照），达到后重新生成完整快照
+MAX_CHAIN_LENGTH = 14
+
+# 快照链保留天数（以链中最新快照的时间计）
+RETENTION_DAYS = 30
+
+# 页对象 zlib 压缩级别
+COMPRESS_LEVEL = 6
+
+# 数据库不超过该大小时在内存中切页；更大的数据库先写出临时副本（备份写入量多一份整库）
+MEMORY_IMAGE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class SnapshotError(Exception):
+    """快照不存在、清单损坏或页对象缺失"""
+
+
+@dataclass
+class SnapshotInfo:
+    """快照摘要"""
+    snapshot_id: str
+    created_at: str
+    source: str
+    parent: Optional[str]
+    page_size: int
+    page_count: int
+    sha256: str
+    changed_pages: int      # 清单中记录的页数（完整快照为全部页）
+    new_objects: int        # 本次新写入的页对象数
+    stored_bytes: int       # 本次新写入的压缩字节数
+
+    @property
+    def is_base(self) -> bool:
+        """是否为链起点（完整快照）"""
+        return self.parent is None
+
+
+class SnapshotStore:
+    """
+    内容寻址的快照仓库
+
+    目录结构：
+        <root>/objects/ab/abcdef...   zlib 压缩的数据库页
+        <root>/snapshots/<id>.json    快照清单
+        <root>/tmp/                   备份过程中的临时文件
+        <root>/lock                   仓库锁（创建、清理、回收互斥）
+    """
+
+    def __init__(self, root: str = DEFAULT_BACKUP_DIR):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.lock_path = os.path.join(self.root, "lock")
+
+    @contextmanager
+    def _locked(self):
+        """持有仓库锁（进程退出时由系统释放，不会残留；不可重入）"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, "a+b") as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    # ------------------------------------------------------------------
+    # 清单读写
+    # ------------------------------------------------------------------
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+
+    def _load_manifest(self, snapshot_id: str) -> dict:
+        path = self._manifest_path(snapshot_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"快照不存在: {snapshot_id}") from None
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"快照清单无法读取: {snapshot_id} ({e})") from None
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise SnapshotError(f"不支持的快照清单版本: {snapshot_id}")
+        return manifest
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        path = self._manifest_path(manifest["id"])
+        temp_path = path + ".part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _info(manifest: dict, new_objects: int = 0, stored_bytes: int = 0) -> SnapshotInfo:
+        return SnapshotInfo(
+            snapshot_id=manifest["id"],
+            created_at=manifest["created_at"],
+            source=manifest["source"],
+            parent=manifest["parent"],
+            page_size=manifest["page_size"],
+            page_count=manifest["page_count"],
+            sha256=manifest["sha256"],
+            changed_pages=len(manifest["pages"]),
+            new_objects=new_objects,
+            stored_bytes=stored_bytes,
+        )
+
+    def _manifests(self) -> List[dict]:
+        """全部快照清单，按创建时间排序（损坏的清单记录日志后跳过）"""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        manifests = []
+        for name in os.listdir(self.snapshots_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                manifests.append(self._load_manifest(name[:-len(".json")]))
+            except SnapshotError as e:
+                logger.warning("跳过快照清单: %s", e)
+        manifests.sort(key=lambda m: (m["created_at"], m["id"]))
+        return manifests
+
+    def list_snapshots(self, source: Optional[str] = None) -> List[SnapshotInfo]:
+        """
+        列出快照（按时间升序）
+
+        Args:
+            source: 只列出该数据库文件的快照，None 表示全部
+        """
+        if source is not None:
+            source = os.path.abspath(source)
+        return [self._info(m) for m in self._manifests()
+                if source is None or m["source"] == source]
+
+    def latest(self, source: Optional[str] = None) -> Optional[SnapshotInfo]:
+        """最新快照，没有则返回 None"""
+        snapshots = self.list_snapshots(source)
+        return snapshots[-1] if snapshots else None
+
+    def _resolve_pages(self, snapshot_id: str) -> Tuple[dict, List[str]]:
+        """沿快照链回溯，得到快照的完整页哈希列表"""
+        chain = []
+        current = snapshot_id
+        while current is not None:
+            manifest = self._load_manifest(current)
+            chain.append(manifest)
+            current = manifest["parent"]
+        chain.reverse()
+
+        pages: List[str] = []
+        for manifest in chain:
+            del pages[manifest["page_count"]:]
+            for index, digest in manifest["pages"]:
+                if index < len(pages):
+                    pages[index] = digest
+                elif index == len(pages):
+                    pages.append(digest)
+                else:
+                    raise SnapshotError(f"快照清单页序号不连续: {manifest['id']}")
+        if len(pages) != chain[-1]["page_count"]:
+            raise SnapshotError(f"快照页数不一致: {snapshot_id}")
+        return chain[-1], pages
+
+    # ------------------------------------------------------------------
+    # 页对象
+    # ------------------------------------------------------------------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _put_object(self, digest: str, data: bytes) -> int:
+        """写入页对象，已存在则跳过；返回新写入的字节数"""
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        temp_path = path + ".part"
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return len(compressed)
+
+    def _get_object(self, digest: str) -> bytes:
+        """读取并校验页对象"""
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            raise SnapshotError(f"页对象缺失: {digest}") from None
+        except (OSError, zlib.error) as e:
+            raise SnapshotError(f"页对象损坏: {digest} ({e})") from None
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise SnapshotError(f"页对象校验失败: {digest}")
+        return data
+
+    # ------------------------------------------------------------------
+    # 创建 / 恢复 / 校验
+    # ------------------------------------------------------------------
+
+    def create(self, db, progress_callback: Optional[Callable[[int, int], None]] = None
+               ) -> SnapshotInfo:
+        """
+        为数据库创建增量快照
+
+        Args:
+            db: CorpusDatabase 实例（使用其 serialize / backup_to 获取一致内容，可在后台线程调用）
+            progress_callback: 进度回调 (已处理页数, 总页数)；经临时副本时前半为在线备份，
+                后半为切页入库
+
+        Returns:
+            新快照的 SnapshotInfo
+        """
+        source = os.path.abspath(db.db_path)
+        now = datetime.now()
+        snapshot_id = now.strftime("%Y%m%d_%H%M%S_%f")
+
+        image = db.serialize(MEMORY_IMAGE_MAX_BYTES)
+        if image is not None:
+            with self._locked():
+                info = self._store_image(io.BytesIO(image), len(image), source, snapshot_id, now,
+                                         progress_callback or (lambda done, total: None))
+        else:
+            info = self._create_from_copy(db, source, snapshot_id, now, progress_callback)
+        logger.info("快照已创建: %s（变化页 %d/%d，新对象 %d，%d 字节）",
+                    info.snapshot_id, info.changed_pages, info.page_count,
+                    info.new_objects, info.stored_bytes)
+        return info
+
+    def _create_from_copy(self, db, source: str, snapshot_id: str, now: datetime,
+                          progress_callback: Optional[Callable[[int, int], None]]
+                          ) -> SnapshotInfo:
+        """经在线备份的临时副本创建快照（数据库超过 MEMORY_IMAGE_MAX_BYTES 时）"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        temp_path = os.path.join(self.tmp_dir, f"{snapshot_id}.db")
+
+        def on_backup_progress(done, total):
+            if progress_callback:
+                progress_callback(done, total * 2)
+
+        def on_store_progress(done, total):
+            if progress_callback:
+                progress_callback(total + done, total * 2)
+
+        try:
+            db.backup_to(temp_path, on_backup_progress)
+            with self._locked(), open(temp_path, "rb") as f:
+                return self._store_image(f, os.path.getsize(temp_path), source, snapshot_id,
+                                         now, on_store_progress)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _store_image(self, f, size: int, source: str, snapshot_id: str, now: datetime,
+                     progress_callback: Callable[[int, int], None]) -> SnapshotInfo:
+        """
+        把数据库内容切页入库并写入清单（调用方持有仓库锁）
+
+        Args:
+            f: 数据库内容（二进制文件对象，位于开头）
+            size: 内容字节数
+            progress_callback: 进度回调 (已切页数, 总页数)
+        """
+        page_size = _read_page_size(f.read(100))
+        f.seek(0)
+        page_count = size // page_size
+
+        parent_pages: List[str] = []
+        parent_id = None
+        previous = [m for m in self._manifests() if m["source"] == source]
+        if previous:
+            chain_length = 0
+            for manifest in reversed(previous):
+                chain_length += 1
+                if manifest["parent"] is None:
+                    break
+            last = previous[-1]
+            if chain_length < MAX_CHAIN_LENGTH and last["page_size"] == page_size:
+                try:
+                    _, parent_pages = self._resolve_pages(last["id"])
+                    parent_id = last["id"]
+                except SnapshotError as e:
+                    logger.warning("上一快照不可用，改为完整快照: %s", e)
+
+        changes = []
+        new_objects = 0
+        stored_bytes = 0
+        file_hash = hashlib.sha256()
+        for index in range(page_count):
+            data = f.read(page_size)
+            file_hash.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            if index >= len(parent_pages) or parent_pages[index] != digest:
+                changes.append([index, digest])
+            written = self._put_object(digest, data)
+            if written:
+                new_objects += 1
+                stored_bytes += written
+            if (index + 1) % 256 == 0:
+                progress_callback(index + 1, page_count)
+        progress_callback(page_count, page_count)
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": snapshot_id,
+            "created_at": now.isoformat(timespec="seconds"),
+            "source": source,
+            "parent": parent_id,
+            "page_size": page_size,
+            "page_count": page_count,
+            "sha256": file_hash.hexdigest(),
+            "pages": changes,
+        }
+        self._write_manifest(manifest)
+        return self._info(manifest, new_objects, stored_bytes)
+
+    def restore(self, snapshot_id: str, target_path: str,
+                progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
+        """
+        将快照恢复为数据库文件（先写临时文件，全部校验通过后再替换目标）
+
+        Args:
+            snapshot_id: 快照 ID
+            target_path: 目标数据库路径（已存在则覆盖，恢复前应关闭使用该文件的程序）
+            progress_callback: 进度回调 (已写入页数, 总页数)
+
+        Returns:
+            目标文件路径
+
+        Raises:
+            SnapshotError: 快照不存在或数据校验失败
+        """
+        manifest, pages = self._resolve_pages(snapshot_id)
+        target_path = os.path.abspath(target_path)
+        temp_path = target_path + ".part"
+        file_hash = hashlib.sha256()
+        try:
+            with open(temp_path, "wb") as f:
+                for index, digest in enumerate(pages):
+                    data = self._get_object(digest)
+                    file_hash.update(data)
+                    f.write(data)
+                    if progress_callback and ((index + 1) % 256 == 0 or index + 1 == len(pages)):
+                        progress_callback(index + 1, len(pages))
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise SnapshotError(f"恢复结果校验失败: {snapshot_id}")
+            # 旧库残留的 WAL/SHM 不属于恢复出的数据库
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(target_path + suffix):
+                    os.remove(target_path + suffix)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        logger.info("快照 %s 已恢复到: %s", snapshot_id, target_path)
+        return target_path
+
+    def verify(self, snapshot_id: Optional[str] = None) -> List[str]:
+        """
+        校验快照：清单链完整、页对象存在且哈希一致、整库哈希一致
+
+        Args:
+            snapshot_id: 快照 ID，None 表示校验全部快照
+
+        Returns:
+            问题列表，空列表表示校验通过
+        """
+        if snapshot_id is None:
+            ids = [m["id"] for m in self._manifests()]
+        else:
+            ids = [snapshot_id]
+        problems = []
+        for sid in ids:
+            try:
+                manifest, pages = self._resolve_pages(sid)
+                file_hash = hashlib.sha256()
+                for digest in pages:
+                    file_hash.update(self._get_object(digest))
+            except SnapshotError as e:
+                problems.append(f"{sid}: {e}")
+                continue
+            if file_hash.hexdigest() != manifest["sha256"]:
+                problems.append(f"{sid}: 整库校验失败")
+        return problems
+
+    # ------------------------------------------------------------------
+    # 保留策略
+    # ------------------------------------------------------------------
+
+    def prune(self, retention_days: int = RETENTION_DAYS, now: Optional[datetime] = None) -> int:
+        """
+        按快照链清理过期快照并回收无引用的页对象
+
+        一条链（完整快照及其后续增量）只有在链中最新快照也超过保留期时才整体删除；
+        每个数据库最新的一条链始终保留。同时清理旧版本留下的 corpus_*.db 完整备份。
+
+        Returns:
+            删除的快照数
+        """
+        cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+        with self._locked():
+            removed = self._prune_chains(cutoff)
+            if removed:
+                self._collect_garbage()
+        self._prune_legacy(cutoff)
+        return removed
+
+    def _prune_chains(self, cutoff: datetime) -> int:
+        """删除最新快照早于 cutoff 的快照链（调用方持有仓库锁），返回删除的快照数"""
+        chains: Dict[str, List[dict]] = {}
+        base_of: Dict[str, str] = {}
+        for manifest in self._manifests():
+            base = base_of.get(manifest["parent"], manifest["id"])
+            base_of[manifest["id"]] = base
+            chains.setdefault(base, []).append(manifest)
+
+        latest_chain = {}
+        for base, members in chains.items():
+            latest_chain[members[-1]["source"]] = base  # _manifests 已按时间排序
+        removed = 0
+        for base, members in chains.items():
+            if latest_chain.get(members[-1]["source"]) == base:
+                continue
+            if datetime.fromisoformat(members[-1]["created_at"]) >= cutoff:
+                continue
+            for manifest in reversed(members):
+                os.remove(self._manifest_path(manifest["id"]))
+                removed += 1
+            logger.info("已清理过期快照链: %s（%d 个快照）", base, len(members))
+        return removed
+
+    def collect_garbage(self) -> int:
+        """删除不被任何快照引用的页对象，返回删除的对象数"""
+        with self._locked():
+            return self._collect_garbage()
+
+    def _collect_garbage(self) -> int:
+        """collect_garbage 的实现（调用方持有仓库锁）"""
+        referenced = set()
+        for manifest in self._manifests():
+            referenced.update(digest for _, digest in manifest["pages"])
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        for prefix in os.listdir(self.objects_dir):
+            directory = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name not in referenced:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        if removed:
+            logger.info("已回收页对象: %d", removed)
+        return removed
+
+    def _prune_legacy(self, cutoff: datetime):
+        """清理旧版本的 corpus_*.db 完整备份"""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if not (name.startswith("corpus_") and name.endswith(".db")):
+                continue
+            filepath = os.path.join(self.root, name)
+            try:
+                if datetime.fromtimestamp(os.path.getmtime(filepath)) < cutoff:
+                    os.remove(filepath)
+                    logger.info("已清理旧备份: %s", filepath)
+            except OSError:
+                pass
+
+
+def _lock_file(f):
+    """对已打开的锁文件加排他锁（阻塞直到获得）"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK 重试约 10 秒后仍未获得
+            continue
+
+
+def _unlock_file(f):
+    """释放 _lock_file 加的锁"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_page_size(header: bytes) -> int:
+    """从 SQLite 文件头读取页大小（偏移 16，大端 2 字节，1 表示 65536）"""
+    if len(header) < 100 or not header.startswith(b"SQLite format 3\x00"):
+        raise SnapshotError("不是有效的 SQLite 数据库内容")
+    page_size = int.from_bytes(header[16:18], "big")
+    return 65536 if page_size == 1 else page_size
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口：list / create / verify / restore"""
+    parser = argparse.ArgumentParser(prog="backup.py", description="Fieldnotes 增量快照备份")
+    parser.add_argument("--store", default=DEFAULT_BACKUP_DIR, help="快照仓库目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出快照")
+    create_cmd = commands.add_parser("create", help="为数据库创建快照")
+    create_cmd.add_argument("database")
+    verify_cmd = commands.add_parser("verify", help="校验快照（默认全部）")
+    verify_cmd.add_argument("snapshot_id", nargs="?")
+    restore_cmd = commands.add_parser("restore", help="将快照恢复为数据库文件")
+    restore_cmd.add_argument("snapshot_id")
+    restore_cmd.add_argument("target")
+    restore_cmd.add_argument("--force", action="store_true", help="覆盖已存在的目标文件")
+    prune_cmd = commands.add_parser("prune", help="按保留策略清理过期快照链")
+    prune_cmd.add_argument("--days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    try:
+        if args.command == "list":
+            for info in store.list_snapshots():
+                kind = "完整" if info.is_base else "增量"
+                print(f"{info.snapshot_id}  {info.created_at}  {kind}  "
+                      f"{info.changed_pages}/{info.page_count} 页  {info.source}")
+        elif args.command == "create":
+            from database import CorpusDatabase
+            db = CorpusDatabase(args.database)
+            try:
+                info = store.create(db)
+            finally:
+                db.close()
+            print(f"快照已创建: {info.snapshot_id}")
+        elif args.command == "verify":
+            problems = store.verify(args.snapshot_id)
+            for problem in problems:
+                print(problem, file=sys.stderr)
+            if problems:
+                return 1
+            print("校验通过")
+        elif args.command == "restore":
+            if os.path.exists(args.target) and not args.force:
+                print(f"目标文件已存在（使用 --force 覆盖）: {args.target}", file=sys.stderr)
+                return 1
+            print(f"已恢复到: {store.restore(args.snapshot_id, args.target)}")
+        elif args.command == "prune":
+            print(f"已清理快照: {store.prune(args.days)}")
+    except SnapshotError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
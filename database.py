@@ -3,28 +3,540 @@
 """
 import sqlite3
 import os
+import json
 import logging
-import difflib
-import shutil
-import glob as glob_mod
+import queue
+import re
+import threading
+import unicodedata
+import uuid
+from functools import lru_cache
+from contextlib import contextmanager
+from collections import Counter
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields
+from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+
+try:
+    # 私有模块（3.11 前名为 sre_parse），仅用于提取正则中的必含字面量；缺失时不做预筛选
+    from re import _parser as _sre_parse
+except ImportError:
+    _sre_parse = None
+
+import backup
+import dedup
+import query_log
+import relevance
+import sync
 
 logger = logging.getLogger(__name__)
 
 # 当前 schema 版本
-SCHEMA_VERSION = 4
+SCHEMA_VERSION = 17
+
+# 参与全文检索的字段（search_entries 可搜索字段）
+SEARCH_FIELDS = ["example_id", "source_text", "gloss", "translation", "notes"]
+
+# trigram 分词器要求检索词至少 3 个字符，更短的检索词回退到 LIKE
+FTS_MIN_KEYWORD_LENGTH = 3
+
+# 忽略变音符/声调检索用的折叠影子列（字段名 + "_key"）
+FOLD_KEY_COLUMNS = [f"{f}_key" for f in SEARCH_FIELDS]
+
+# 重建 n-gram 倒排表时每批处理的条目数（限制内存占用）
+NGRAM_SYNC_BATCH = 1000
+
+# 各分组类型的编号前缀（编号 = 前缀 + 三位以上序号，序号由 group_sequences 分配）
+GROUP_ID_PREFIXES = {"discourse": "DSC", "dialogue": "DLG"}
+
+# 变更日志超过该行数时，关闭数据库前自动压缩（每个条目只保留最新一条）
+CHANGE_LOG_COMPACT_ROWS = 50000
+
+# ANALYZE / PRAGMA optimize 每个索引抽样的行数上限（大库上打开/关闭也只需几毫秒）
+ANALYSIS_LIMIT = 1000
+
+# 折叠时删除的声调符号：上标/下标数字、五度标记调符（˥˦˧˨˩）及修饰性调符
+_TONE_MARKS = frozenset(
+    "⁰¹²³⁴⁵⁶⁷⁸⁹₀₁₂₃₄₅₆₇₈₉"
+    + "".join(chr(c) for c in range(0x02E5, 0x02EA))
+    + "".join(chr(c) for c in range(0xA700, 0xA720))
+)
+
+
+def fold_key(text: Optional[str]) -> Optional[str]:
+    """
+    计算检索折叠键：NFD 分解后去掉组合附加符号和声调符号，再做大小写折叠
+
+    例如 "Tá"、"ta⁵⁵"、"ta˥˥" 都折叠为 "ta"，NFC 与 NFD 输入结果一致。
+    """
+    if text is None:
+        return None
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(
+        ch for ch in decomposed
+        if not unicodedata.combining(ch) and ch not in _TONE_MARKS
+    ).casefold()
+
+
+def fts5_available() -> bool:
+    """检测当前 SQLite 是否编译了 FTS5 及 trigram 分词器"""
+    try:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE fts_probe USING fts5(x, tokenize='trigram')")
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+# 迭代器 API 每页读取的行数
+ITER_PAGE_SIZE = 500
+
+# 后台线程只读连接池的最大连接数
+READER_POOL_SIZE = 4
+
+# 批量导入时每个 executemany 块的默认行数
+IMPORT_CHUNK_SIZE = 1000
+
+# 批量导入期间的页缓存上限（KiB，按需分配）：全文索引合并时反复读取的页留在内存中
+IMPORT_CACHE_KIB = 256 * 1024
+
+# 批量导入期间暂停的逐行触发器：全文索引与词频表在全部行写入后各用一条 INSERT ... SELECT 补齐
+_IMPORT_SUSPENDED_TRIGGERS = ("corpus_fts_ai", "corpus_fold_fts_ai", "tokens_ai")
+
+# 在线备份每一步复制的页数（默认页大小 4KB，约 1MB 一步）
+BACKUP_PAGES_PER_STEP = 256
+
+# REGEXP 函数缓存的已编译正则个数
+REGEX_CACHE_SIZE = 128
+
+_INSERT_SQL = """
+    INSERT INTO corpus (example_id, source_text, gloss, translation, notes,
+                        source_text_cn, gloss_cn, translation_cn,
+                        entry_type, group_ref, speaker_ref, turn_number,
+                        created_at, updated_at, tags, uid, {})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {})
+""".format(", ".join(FOLD_KEY_COLUMNS), ", ".join("?" * len(FOLD_KEY_COLUMNS)))
+
+# 同步时比较/复制的条目内容（分组按 uid 对应，编号可能因冲突在两边不同，名称单独同步）
+_SYNC_CONTENT_COLUMNS = (
+    "example_id", "source_text", "gloss", "translation", "notes",
+    "source_text_cn", "gloss_cn", "translation_cn", "entry_type", "turn_number", "tags",
+)
+_SYNC_SELECT = ", ".join(f"c.{name}" for name in _SYNC_CONTENT_COLUMNS) + """,
+    g.uid AS group_uid, s.name AS speaker"""
+_SYNC_FROM = """
+    FROM corpus c
+    LEFT JOIN groups g ON g.id = c.group_ref
+    LEFT JOIN speakers s ON s.id = c.speaker_ref
+"""
+_SYNC_DIGEST_SQL = f"SELECT c.uid, c.updated_at, {_SYNC_SELECT} {_SYNC_FROM}"
+_SYNC_GROUPS_SQL = "SELECT uid, name, updated_at FROM groups"
+_TOMBSTONES_SQL = "SELECT uid, deleted_at FROM tombstones"
+
+
+def _sync_digests(rows) -> Dict[str, Tuple[str, bytes]]:
+    """_SYNC_DIGEST_SQL 的结果 -> {uid: (updated_at, 行哈希)}"""
+    return {row[0]: (row[1] or "", sync.row_hash(row[2:])) for row in rows}
+
+
+# 同步写入的 corpus 列（末尾为 uid）。收到的行先写入临时表，再用整批的 UPDATE（关联子查询，
+# 不用 SQLite 3.33 才支持的 UPDATE ... FROM）/ INSERT ... SELECT 写入 corpus：
+# 全文索引触发器每条语句有固定开销，逐行执行慢两个数量级。
+# 已有的行只 SET 值不同的列，未变的检索字段不会触发全文索引的删除/重建；
+# 不用 UPSERT：其冲突处理会覆盖触发器中的 INSERT OR IGNORE。
+_SYNC_WRITE_COLUMNS = _SYNC_CONTENT_COLUMNS + (
+    "group_ref", "speaker_ref", "created_at", "updated_at", "uid"
+)
+
+# 带有任一指定标签（JSON 数组参数）的条目 ID 子查询（{schema} 为联合检索时的库名前缀）
+_TAGGED_IDS_TEMPLATE = """
+    SELECT et.entry_id FROM {schema}entry_tags et JOIN {schema}tags t ON t.id = et.tag_id
+    WHERE t.name IN (SELECT value FROM json_each(?))
+"""
+_TAGGED_IDS_SQL = _TAGGED_IDS_TEMPLATE.format(schema="")
+
+
+def _split_tags(tags: str) -> List[str]:
+    """拆分逗号分隔的标签字符串（去空白、去重、保持顺序）"""
+    result = []
+    for tag in (tags or "").split(","):
+        tag = tag.strip()
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+
+def _utc_now() -> str:
+    """
+    当前 UTC 时间戳（created_at / updated_at）
+
+    固定到毫秒，与触发器 strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') 写入的时间格式相同，
+    两者可以直接按字符串比较（同步时比较修改时间与删除时间）。
+    """
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _json_ids(entry_ids) -> str:
+    """将 ID 列表编码为 JSON 数组，配合 json_each() 作为单个 SQL 参数传入"""
+    return json.dumps([int(i) for i in entry_ids])
+
+
+def _group_prefix(entry_type: str) -> str:
+    """分组类型对应的编号前缀"""
+    return GROUP_ID_PREFIXES.get(entry_type, GROUP_ID_PREFIXES["dialogue"])
+
+
+def _import_row(entry: Dict, now: str) -> tuple:
+    """
+    将一条导入记录转换为参数元组（CSV 中的空字段按缺省值处理）
+
+    分组编号、分组名称、说话人仍为文本（第 10~12 项），
+    由 CorpusDatabase._ref_row 换成 groups / speakers 的整数键后再 INSERT。
+    折叠检索键随行计算（末尾各项），不再另行 UPDATE。
+    """
+    if not isinstance(entry, dict):
+        raise TypeError(f"记录格式错误: {type(entry).__name__}")
+    turn_number = entry.get("turn_number")
+    if turn_number in ("", None):
+        turn_number = None
+    else:
+        turn_number = int(turn_number)
+    searchable = (entry.get("example_id", ""), entry.get("source_text", ""),
+                  entry.get("gloss", ""), entry.get("translation", ""), entry.get("notes", ""))
+    return (*searchable,
+            entry.get("source_text_cn", ""), entry.get("gloss_cn", ""),
+            entry.get("translation_cn", ""),
+            entry.get("entry_type") or "sentence", entry.get("group_id", ""),
+            entry.get("group_name", ""), entry.get("speaker", ""), turn_number,
+            now, now, entry.get("tags", ""), uuid.uuid4().hex,
+            *map(fold_key, searchable))
+
+
+def _fts_phrase(keyword: str) -> str:
+    """将检索词转为 FTS5 短语（双引号包裹，内部双引号转义）"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def _compile_regex(pattern: str) -> re.Pattern:
+    """编译正则（LRU 缓存，同一查询中逐行调用 REGEXP 时只编译一次）"""
+    return re.compile(pattern)
+
+
+def _sql_regexp(pattern: Optional[str], value) -> bool:
+    """SQL 函数 regexp(pattern, value)，即 value REGEXP pattern（re.search 语义）"""
+    if pattern is None or value is None:
+        return False
+    return _compile_regex(pattern).search(str(value)) is not None
+
+
+def _register_functions(conn: sqlite3.Connection):
+    """在连接上注册自定义 SQL 函数"""
+    conn.create_function("regexp", 2, _sql_regexp, deterministic=True)
+    conn.create_function("fold_key", 1, fold_key, deterministic=True)
+
+
+def _regex_literal(pattern: str) -> str:
+    """
+    提取正则的每个匹配都必然包含的最长字面子串（用于 FTS 预筛选）
+
+    只看顶层连续的普通字符；含顶层分支（a|b）、无法解析或 re 的内部解析器不可用
+    （其接口不属于公开 API）时返回空串，查询退回为逐行 REGEXP。
+    """
+    if _sre_parse is None:
+        return ""
+    best, run = "", []
+    try:
+        for op, arg in _sre_parse.parse(pattern):
+            if op is _sre_parse.LITERAL:
+                run.append(chr(arg))
+                continue
+            if len(run) > len(best):
+                best = "".join(run)
+            run = []
+    except re.error:
+        return ""
+    except (AttributeError, TypeError, ValueError) as e:
+        logger.debug("正则字面量提取不可用，跳过预筛选: %s", e)
+        return ""
+    if len(run) > len(best):
+        best = "".join(run)
+    return best
+
+
+def _corpus_schema_version(path: str) -> int:
+    """
+    以只读方式读取语料库文件的 schema 版本
+
+    Raises:
+        ValueError: 不是语料库文件
+    """
+    try:
+        conn = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise ValueError(f"无法打开语料库文件: {e}") from e
+    try:
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )}
+        if "corpus" not in tables:
+            raise ValueError(f"不是语料库文件: {path}")
+        if "schema_version" not in tables:
+            return 0
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] or 0
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"不是语料库文件: {path} ({e})") from e
+    finally:
+        conn.close()
+
+
+class _ReaderPool:
+    """
+    只读连接池
+
+    连接以 mode=ro 打开，借出期间由一个线程独占使用，归还后可被其他线程复用。
+    连接数不超过 size，池满时借用方等待。
+    """
+
+    def __init__(self, db_path: str, size: int = READER_POOL_SIZE,
+                 profiler: Optional["query_log.QueryProfiler"] = None):
+        self._db_path = db_path
+        self._uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+        self._profiler = profiler
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._attachments: Dict[str, str] = {}  # 联合检索附加的库 {库名: URI}
+        self._attached: Dict[sqlite3.Connection, Dict[str, str]] = {}
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        if self._profiler is not None:
+            conn = self._profiler.connect(self._uri, self._db_path, uri=True,
+                                          check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _register_functions(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """借用一个只读连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                self._sync_attachments(conn)
+                yield conn
+            finally:
+                self._idle.put(conn)
+
+    def set_attachments(self, attachments: Dict[str, str]):
+        """设置联合检索附加的库（各连接下次借出时同步 ATTACH / DETACH）"""
+        with self._lock:
+            self._attachments = dict(attachments)
+
+    def _sync_attachments(self, conn: sqlite3.Connection):
+        with self._lock:
+            wanted = dict(self._attachments)
+        current = self._attached.get(conn, {})
+        if current == wanted:
+            return
+        for alias in current:
+            if wanted.get(alias) != current[alias]:
+                conn.execute(f"DETACH DATABASE {alias}")
+        for alias, uri in wanted.items():
+            if current.get(alias) != uri:
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+        self._attached[conn] = wanted
+
+    def close(self):
+        """关闭所有只读连接"""
+        self._closed = True
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._attached.clear()
+
+
+class SyncReader:
+    """
+    以只读连接读取语料库文件的同步摘要（sync 预览用：不迁移、不切换日志模式、不写入该文件）
+
+    提供与 CorpusDatabase 相同的 get_sync_digests / get_tombstones / get_sync_groups。
+    schema 早于 v15 的文件还没有 uid：条目以 "legacy:<id>" 作为临时标识，分组与删除记录为空；
+    真正同步时该文件先迁移并分配新的 uid，这些条目全部按新增处理，与预览一致。
+    """
+
+    def __init__(self, path: str):
+        self.db_path = path
+        try:
+            self.connection = sqlite3.connect(
+                Path(path).absolute().as_uri() + "?mode=ro", uri=True
+            )
+        except sqlite3.Error as e:
+            raise ValueError(f"无法打开语料库文件: {e}") from e
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(corpus)")}
+        self.has_uids = "uid" in columns
+        self._has_updated_at = "updated_at" in columns
+
+    def get_sync_digests(self) -> Dict[str, Tuple[str, bytes]]:
+        """全部条目的 {uid: (updated_at, 行哈希)}"""
+        if self.has_uids:
+            return _sync_digests(self.connection.execute(_SYNC_DIGEST_SQL))
+        updated_at = "updated_at" if self._has_updated_at else "NULL"
+        return {f"legacy:{row[0]}": (row[1] or "", b"") for row in
+                self.connection.execute(f"SELECT id, {updated_at} FROM corpus")}
+
+    def get_tombstones(self) -> Dict[str, str]:
+        """已删除条目的 {uid: 删除时间}"""
+        return dict(self.connection.execute(_TOMBSTONES_SQL)) if self.has_uids else {}
+
+    def get_sync_groups(self) -> Dict[str, Tuple[str, str]]:
+        """全部分组的 {uid: (名称, 改名时间)}"""
+        if not self.has_uids:
+            return {}
+        return {row[0]: (row[1], row[2] or "")
+                for row in self.connection.execute(_SYNC_GROUPS_SQL)}
+
+    def close(self):
+        """关闭只读连接"""
+        self.connection.close()
+
+
+@dataclass
+class CorpusSource:
+    """联合检索中的一个语料库（main 为当前打开的数据库）"""
+    schema: str
+    label: str
+    path: str
+    fts_enabled: bool = False
+    fold_fts_enabled: bool = False
+
+
+@dataclass(frozen=True)
+class Change:
+    """
+    变更日志中的一条记录
+
+    op: 'I' 新增 / 'U' 修改 / 'D' 删除。压缩后每个条目只保留最新一条，
+    因此消费方应把 'I' / 'U' 都当作「按 entry_id 重新读取」，'D' 当作删除。
+    """
+    seq: int
+    entry_id: int
+    op: str
+    ts: str
+
+
+class ChangeLogTruncated(Exception):
+    """请求的起点早于已清理的变更日志，调用方需全量重建后从 latest_change_seq() 继续"""
+
+
+@dataclass
+class ImportResult:
+    """批量导入结果"""
+    total: int = 0
+    imported: int = 0
+    failed: List[Tuple[int, str]] = field(default_factory=list)  # (记录序号, 错误信息)
+
+
+@dataclass(slots=True, eq=False)
+class Entry(Mapping):
+    """
+    语料记录
+
+    固定字段、无实例 __dict__，单条记录的内存占用远小于 dict(sqlite3.Row)。
+    实现 Mapping 协议，兼容原有的 entry['field'] / entry.get('field') 访问方式，
+    dict(entry) 可转为普通字典（如 JSON 序列化前）。
+    """
+    id: Optional[int] = None
+    example_id: Optional[str] = None
+    source_text: Optional[str] = None
+    gloss: Optional[str] = None
+    translation: Optional[str] = None
+    notes: Optional[str] = None
+    source_text_cn: Optional[str] = None
+    gloss_cn: Optional[str] = None
+    translation_cn: Optional[str] = None
+    entry_type: Optional[str] = None
+    group_id: Optional[str] = None
+    group_name: Optional[str] = None
+    speaker: Optional[str] = None
+    turn_number: Optional[int] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    tags: Optional[str] = None
+
+    def __getitem__(self, key: str):
+        if key not in _ENTRY_FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in _ENTRY_FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(ENTRY_COLUMNS)
+
+    def __len__(self) -> int:
+        return len(ENTRY_COLUMNS)
+
+    def __contains__(self, key) -> bool:
+        return key in _ENTRY_FIELD_SET
+
+    def to_dict(self) -> Dict:
+        """转为普通字典"""
+        return {name: getattr(self, name) for name in ENTRY_COLUMNS}
+
+
+# Entry 字段顺序即查询列顺序（不依赖 corpus 表实际的列顺序）
+ENTRY_COLUMNS = tuple(f.name for f in fields(Entry))
+_ENTRY_FIELD_SET = frozenset(ENTRY_COLUMNS)
+# update_entries() 允许批量修改的字段
+_UPDATABLE_FIELDS = _ENTRY_FIELD_SET - {"id", "created_at", "updated_at"}
+_ENTRY_SELECT = ", ".join(ENTRY_COLUMNS)
+# 修改后记入变更日志的 corpus 列（用户可编辑的字段；分组/说话人为整数键列）
+_CHANGE_LOG_COLUMNS = tuple(
+    name for name in ENTRY_COLUMNS
+    if name not in ("id", "created_at", "updated_at", "group_id", "group_name", "speaker")
+) + ("group_ref", "speaker_ref")
+
+
+def _entry_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Entry:
+    """sqlite3 行工厂：按 _ENTRY_SELECT 的列顺序直接构造 Entry"""
+    return Entry(*row)
 
 
 class CorpusDatabase:
     """语料数据库管理类"""
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, wal: bool = True,
+                 profiler: Optional["query_log.QueryProfiler"] = None):
         """
         初始化数据库连接
 
         Args:
             db_path: 数据库文件路径（可选，默认使用用户主目录）
+            wal: 是否使用 WAL 日志模式（后台只读连接与写连接互不阻塞）
+            profiler: 语句/方法计时器，None 时使用 query_log.enable() 设置的默认计时器
+                （未启用慢查询日志时不计时）
         """
         if db_path is None:
             # 使用用户主目录下的 .fieldnote 文件夹
@@ -36,19 +548,156 @@ class CorpusDatabase:
         else:
             self.db_path = db_path
 
+        self.wal = wal
         self.connection = None
         self.cursor = None
+        self._owner_thread = threading.get_ident()
+        self._readers = None
+        self._tx_depth = 0  # transaction() 嵌套层数
+        self._sources: Dict[str, CorpusSource] = {}  # 联合检索附加的语料库 {标签: 来源}
+        self._attach_seq = 0
+        self.profiler = profiler if profiler is not None else query_log.default_profiler()
         self._connect()
         self._create_table()
         self._run_migrations()
+        self._fts_enabled = self._table_exists("corpus_fts")
+        self._fold_fts_enabled = self._table_exists("corpus_fold_fts")
+        self._optimize()
+        if self.profiler is not None:
+            self.profiler.instrument(self)
 
     def _connect(self):
         """建立数据库连接"""
-        self.connection = sqlite3.connect(self.db_path)
+        # 启用 URI 文件名：联合检索以 file:...?mode=ro 只读附加其他语料库
+        if self.profiler is not None:
+            self.connection = self.profiler.connect(self.db_path, self.db_path, uri=True)
+        else:
+            self.connection = sqlite3.connect(self.db_path, uri=True)
         self.connection.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+        _register_functions(self.connection)
         self.cursor = self.connection.cursor()
+        if self.wal:
+            mode = self.connection.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if mode == "wal":
+                self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        if self.db_path != ":memory:":
+            self._readers = _ReaderPool(self.db_path, profiler=self.profiler)
         logger.info("数据库已连接: %s", self.db_path)
 
+    def _fetchall(self, sql: str, params=(), row_factory=None) -> list:
+        """
+        执行只读查询并返回所有行
+
+        创建数据库的线程直接使用写连接（能看到本连接未提交的修改）；
+        其他线程（导出、统计、去重、AI 上下文等后台任务）从只读连接池借用连接，
+        不共享 self.cursor，WAL 模式下也不会阻塞写入。
+
+        Args:
+            row_factory: 本次查询使用的行工厂，None 表示连接默认的 sqlite3.Row
+        """
+        with self._read_connection() as conn:
+            return self._query(conn, sql, params, row_factory)
+
+    @contextmanager
+    def _read_connection(self):
+        """获取只读查询用的连接（选择规则同 _fetchall）"""
+        if self._readers is None or threading.get_ident() == self._owner_thread:
+            yield self.connection
+            return
+        with self._readers.connection() as conn:
+            yield conn
+
+    @staticmethod
+    def _query(conn: sqlite3.Connection, sql: str, params, row_factory) -> list:
+        cursor = conn.cursor()
+        if row_factory is not None:
+            cursor.row_factory = row_factory
+        try:
+            return cursor.execute(sql, params).fetchall()
+        finally:
+            cursor.close()
+
+    def _fetch_entries(self, where: str = "", params=()) -> List[Entry]:
+        """
+        查询语料记录并构造为 Entry
+
+        从 corpus_entries 视图读取（分组编号/名称、说话人由 groups / speakers 表连接得到）。
+
+        Args:
+            where: SELECT ... FROM corpus_entries 之后的子句（WHERE / ORDER BY / LIMIT）
+        """
+        return self._fetchall(
+            f"SELECT {_ENTRY_SELECT} FROM corpus_entries {where}", params,
+            row_factory=_entry_row_factory,
+        )
+
+    def _fetchone(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        """执行只读查询并返回第一行（连接选择规则同 _fetchall）"""
+        rows = self._fetchall(sql, params)
+        return rows[0] if rows else None
+
+    @contextmanager
+    def _write_connection(self):
+        """
+        获取可写连接，正常退出时提交、异常时回滚
+
+        创建数据库的线程直接使用 self.connection（在 transaction() 中执行，
+        处于外层事务时随外层一起提交）；后台线程（如去重检测写签名缓存）
+        临时打开独立连接，用完即关，不跨线程共享 self.cursor。
+        """
+        if threading.get_ident() == self._owner_thread:
+            with self.transaction():
+                yield self.connection
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        工作单元：块内的所有写操作合并为一个事务，退出时只提交一次
+
+        可嵌套，每层对应一个 SAVEPOINT：内层异常只回滚内层的修改，
+        最外层正常退出时提交，异常时整体回滚。块内调用的增删改方法不再各自提交。
+        只能在创建数据库的线程中使用。
+
+        用法：
+            with db.transaction():
+                db.insert_entry(...)
+                db.rename_group(...)
+        """
+        outermost = self._tx_depth == 0
+        name = f"tx_{self._tx_depth}"
+        # 使用独立游标执行事务语句，不影响 self.cursor 的 rowcount / lastrowid
+        use_savepoint = not outermost or self.connection.in_transaction
+        self.connection.execute(f"SAVEPOINT {name}" if use_savepoint else "BEGIN")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if use_savepoint:
+                self.connection.execute(f"ROLLBACK TO {name}")
+                self.connection.execute(f"RELEASE {name}")
+            else:
+                self.connection.rollback()
+            raise
+        else:
+            if use_savepoint:
+                self.connection.execute(f"RELEASE {name}")
+        finally:
+            self._tx_depth -= 1
+        if outermost:
+            self.connection.commit()
+
+    def checkpoint(self):
+        """将 WAL 日志合并回主数据库文件（直接复制数据库文件前调用）"""
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
     def _create_table(self):
         """创建语料表（如果不存在）"""
         self.cursor.execute("""
@@ -74,6 +723,13 @@ class CorpusDatabase:
         """)
         self.connection.commit()
 
+    def _table_exists(self, name: str) -> bool:
+        """检查表（含虚拟表）是否存在"""
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        )
+        return self.cursor.fetchone() is not None
+
     def _get_schema_version(self) -> int:
         """获取当前 schema 版本"""
         try:
@@ -112,12 +768,11 @@ class CorpusDatabase:
                 # Migration 2: 添加类型字段
                 if 'entry_type' not in columns:
                     self.cursor.execute("ALTER TABLE corpus ADD COLUMN entry_type TEXT DEFAULT 'sentence'")
-                if 'group_id' not in columns:
-                    self.cursor.execute("ALTER TABLE corpus ADD COLUMN group_id TEXT")
-                if 'group_name' not in columns:
-                    self.cursor.execute("ALTER TABLE corpus ADD COLUMN group_name TEXT")
-                if 'speaker' not in columns:
-                    self.cursor.execute("ALTER TABLE corpus ADD COLUMN speaker TEXT")
+                # （v13 起分组/说话人移入 groups / speakers 表，不再回加这些列）
+                if current < 13:
+                    for column in ('group_id', 'group_name', 'speaker'):
+                        if column not in columns:
+                            self.cursor.execute(f"ALTER TABLE corpus ADD COLUMN {column} TEXT")
                 if 'turn_number' not in columns:
                     self.cursor.execute("ALTER TABLE corpus ADD COLUMN turn_number INTEGER")
 
@@ -137,11 +792,935 @@ class CorpusDatabase:
                     self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_corpus_gloss ON corpus(gloss)")
                     self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_corpus_created_at ON corpus(created_at)")
 
+                # Migration 5: FTS5 trigram 全文索引（由触发器维护）
+                if current < 5:
+                    self._create_fts_index()
+
+                # Migration 6: 标签规范化为 tags / entry_tags 关联表
+                if current < 6:
+                    self._create_tag_tables()
+
+                # Migration 7: 触发器维护的统计汇总表
+                if current < 7:
+                    self._create_stats_tables()
+
+                # Migration 8: 分词表及触发器维护的词频表
+                if current < 8:
+                    self._create_token_tables()
+
+                # Migration 9: 模糊去重用的 MinHash 签名缓存
+                if current < 9:
+                    self._create_minhash_table()
+
+                # Migration 10: 忽略变音符/声调检索的折叠影子列及其全文索引
+                if current < 10:
+                    self._create_fold_keys(columns)
+
+                # Migration 11: 「相似条目」用的字符 n-gram TF-IDF 倒排表
+                if current < 11:
+                    self._create_ngram_index()
+
+                # Migration 12: 常用访问路径的复合/覆盖索引，并收集规划器统计信息
+                if current < 12:
+                    self._create_access_path_indexes()
+
+                # Migration 13: 分组与说话人规范化为 groups / speakers 表（整数键引用）
+                if current < 13:
+                    self._create_group_tables()
+
+                # Migration 14: 触发器维护的变更日志（增量消费）
+                if current < 14:
+                    self._create_change_log()
+
+                # Migration 15: 跨文件同步用的稳定标识（uid）与删除记录
+                if current < 15:
+                    self._create_sync_tables()
+
+                # Migration 16: n-gram 向量按条目存为一行，去掉倒排表的 entry_id 索引
+                if 11 <= current < 16:
+                    self._upgrade_ngram_index()
+
+                # Migration 17: stats_by_type 增加由 tokens 触发器维护的词例总数
+                if 8 <= current < 17:
+                    self._upgrade_token_triggers()
+
                 self._set_schema_version(SCHEMA_VERSION)
                 logger.info("数据库迁移完成, 当前版本: %d", SCHEMA_VERSION)
             except Exception as e:
                 logger.error("数据库迁移失败: %s", e)
 
+    def _create_access_path_indexes(self):
+        """
+        为常用查询建立复合/覆盖索引并执行 ANALYZE
+
+        - (entry_type, group_id, group_name)：分组列表（覆盖，无需回表和排序）
+          及 get_next_group_id 的前缀范围查询
+        - (group_id, turn_number, id)：分组条目按轮次排序读取，无需临时排序
+        按类型读取（WHERE entry_type = ? ORDER BY id）由 idx_corpus_entry_type 满足：
+        SQLite 索引项隐含 rowid，已按 id 有序。
+        """
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_corpus_type_group
+            ON corpus(entry_type, group_id, group_name)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_corpus_group_turn
+            ON corpus(group_id, turn_number, id)
+        """)
+        self.cursor.execute("ANALYZE")
+
+    def _create_group_tables(self):
+        """
+        将分组编号/名称、说话人从每行重复的文本列移入 groups / speakers 表
+
+        - groups(code, entry_type, name, member_count)：分组编号唯一，名称只存一份，
+          成员数由 corpus 上的触发器维护，列出/重命名分组只读写这张小表
+        - speakers(name)：说话人去重
+        - group_sequences(prefix, last_value)：DSC/DLG 编号序列，分配新编号只读一行
+        corpus 改为 group_ref / speaker_ref 整数列，旧文本列删除（SQLite 3.35 以下不支持
+        DROP COLUMN，改名为 legacy_* 并清空）；读取条目经 corpus_entries 视图还原原字段。
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY,
+                code TEXT NOT NULL UNIQUE,
+                entry_type TEXT,
+                name TEXT NOT NULL DEFAULT '',
+                member_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_groups_type ON groups(entry_type, code)
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS speakers (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS group_sequences (
+                prefix TEXT PRIMARY KEY,
+                last_value INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("PRAGMA table_info(corpus)")
+        columns = {row[1] for row in self.cursor.fetchall()}
+        for column in ("group_ref", "speaker_ref"):
+            if column not in columns:
+                self.cursor.execute(f"ALTER TABLE corpus ADD COLUMN {column} INTEGER")
+        if "group_id" in columns:
+            self._move_group_columns()
+
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_corpus_group_turn
+            ON corpus(group_ref, turn_number, id)
+        """)
+        self.cursor.execute("""
+            UPDATE groups SET member_count = (
+                SELECT COUNT(*) FROM corpus WHERE group_ref = groups.id
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS groups_member_ai AFTER INSERT ON corpus
+            WHEN new.group_ref IS NOT NULL BEGIN
+                UPDATE groups SET member_count = member_count + 1 WHERE id = new.group_ref;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS groups_member_ad AFTER DELETE ON corpus
+            WHEN old.group_ref IS NOT NULL BEGIN
+                UPDATE groups SET member_count = member_count - 1 WHERE id = old.group_ref;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS groups_member_au AFTER UPDATE OF group_ref ON corpus
+            WHEN old.group_ref IS NOT new.group_ref BEGIN
+                UPDATE groups SET member_count = member_count - 1 WHERE id = old.group_ref;
+                UPDATE groups SET member_count = member_count + 1 WHERE id = new.group_ref;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE VIEW IF NOT EXISTS corpus_entries AS
+            SELECT c.*,
+                   COALESCE(g.code, '') AS group_id,
+                   COALESCE(g.name, '') AS group_name,
+                   COALESCE(s.name, '') AS speaker
+            FROM corpus c
+            LEFT JOIN groups g ON g.id = c.group_ref
+            LEFT JOIN speakers s ON s.id = c.speaker_ref
+        """)
+        self.cursor.execute("ANALYZE")
+        logger.info("分组/说话人表已创建")
+
+    def _move_group_columns(self):
+        """把旧的 group_id / group_name / speaker 文本列回填到 groups / speakers 表后删除"""
+        # 分组类型取最早的成员，名称取最近一条非空名称
+        self.cursor.execute("""
+            INSERT INTO groups (code, entry_type, name)
+            SELECT c.group_id,
+                   (SELECT entry_type FROM corpus f WHERE f.group_id = c.group_id
+                    ORDER BY f.id LIMIT 1),
+                   COALESCE((SELECT group_name FROM corpus n
+                             WHERE n.group_id = c.group_id AND n.group_name != ''
+                             ORDER BY n.id DESC LIMIT 1), '')
+            FROM corpus c WHERE c.group_id IS NOT NULL AND c.group_id != ''
+            GROUP BY c.group_id
+        """)
+        self.cursor.execute("""
+            UPDATE corpus SET group_ref = (SELECT id FROM groups WHERE code = corpus.group_id)
+            WHERE group_id IS NOT NULL AND group_id != ''
+        """)
+        self.cursor.execute("""
+            INSERT OR IGNORE INTO speakers (name)
+            SELECT DISTINCT speaker FROM corpus WHERE speaker IS NOT NULL AND speaker != ''
+        """)
+        self.cursor.execute("""
+            UPDATE corpus SET speaker_ref = (SELECT id FROM speakers WHERE name = corpus.speaker)
+            WHERE speaker IS NOT NULL AND speaker != ''
+        """)
+        self.cursor.execute("SELECT code, entry_type FROM groups")
+        for code, entry_type in self.cursor.fetchall():
+            self._advance_group_sequence(code, entry_type)
+
+        # v12 的分组索引建在旧文本列上，删除列之前先删除
+        self.cursor.execute("DROP INDEX IF EXISTS idx_corpus_type_group")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_corpus_group_turn")
+        for column in ("group_id", "group_name", "speaker"):
+            try:
+                self.cursor.execute(f"ALTER TABLE corpus DROP COLUMN {column}")
+            except sqlite3.OperationalError:
+                self.cursor.execute(f"ALTER TABLE corpus RENAME COLUMN {column} TO legacy_{column}")
+                self.cursor.execute(f"UPDATE corpus SET legacy_{column} = NULL")
+
+    def _create_change_log(self):
+        """
+        创建 changes 变更日志表及维护触发器
+
+        corpus 的增删及用户字段的修改各记一行（派生的折叠检索列不计）；
+        分组改名/改编号时为其所有成员记一行修改（条目读出的 group_name 随之变化）。
+        seq 使用 AUTOINCREMENT，清理后也不会复用；changes_horizon 记录已清理到的位置。
+        日志从迁移时开始记录，不回填已有条目。
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entry_id INTEGER NOT NULL,
+                op TEXT NOT NULL,
+                ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            )
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_changes_entry ON changes(entry_id, seq)
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS changes_horizon (seq INTEGER NOT NULL)
+        """)
+        self.cursor.execute("""
+            INSERT INTO changes_horizon (seq)
+            SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM changes_horizon)
+        """)
+
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS changes_ai AFTER INSERT ON corpus BEGIN
+                INSERT INTO changes (entry_id, op) VALUES (new.id, 'I');
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS changes_ad AFTER DELETE ON corpus BEGIN
+                INSERT INTO changes (entry_id, op) VALUES (old.id, 'D');
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS changes_au
+            AFTER UPDATE OF {", ".join(_CHANGE_LOG_COLUMNS)} ON corpus BEGIN
+                INSERT INTO changes (entry_id, op) VALUES (new.id, 'U');
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS changes_group_au AFTER UPDATE OF code, name ON groups
+            WHEN old.code IS NOT new.code OR old.name IS NOT new.name BEGIN
+                INSERT INTO changes (entry_id, op)
+                SELECT id, 'U' FROM corpus WHERE group_ref = new.id;
+            END
+        """)
+        logger.info("变更日志已创建")
+
+    def _create_sync_tables(self):
+        """
+        为跨文件同步创建稳定标识与删除记录
+
+        - corpus.uid / groups.uid：随机 128 位标识，复制文件后两边一致，
+          同步时以此对应条目和分组（自增 id 在不同文件中各自分配，不能用于对应）
+        - groups.updated_at：分组改名时间，两边名称不同时取较新的一方
+        - tombstones(uid, deleted_at)：删除条目时记录，另一方据此判断删除还是补回
+        写入路径插入时生成 uid，其他方式插入的行由触发器补上。
+        """
+        self.cursor.execute("PRAGMA table_info(corpus)")
+        if "uid" not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute("ALTER TABLE corpus ADD COLUMN uid TEXT")
+        self.cursor.execute("PRAGMA table_info(groups)")
+        group_columns = {row[1] for row in self.cursor.fetchall()}
+        for column in ("uid", "updated_at"):
+            if column not in group_columns:
+                self.cursor.execute(f"ALTER TABLE groups ADD COLUMN {column} TEXT")
+
+        self.cursor.execute("""
+            UPDATE corpus SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL
+        """)
+        self.cursor.execute("""
+            UPDATE groups SET uid = lower(hex(randomblob(16))),
+                updated_at = COALESCE(updated_at, (
+                    SELECT MAX(updated_at) FROM corpus WHERE group_ref = groups.id
+                ), strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+            WHERE uid IS NULL
+        """)
+        self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_corpus_uid ON corpus(uid)")
+        self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_groups_uid ON groups(uid)")
+
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_uid_ai AFTER INSERT ON corpus
+            WHEN new.uid IS NULL BEGIN
+                UPDATE corpus SET uid = lower(hex(randomblob(16))) WHERE id = new.id;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS groups_uid_ai AFTER INSERT ON groups
+            WHEN new.uid IS NULL BEGIN
+                UPDATE groups SET uid = lower(hex(randomblob(16))),
+                    updated_at = COALESCE(new.updated_at,
+                                          strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+                WHERE id = new.id;
+            END
+        """)
+        # 改名时刷新 updated_at（同步写入时显式给出 updated_at，不覆盖）
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS groups_touch_au AFTER UPDATE OF name ON groups
+            WHEN old.name IS NOT new.name AND old.updated_at IS new.updated_at BEGIN
+                UPDATE groups SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')
+                WHERE id = new.id;
+            END
+        """)
+
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tombstones (
+                uid TEXT PRIMARY KEY,
+                deleted_at TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_tombstone_ad AFTER DELETE ON corpus
+            WHEN old.uid IS NOT NULL BEGIN
+                INSERT OR REPLACE INTO tombstones (uid, deleted_at)
+                VALUES (old.uid, strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'));
+            END
+        """)
+        logger.info("同步标识与删除记录已创建")
+
+    def _optimize(self):
+        """
+        让 SQLite 按需刷新查询规划器统计信息（打开和关闭数据库时调用）
+
+        PRAGMA optimize 只重新分析自上次统计后变化较大的表，抽样行数受 analysis_limit 限制。
+        """
+        try:
+            self.connection.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            logger.warning("PRAGMA optimize 失败: %s", e)
+
+    def _create_fts_index(self):
+        """
+        创建 corpus_fts 全文索引影子表及同步触发器
+
+        使用 external content 模式，索引内容由 corpus 表上的触发器维护；
+        trigram 分词器按字符切分，IPA 子串和声调符号也能命中。
+        SQLite 未编译 FTS5 时跳过，search_entries 回退到 LIKE。
+        """
+        if not fts5_available():
+            logger.warning("SQLite 未启用 FTS5/trigram，全文检索将回退到 LIKE")
+            return
+
+        columns = ", ".join(SEARCH_FIELDS)
+        new_values = ", ".join(f"new.{f}" for f in SEARCH_FIELDS)
+        old_values = ", ".join(f"old.{f}" for f in SEARCH_FIELDS)
+
+        self.cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS corpus_fts USING fts5(
+                {columns}, content='corpus', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fts_ai AFTER INSERT ON corpus BEGIN
+                INSERT INTO corpus_fts(rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fts_ad AFTER DELETE ON corpus BEGIN
+                INSERT INTO corpus_fts(corpus_fts, rowid, {columns})
+                VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fts_au AFTER UPDATE OF {columns} ON corpus BEGIN
+                INSERT INTO corpus_fts(corpus_fts, rowid, {columns})
+                VALUES ('delete', old.id, {old_values});
+                INSERT INTO corpus_fts(rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        """)
+        # 为已有数据建立索引
+        self.cursor.execute("INSERT INTO corpus_fts(corpus_fts) VALUES ('rebuild')")
+        logger.info("FTS5 全文索引已创建")
+
+    def _create_tag_tables(self):
+        """创建 tags / entry_tags 关联表，并从 corpus.tags 迁移已有标签"""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS entry_tags (
+                entry_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (entry_id, tag_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entry_tags_tag ON entry_tags(tag_id, entry_id)"
+        )
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS entry_tags_ad AFTER DELETE ON corpus BEGIN
+                DELETE FROM entry_tags WHERE entry_id = old.id;
+            END
+        """)
+        self._sync_entry_tags()
+        logger.info("标签关联表已创建")
+
+    def _create_stats_tables(self):
+        """
+        创建 stats_by_type / stats_by_day 汇总表及维护触发器，并按现有数据回填
+
+        计数随 corpus 的增删改由触发器增量更新，get_stats 只读这两张小表。
+        日期桶取 created_at（UTC ISO 时间戳）的前 10 位，即 UTC 日期。
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_by_type (
+                entry_type TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_by_day (
+                day TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+
+        def bump(row: str, delta: str) -> str:
+            return f"""
+                INSERT OR IGNORE INTO stats_by_type (entry_type, count)
+                    VALUES (COALESCE({row}.entry_type, ''), 0);
+                UPDATE stats_by_type SET count = count {delta} 1
+                    WHERE entry_type = COALESCE({row}.entry_type, '');
+                INSERT OR IGNORE INTO stats_by_day (day, count)
+                    SELECT substr({row}.created_at, 1, 10), 0 WHERE {row}.created_at IS NOT NULL;
+                UPDATE stats_by_day SET count = count {delta} 1
+                    WHERE day = substr({row}.created_at, 1, 10);
+            """
+
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_ai AFTER INSERT ON corpus BEGIN
+                {bump("new", "+")}
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_ad AFTER DELETE ON corpus BEGIN
+                {bump("old", "-")}
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_au AFTER UPDATE OF entry_type, created_at ON corpus
+            BEGIN
+                {bump("old", "-")}
+                {bump("new", "+")}
+            END
+        """)
+
+        self.cursor.execute("DELETE FROM stats_by_type")
+        self.cursor.execute("""
+            INSERT INTO stats_by_type (entry_type, count)
+            SELECT COALESCE(entry_type, ''), COUNT(*) FROM corpus GROUP BY 1
+        """)
+        self.cursor.execute("DELETE FROM stats_by_day")
+        self.cursor.execute("""
+            INSERT INTO stats_by_day (day, count)
+            SELECT substr(created_at, 1, 10), COUNT(*) FROM corpus
+            WHERE created_at IS NOT NULL GROUP BY 1
+        """)
+        logger.info("统计汇总表已创建")
+
+    def _create_token_tables(self):
+        """
+        创建 tokens 分词表及 word_freq / word_freq_by_type 词频表，并按现有数据回填
+
+        tokens 由 Python 按空白切分 source_text 写入（见 _sync_tokens），
+        两张词频表及 stats_by_type.tokens 由 tokens 上的触发器增量维护，高频词查询走 count 索引。
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                entry_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                form TEXT NOT NULL,
+                entry_type TEXT,
+                PRIMARY KEY (entry_id, position)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_form ON tokens(form, entry_id)")
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS word_freq (
+                form TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_word_freq_count ON word_freq(count DESC, form)")
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS word_freq_by_type (
+                entry_type TEXT NOT NULL,
+                form TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (entry_type, form)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_word_freq_by_type_count
+            ON word_freq_by_type(entry_type, count DESC, form)
+        """)
+
+        self._create_token_triggers()
+
+        # 条目删除或改类型时同步 tokens（source_text 变化由 _sync_tokens 处理）
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_tokens_ad AFTER DELETE ON corpus BEGIN
+                DELETE FROM tokens WHERE entry_id = old.id;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_tokens_au AFTER UPDATE OF entry_type ON corpus
+            WHEN old.entry_type IS NOT new.entry_type BEGIN
+                UPDATE tokens SET entry_type = new.entry_type WHERE entry_id = new.id;
+            END
+        """)
+        self._sync_tokens()
+        logger.info("分词表已创建")
+
+    def _create_token_triggers(self):
+        """
+        创建 tokens 上的触发器：增量维护 word_freq / word_freq_by_type 及 stats_by_type.tokens
+
+        stats_by_type.tokens 为各类型的词例总数（BM25 平均词数用），旧库先补上该列。
+        """
+        self.cursor.execute("PRAGMA table_info(stats_by_type)")
+        if 'tokens' not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute(
+                "ALTER TABLE stats_by_type ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0"
+            )
+
+        def add(row: str) -> str:
+            return f"""
+                INSERT OR IGNORE INTO word_freq (form, count) VALUES ({row}.form, 0);
+                UPDATE word_freq SET count = count + 1 WHERE form = {row}.form;
+                INSERT OR IGNORE INTO word_freq_by_type (entry_type, form, count)
+                    VALUES (COALESCE({row}.entry_type, ''), {row}.form, 0);
+                UPDATE word_freq_by_type SET count = count + 1
+                    WHERE entry_type = COALESCE({row}.entry_type, '') AND form = {row}.form;
+                INSERT OR IGNORE INTO stats_by_type (entry_type, count)
+                    VALUES (COALESCE({row}.entry_type, ''), 0);
+                UPDATE stats_by_type SET tokens = tokens + 1
+                    WHERE entry_type = COALESCE({row}.entry_type, '');
+            """
+
+        def remove(row: str) -> str:
+            return f"""
+                UPDATE word_freq SET count = count - 1 WHERE form = {row}.form;
+                DELETE FROM word_freq WHERE form = {row}.form AND count <= 0;
+                UPDATE word_freq_by_type SET count = count - 1
+                    WHERE entry_type = COALESCE({row}.entry_type, '') AND form = {row}.form;
+                DELETE FROM word_freq_by_type
+                    WHERE entry_type = COALESCE({row}.entry_type, '') AND form = {row}.form
+                      AND count <= 0;
+                UPDATE stats_by_type SET tokens = tokens - 1
+                    WHERE entry_type = COALESCE({row}.entry_type, '');
+            """
+
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tokens_ai AFTER INSERT ON tokens BEGIN
+                {add("new")}
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tokens_ad AFTER DELETE ON tokens BEGIN
+                {remove("old")}
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tokens_au AFTER UPDATE OF form, entry_type ON tokens BEGIN
+                {remove("old")}
+                {add("new")}
+            END
+        """)
+
+    def _upgrade_token_triggers(self):
+        """重建 tokens 触发器以维护 stats_by_type.tokens，并按现有 tokens 回填"""
+        for trigger in ("tokens_ai", "tokens_ad", "tokens_au"):
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        self._create_token_triggers()
+        self.cursor.execute("""
+            UPDATE stats_by_type SET tokens = (
+                SELECT COUNT(*) FROM tokens
+                WHERE COALESCE(tokens.entry_type, '') = stats_by_type.entry_type
+            )
+        """)
+
+    def _sync_tokens(self, entry_ids: List[int] = None):
+        """
+        按 corpus.source_text 重建 tokens（不提交事务，词频表由触发器随之更新）
+
+        Args:
+            entry_ids: 需要同步的条目ID列表，None 表示全量重建
+        """
+        if entry_ids is None:
+            self.cursor.execute("DELETE FROM tokens")
+            self.cursor.execute("SELECT id, source_text, entry_type FROM corpus")
+        else:
+            ids = _json_ids(entry_ids)
+            self.cursor.execute(
+                "DELETE FROM tokens WHERE entry_id IN (SELECT value FROM json_each(?))", (ids,)
+            )
+            self.cursor.execute("""
+                SELECT id, source_text, entry_type FROM corpus
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (ids,))
+
+        rows = [
+            (entry_id, position, form, entry_type)
+            for entry_id, text, entry_type in self.cursor.fetchall()
+            for position, form in enumerate(relevance.tokenize(text))
+        ]
+        if rows:
+            self.cursor.executemany(
+                "INSERT INTO tokens (entry_id, position, form, entry_type) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def _create_minhash_table(self):
+        """创建 minhash_signatures 签名缓存表（签名由 dedup 模块按需计算写入）"""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS minhash_signatures (
+                entry_id INTEGER PRIMARY KEY,
+                text_key TEXT NOT NULL,
+                signature BLOB NOT NULL
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_minhash_ad AFTER DELETE ON corpus BEGIN
+                DELETE FROM minhash_signatures WHERE entry_id = old.id;
+            END
+        """)
+
+    def _create_fold_keys(self, columns: List[str]):
+        """
+        添加 *_key 折叠影子列并回填，建立 corpus_fold_fts trigram 索引
+
+        影子列由写入路径（_sync_fold_keys）维护；索引由影子列上的触发器同步。
+        """
+        for key in FOLD_KEY_COLUMNS:
+            if key not in columns:
+                self.cursor.execute(f"ALTER TABLE corpus ADD COLUMN {key} TEXT")
+        self._sync_fold_keys()
+
+        if not fts5_available():
+            return
+        keys = ", ".join(FOLD_KEY_COLUMNS)
+        new_values = ", ".join(f"new.{k}" for k in FOLD_KEY_COLUMNS)
+        old_values = ", ".join(f"old.{k}" for k in FOLD_KEY_COLUMNS)
+        self.cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS corpus_fold_fts USING fts5(
+                {keys}, content='corpus', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fold_fts_ai AFTER INSERT ON corpus BEGIN
+                INSERT INTO corpus_fold_fts(rowid, {keys}) VALUES (new.id, {new_values});
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fold_fts_ad AFTER DELETE ON corpus BEGIN
+                INSERT INTO corpus_fold_fts(corpus_fold_fts, rowid, {keys})
+                VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS corpus_fold_fts_au AFTER UPDATE OF {keys} ON corpus BEGIN
+                INSERT INTO corpus_fold_fts(corpus_fold_fts, rowid, {keys})
+                VALUES ('delete', old.id, {old_values});
+                INSERT INTO corpus_fold_fts(rowid, {keys}) VALUES (new.id, {new_values});
+            END
+        """)
+        self.cursor.execute("INSERT INTO corpus_fold_fts(corpus_fold_fts) VALUES ('rebuild')")
+        logger.info("折叠检索列及索引已创建")
+
+    def _create_ngram_index(self):
+        """
+        创建 n-gram 相似度索引并按现有数据回填
+
+        ngram_postings 是候选生成用的倒排表（按 gram 查找）；每个条目的完整向量
+        以 relevance.pack_vector 格式存为 ngram_vectors 的一行，供重排和删除时按条目读取，
+        不再为倒排表另建 entry_id 索引。倒排记录、向量和文档频率由写入路径
+        （_sync_ngrams）成批维护；删除触发器只把条目登记到 ngram_stale，
+        由 _purge_ngrams 在删除所在的事务中成批清理。
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ngram_postings (
+                gram INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (gram, entry_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ngram_vectors (
+                entry_id INTEGER PRIMARY KEY,
+                grams BLOB NOT NULL
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ngram_df (
+                gram INTEGER PRIMARY KEY,
+                df INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.cursor.execute(
+            "CREATE TABLE IF NOT EXISTS ngram_stale (entry_id INTEGER PRIMARY KEY)"
+        )
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS corpus_ngram_ad AFTER DELETE ON corpus BEGIN
+                INSERT OR IGNORE INTO ngram_stale (entry_id) VALUES (old.id);
+            END
+        """)
+        self._sync_ngrams()
+        logger.info("n-gram 相似度索引已创建")
+
+    def _upgrade_ngram_index(self):
+        """v16：去掉倒排表的 entry_id 索引，改为按条目存储的向量（重建索引）"""
+        self.cursor.execute("DROP TRIGGER IF EXISTS corpus_ngram_ad")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_ngram_postings_entry")
+        self._create_ngram_index()
+
+    def _remove_ngrams(self, entry_ids: List[int]):
+        """按存储的向量删除条目的倒排记录并扣减文档频率（不提交事务）"""
+        ids = _json_ids(entry_ids)
+        self.cursor.execute(
+            "SELECT entry_id, grams FROM ngram_vectors WHERE entry_id IN (SELECT value FROM json_each(?))",
+            (ids,)
+        )
+        postings = []
+        for entry_id, blob in self.cursor.fetchall():
+            postings.extend((gram, entry_id) for gram in relevance.unpack_vector(blob))
+        if not postings:
+            return
+        postings.sort()  # 按主键顺序删除
+        doc_freqs = Counter(gram for gram, _ in postings)
+        self.cursor.executemany(
+            "DELETE FROM ngram_postings WHERE gram = ? AND entry_id = ?", postings
+        )
+        self.cursor.executemany(
+            "UPDATE ngram_df SET df = df - ? WHERE gram = ?",
+            [(n, gram) for gram, n in sorted(doc_freqs.items())]
+        )
+        self.cursor.execute(
+            "DELETE FROM ngram_df WHERE gram IN (SELECT value FROM json_each(?)) AND df <= 0",
+            (json.dumps(list(doc_freqs)),)
+        )
+        self.cursor.execute(
+            "DELETE FROM ngram_vectors WHERE entry_id IN (SELECT value FROM json_each(?))", (ids,)
+        )
+
+    def _purge_ngrams(self):
+        """清理删除触发器登记在 ngram_stale 中的条目的 n-gram 记录（不提交事务）"""
+        self.cursor.execute("SELECT entry_id FROM ngram_stale")
+        stale = [row[0] for row in self.cursor.fetchall()]
+        if stale:
+            self._remove_ngrams(stale)
+            self.cursor.execute("DELETE FROM ngram_stale")
+
+    def _sync_ngrams(self, entry_ids: List[int] = None):
+        """
+        按 NGRAM_FIELDS 重建条目的 n-gram 倒排记录、向量及文档频率（不提交事务）
+
+        Args:
+            entry_ids: 需要同步的条目ID列表，None 表示全量重建
+        """
+        fields = ", ".join(relevance.NGRAM_FIELDS)
+        if entry_ids is None:
+            for table in ("ngram_postings", "ngram_vectors", "ngram_df", "ngram_stale"):
+                self.cursor.execute(f"DELETE FROM {table}")
+            self.cursor.execute(f"SELECT id, {fields} FROM corpus")
+            entries = self.cursor.fetchall()
+        else:
+            self._purge_ngrams()
+            self._remove_ngrams(entry_ids)
+            self.cursor.execute(f"""
+                SELECT id, {fields} FROM corpus WHERE id IN (SELECT value FROM json_each(?))
+            """, (_json_ids(entry_ids),))
+            entries = self.cursor.fetchall()
+
+        doc_freqs: Dict[int, int] = {}
+        for start in range(0, len(entries), NGRAM_SYNC_BATCH):
+            postings = []
+            vectors = []
+            for row in entries[start:start + NGRAM_SYNC_BATCH]:
+                counts = relevance.entry_ngrams(row[1:])
+                if not counts:
+                    continue
+                vectors.append((row[0], relevance.pack_vector(counts)))
+                for gram, tf in counts.items():
+                    postings.append((gram, row[0], tf))
+                    doc_freqs[gram] = doc_freqs.get(gram, 0) + 1
+            if postings:
+                postings.sort()  # 按主键顺序写入 B 树
+                self.cursor.executemany(
+                    "INSERT INTO ngram_postings (gram, entry_id, tf) VALUES (?, ?, ?)", postings
+                )
+                self.cursor.executemany(
+                    "INSERT INTO ngram_vectors (entry_id, grams) VALUES (?, ?)", vectors
+                )
+        if doc_freqs:
+            self.cursor.executemany("""
+                INSERT INTO ngram_df (gram, df) VALUES (?, ?)
+                ON CONFLICT(gram) DO UPDATE SET df = df + excluded.df
+            """, sorted(doc_freqs.items()))
+
+    def _sync_derived(self, entry_ids: List[int], inserted: bool = False):
+        """
+        同步条目的派生数据（标签关联、分词、折叠检索键、n-gram），不提交事务
+
+        Args:
+            entry_ids: 条目ID列表
+            inserted: 以 _INSERT_SQL 新插入的条目（折叠检索键已随行写入）
+        """
+        self._sync_entry_tags(entry_ids)
+        self._sync_tokens(entry_ids)
+        if not inserted:
+            self._sync_fold_keys(entry_ids)
+        self._sync_ngrams(entry_ids)
+
+    def _sync_fold_keys(self, entry_ids: List[int] = None):
+        """
+        按检索字段重算 *_key 折叠影子列（不提交事务）
+
+        Args:
+            entry_ids: 需要同步的条目ID列表，None 表示全量重算
+        """
+        assignments = ", ".join(f"{f}_key = fold_key({f})" for f in SEARCH_FIELDS)
+        if entry_ids is None:
+            self.cursor.execute(f"UPDATE corpus SET {assignments}")
+        else:
+            self.cursor.execute(
+                f"UPDATE corpus SET {assignments} WHERE id IN (SELECT value FROM json_each(?))",
+                (_json_ids(entry_ids),)
+            )
+
+    def _sync_entry_tags(self, entry_ids: List[int] = None):
+        """
+        按 corpus.tags 重建 entry_tags 关联（不提交事务）
+
+        Args:
+            entry_ids: 需要同步的条目ID列表，None 表示全量重建
+        """
+        if entry_ids is None:
+            self.cursor.execute("DELETE FROM entry_tags")
+            self.cursor.execute("SELECT id, tags FROM corpus WHERE tags IS NOT NULL AND tags != ''")
+        else:
+            ids = _json_ids(entry_ids)
+            self.cursor.execute(
+                "DELETE FROM entry_tags WHERE entry_id IN (SELECT value FROM json_each(?))", (ids,)
+            )
+            self.cursor.execute("""
+                SELECT id, tags FROM corpus
+                WHERE id IN (SELECT value FROM json_each(?)) AND tags IS NOT NULL AND tags != ''
+            """, (ids,))
+
+        links = []
+        for entry_id, tags in self.cursor.fetchall():
+            for position, name in enumerate(_split_tags(tags)):
+                links.append((entry_id, position, name))
+        if not links:
+            return
+
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO tags (name) VALUES (?)",
+            [(name,) for name in {link[2] for link in links}]
+        )
+        self.cursor.executemany("""
+            INSERT OR IGNORE INTO entry_tags (entry_id, tag_id, position)
+            SELECT ?, id, ? FROM tags WHERE name = ?
+        """, links)
+
+    def _advance_group_sequence(self, code: str, entry_type: str):
+        """编号形如「本类型前缀 + 数字」时，把该前缀的序列推进到不小于该数字"""
+        prefix = _group_prefix(entry_type)
+        suffix = code[len(prefix):]
+        if not code.startswith(prefix) or not suffix.isdigit():
+            return
+        self.cursor.execute("""
+            INSERT INTO group_sequences (prefix, last_value) VALUES (?, ?)
+            ON CONFLICT(prefix) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+        """, (prefix, int(suffix)))
+
+    def _group_ref(self, group_id: Optional[str], group_name: Optional[str] = "",
+                   entry_type: str = None) -> Optional[int]:
+        """
+        分组编号 -> groups.id（须在事务中调用）
+
+        分组不存在时创建（并推进编号序列）；group_name 非空且与现有名称不同时更新名称。
+        group_id 为空返回 None（不属于任何分组）。
+        """
+        if not group_id:
+            return None
+        self.cursor.execute("SELECT id, name FROM groups WHERE code = ?", (group_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            self.cursor.execute(
+                "INSERT INTO groups (code, entry_type, name) VALUES (?, ?, ?)",
+                (group_id, entry_type, group_name or "")
+            )
+            group_ref = self.cursor.lastrowid
+            self._advance_group_sequence(group_id, entry_type)
+            return group_ref
+        if group_name and group_name != row[1]:
+            self.cursor.execute("UPDATE groups SET name = ? WHERE id = ?", (group_name, row[0]))
+        return row[0]
+
+    def _speaker_ref(self, speaker: Optional[str]) -> Optional[int]:
+        """说话人 -> speakers.id（不存在时创建，须在事务中调用）；空值返回 None"""
+        if not speaker:
+            return None
+        self.cursor.execute("INSERT OR IGNORE INTO speakers (name) VALUES (?)", (speaker,))
+        self.cursor.execute("SELECT id FROM speakers WHERE name = ?", (speaker,))
+        return self.cursor.fetchone()[0]
+
+    def _ref_row(self, row: tuple, groups: Dict, speakers: Dict) -> tuple:
+        """把 _import_row 结果中的分组/说话人文本换成整数键（groups / speakers 为查找缓存）"""
+        entry_type, group_id, group_name, speaker = row[8:12]
+        group_key = (group_id, group_name, entry_type)
+        if group_key not in groups:
+            groups[group_key] = self._group_ref(group_id, group_name, entry_type)
+        if speaker not in speakers:
+            speakers[speaker] = self._speaker_ref(speaker)
+        return row[:9] + (groups[group_key], speakers[speaker]) + row[12:]
+
     def insert_entry(self, example_id: str, source_text: str, gloss: str,
                      translation: str, notes: str = "",
                      source_text_cn: str = "", gloss_cn: str = "",
@@ -171,19 +1750,20 @@ class CorpusDatabase:
         Returns:
             新插入记录的ID
         """
-        now = datetime.now(timezone.utc).isoformat()
-        self.cursor.execute("""
-            INSERT INTO corpus (example_id, source_text, gloss, translation, notes,
-                              source_text_cn, gloss_cn, translation_cn,
-                              entry_type, group_id, group_name, speaker, turn_number,
-                              created_at, updated_at, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (example_id, source_text, gloss, translation, notes,
-              source_text_cn, gloss_cn, translation_cn,
-              entry_type, group_id, group_name, speaker, turn_number,
-              now, now, tags))
-        self.connection.commit()
-        return self.cursor.lastrowid
+        with self.transaction():
+            now = _utc_now()
+            group_ref = self._group_ref(group_id, group_name, entry_type)
+            speaker_ref = self._speaker_ref(speaker)
+            searchable = (example_id, source_text, gloss, translation, notes)
+            self.cursor.execute(_INSERT_SQL, (
+                *searchable,
+                source_text_cn, gloss_cn, translation_cn,
+                entry_type, group_ref, speaker_ref, turn_number,
+                now, now, tags, uuid.uuid4().hex, *map(fold_key, searchable)
+            ))
+            entry_id = self.cursor.lastrowid
+            self._sync_derived([entry_id], inserted=True)
+        return entry_id
 
     def update_entry(self, entry_id: int, example_id: str, source_text: str,
                      gloss: str, translation: str, notes: str = "",
@@ -215,20 +1795,25 @@ class CorpusDatabase:
         Returns:
             是否更新成功
         """
-        now = datetime.now(timezone.utc).isoformat()
-        self.cursor.execute("""
-            UPDATE corpus
-            SET example_id = ?, source_text = ?, gloss = ?, translation = ?, notes = ?,
-                source_text_cn = ?, gloss_cn = ?, translation_cn = ?,
-                entry_type = ?, group_id = ?, group_name = ?, speaker = ?, turn_number = ?,
-                updated_at = ?, tags = ?
-            WHERE id = ?
-        """, (example_id, source_text, gloss, translation, notes,
-              source_text_cn, gloss_cn, translation_cn,
-              entry_type, group_id, group_name, speaker, turn_number,
-              now, tags, entry_id))
-        self.connection.commit()
-        return self.cursor.rowcount > 0
+        with self.transaction():
+            now = _utc_now()
+            group_ref = self._group_ref(group_id, group_name, entry_type)
+            speaker_ref = self._speaker_ref(speaker)
+            self.cursor.execute("""
+                UPDATE corpus
+                SET example_id = ?, source_text = ?, gloss = ?, translation = ?, notes = ?,
+                    source_text_cn = ?, gloss_cn = ?, translation_cn = ?,
+                    entry_type = ?, group_ref = ?, speaker_ref = ?, turn_number = ?,
+                    updated_at = ?, tags = ?
+                WHERE id = ?
+            """, (example_id, source_text, gloss, translation, notes,
+                  source_text_cn, gloss_cn, translation_cn,
+                  entry_type, group_ref, speaker_ref, turn_number,
+                  now, tags, entry_id))
+            updated = self.cursor.rowcount > 0
+            if updated:
+                self._sync_derived([entry_id])
+        return updated
 
     def delete_entry(self, entry_id: int) -> bool:
         """
@@ -240,11 +1825,95 @@ class CorpusDatabase:
         Returns:
             是否删除成功
         """
-        self.cursor.execute("DELETE FROM corpus WHERE id = ?", (entry_id,))
-        self.connection.commit()
-        return self.cursor.rowcount > 0
+        with self.transaction():
+            self.cursor.execute("DELETE FROM corpus WHERE id = ?", (entry_id,))
+            deleted = self.cursor.rowcount
+            self._purge_ngrams()
+        return deleted > 0
+
+    def delete_entries(self, entry_ids: List[int]) -> int:
+        """
+        批量删除语料记录（单条 DELETE 语句，一个事务）
+
+        关联表、统计表等派生数据由触发器随之维护。
+
+        Args:
+            entry_ids: 记录ID列表
+
+        Returns:
+            删除的记录数
+        """
+        if not entry_ids:
+            return 0
+        with self.transaction():
+            self.cursor.execute(
+                "DELETE FROM corpus WHERE id IN (SELECT value FROM json_each(?))",
+                (_json_ids(entry_ids),)
+            )
+            deleted = self.cursor.rowcount
+            self._purge_ngrams()
+        return deleted
+
+    def update_entries(self, entry_ids: List[int], **fields) -> int:
+        """
+        批量更新语料记录的指定字段（单条 UPDATE 语句，一个事务）
+
+        例如 update_entries(ids, entry_type="word", speaker="A")。
+        修改 tags / source_text / 检索字段时同步标签关联、分词与折叠检索键。
+        group_id / speaker 换成 groups / speakers 的整数键写入；
+        只给 group_name 时重命名这些条目所属的分组。
+
+        Args:
+            entry_ids: 记录ID列表
+            **fields: 要设置的字段及其值（不可包含 id、created_at、updated_at）
+
+        Returns:
+            更新的记录数
+
+        Raises:
+            TypeError: 字段名无效
+        """
+        invalid = [name for name in fields if name not in _UPDATABLE_FIELDS]
+        if invalid:
+            raise TypeError(f"无效的字段: {', '.join(invalid)}")
+        if not entry_ids or not fields:
+            return 0
 
-    def get_entry(self, entry_id: int) -> Optional[Dict]:
+        ids = _json_ids(entry_ids)
+        now = _utc_now()
+        with self.transaction():
+            columns = {name: value for name, value in fields.items()
+                       if name not in ("group_id", "group_name", "speaker")}
+            if "group_id" in fields:
+                columns["group_ref"] = self._group_ref(
+                    fields["group_id"], fields.get("group_name"), fields.get("entry_type")
+                )
+            elif "group_name" in fields:
+                self.cursor.execute("""
+                    UPDATE groups SET name = ? WHERE id IN (
+                        SELECT group_ref FROM corpus WHERE id IN (SELECT value FROM json_each(?))
+                    )
+                """, (fields["group_name"] or "", ids))
+            if "speaker" in fields:
+                columns["speaker_ref"] = self._speaker_ref(fields["speaker"])
+            assignments = "".join(f"{name} = ?, " for name in columns)
+            self.cursor.execute(
+                f"UPDATE corpus SET {assignments}updated_at = ? "
+                f"WHERE id IN (SELECT value FROM json_each(?))",
+                (*columns.values(), now, ids)
+            )
+            updated = self.cursor.rowcount
+            if "tags" in fields:
+                self._sync_entry_tags(entry_ids)
+            if "source_text" in fields:
+                self._sync_tokens(entry_ids)
+            if any(name in SEARCH_FIELDS for name in fields):
+                self._sync_fold_keys(entry_ids)
+            if any(name in relevance.NGRAM_FIELDS for name in fields):
+                self._sync_ngrams(entry_ids)
+        return updated
+
+    def get_entry(self, entry_id: int) -> Optional[Entry]:
         """
         获取单条语料记录
 
@@ -252,87 +1921,171 @@ class CorpusDatabase:
             entry_id: 记录ID
 
         Returns:
-            语料记录字典，如果不存在则返回None
+            语料记录 Entry，如果不存在则返回None
         """
-        self.cursor.execute("SELECT * FROM corpus WHERE id = ?", (entry_id,))
-        row = self.cursor.fetchone()
-        return dict(row) if row else None
+        rows = self._fetch_entries("WHERE id = ?", (entry_id,))
+        return rows[0] if rows else None
 
-    def get_all_entries(self) -> List[Dict]:
+    def get_all_entries(self) -> List[Entry]:
         """
         获取所有语料记录
 
         Returns:
             语料记录列表
         """
-        self.cursor.execute("SELECT * FROM corpus ORDER BY id")
-        rows = self.cursor.fetchall()
-        return [dict(row) for row in rows]
+        return self._fetch_entries("ORDER BY id")
 
     def search_entries(self, field: str, keyword: str,
                        use_regex: bool = False, entry_type: str = None,
-                       tags: List[str] = None) -> List[Dict]:
+                       tags: List[str] = None,
+                       ignore_diacritics: bool = False) -> List[Entry]:
         """
         搜索语料记录
 
         Args:
             field: 搜索字段 (example_id, source_text, gloss, translation, notes)
             keyword: 搜索关键词
-            use_regex: 是否使用正则表达式（暂不支持SQLite原生正则）
+            use_regex: keyword 是否为正则表达式（Python re 语法，re.search 语义）
             entry_type: 数据类型筛选 (word, sentence, discourse, dialogue)，None表示全部类型
             tags: 标签筛选列表，None表示不按标签筛选
+            ignore_diacritics: 忽略变音符、声调和大小写（在 *_key 折叠列上检索，
+                见 fold_key；正则模式下正则直接匹配折叠后的文本）
 
         Returns:
             符合条件的语料记录列表
+
+        Raises:
+            re.error: use_regex 为 True 且正则表达式无效
+        """
+        where = self._search_conditions(field, keyword, entry_type, tags, use_regex,
+                                        ignore_diacritics)
+        if where is None:
+            return []
+
+        conditions, params = where
+        return self._fetch_entries(f"WHERE {' AND '.join(conditions)} ORDER BY id", params)
+
+    def _search_conditions(self, field: str, keyword: str, entry_type: str = None,
+                           tags: List[str] = None, use_regex: bool = False,
+                           ignore_diacritics: bool = False,
+                           source: CorpusSource = None) -> Optional[Tuple[List[str], list]]:
+        """
+        构建搜索的 WHERE 条件
+
+        Args:
+            source: 联合检索时条件所针对的语料库（索引表加库名前缀），None 表示当前数据库
+
+        Returns:
+            (条件列表, 参数列表)；字段不合法时返回 None
         """
-        # SQLite的LIKE进行模糊搜索
         if field == "all":
-            # 搜索所有字段
-            if entry_type:
-                query = """
-                    SELECT * FROM corpus
-                    WHERE (example_id LIKE ? OR source_text LIKE ?
-                       OR gloss LIKE ? OR translation LIKE ? OR notes LIKE ?)
-                       AND entry_type = ?
-                    ORDER BY id
-                """
-                pattern = f"%{keyword}%"
-                self.cursor.execute(query, (pattern, pattern, pattern, pattern, pattern, entry_type))
-            else:
-                query = """
-                    SELECT * FROM corpus
-                    WHERE example_id LIKE ? OR source_text LIKE ?
-                       OR gloss LIKE ? OR translation LIKE ? OR notes LIKE ?
-                    ORDER BY id
-                """
-                pattern = f"%{keyword}%"
-                self.cursor.execute(query, (pattern, pattern, pattern, pattern, pattern))
+            search_fields = SEARCH_FIELDS
+        elif field in SEARCH_FIELDS:
+            search_fields = [field]
         else:
-            # 搜索特定字段
-            allowed_fields = ["example_id", "source_text", "gloss", "translation", "notes"]
-            if field not in allowed_fields:
-                return []
-
-            if entry_type:
-                query = f"SELECT * FROM corpus WHERE {field} LIKE ? AND entry_type = ? ORDER BY id"
-                self.cursor.execute(query, (f"%{keyword}%", entry_type))
-            else:
-                query = f"SELECT * FROM corpus WHERE {field} LIKE ? ORDER BY id"
-                self.cursor.execute(query, (f"%{keyword}%",))
+            return None
+
+        schema = f"{source.schema}." if source else ""
+        if source is None:
+            source = CorpusSource("main", "", self.db_path,
+                                  self._fts_enabled, self._fold_fts_enabled)
+        if ignore_diacritics:
+            # 折叠列及其全文索引，检索词按同样规则折叠
+            search_fields = [f"{f}_key" for f in search_fields]
+            fts_table, fts_enabled = "corpus_fold_fts", source.fold_fts_enabled
+            fts_field = f"{field}_key"
+            if not use_regex:
+                keyword = fold_key(keyword)
+        else:
+            fts_table, fts_enabled = "corpus_fts", source.fts_enabled
+            fts_field = field
+        fts_condition = (f"id IN (SELECT rowid FROM {schema}{fts_table} "
+                         f"WHERE {fts_table} MATCH ?)")
+
+        def fts_match(text: str) -> str:
+            match = _fts_phrase(text)
+            return match if field == "all" else f"{fts_field} : {match}"
+
+        conditions = []
+        params = []
+        if use_regex:
+            _compile_regex(keyword)  # 无效的正则在查询前报错
+            # 正则中必含的字面子串先走 FTS 索引缩小范围，REGEXP 只在候选行上执行
+            literal = _regex_literal(keyword)
+            if fts_enabled and len(literal) >= FTS_MIN_KEYWORD_LENGTH:
+                conditions.append(fts_condition)
+                params.append(fts_match(literal))
+            conditions.append("(" + " OR ".join(f"{f} REGEXP ?" for f in search_fields) + ")")
+            params.extend([keyword] * len(search_fields))
+        elif fts_enabled and len(keyword) >= FTS_MIN_KEYWORD_LENGTH:
+            # FTS5 trigram 索引：子串匹配走索引而不是全表扫描
+            conditions.append(fts_condition)
+            params.append(fts_match(keyword))
+        else:
+            # 回退：SQLite 的 LIKE 模糊搜索
+            pattern = f"%{keyword}%"
+            conditions.append("(" + " OR ".join(f"{f} LIKE ?" for f in search_fields) + ")")
+            params.extend([pattern] * len(search_fields))
 
-        rows = self.cursor.fetchall()
-        results = [dict(row) for row in rows]
+        if entry_type:
+            conditions.append("entry_type = ?")
+            params.append(entry_type)
 
-        # 标签筛选（在内存中过滤）
         if tags:
-            filtered = []
-            for entry in results:
-                entry_tags = [t.strip() for t in (entry.get('tags', '') or '').split(',') if t.strip()]
-                if any(t in entry_tags for t in tags):
-                    filtered.append(entry)
-            results = filtered
+            conditions.append(f"id IN ({_TAGGED_IDS_TEMPLATE.format(schema=schema)})")
+            params.append(json.dumps(list(tags)))
 
-        return results
+        return conditions, params
+
+    def iter_entries(self, entry_type: str = None, after_id: int = None,
+                     page_size: int = ITER_PAGE_SIZE) -> Iterator[Entry]:
+        """
+        按 id 顺序流式遍历语料记录（keyset 分页，内存占用与 page_size 成正比）
+
+        Args:
+            entry_type: 条目类型筛选，None 表示全部类型
+            after_id: 从该 id 之后开始（用于断点续读），None 表示从头开始
+            page_size: 每页读取的行数
+
+        Yields:
+            语料记录 Entry
+        """
+        conditions, params = [], []
+        if entry_type:
+            conditions.append("entry_type = ?")
+            params.append(entry_type)
+        yield from self._iter_pages(conditions, params, after_id, page_size)
+
+    def iter_search_entries(self, field: str, keyword: str, entry_type: str = None,
+                            tags: List[str] = None, after_id: int = None,
+                            page_size: int = ITER_PAGE_SIZE, use_regex: bool = False,
+                            ignore_diacritics: bool = False) -> Iterator[Entry]:
+        """
+        search_entries 的流式版本（keyset 分页），参数含义同 search_entries
+
+        Yields:
+            符合条件的语料记录 Entry
+        """
+        where = self._search_conditions(field, keyword, entry_type, tags, use_regex,
+                                        ignore_diacritics)
+        if where is None:
+            return
+        yield from self._iter_pages(*where, after_id, page_size)
+
+    def _iter_pages(self, conditions: List[str], params: list,
+                    after_id: Optional[int], page_size: int) -> Iterator[Entry]:
+        """按 id > 上一页最后一个 id 逐页查询，每页取完后再交给调用方"""
+        page_size = max(1, page_size)
+        last_id = after_id if after_id is not None else 0
+        where = " AND ".join(conditions + ["id > ?"])
+        while True:
+            rows = self._fetch_entries(
+                f"WHERE {where} ORDER BY id LIMIT ?", (*params, last_id, page_size)
+            )
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1].id
 
     def get_count(self) -> int:
         """
@@ -341,8 +2094,7 @@ class CorpusDatabase:
         Returns:
             语料记录总数
         """
-        self.cursor.execute("SELECT COUNT(*) FROM corpus")
-        return self.cursor.fetchone()[0]
+        return self._fetchone("SELECT COUNT(*) FROM corpus")[0]
 
     def import_from_list(self, entries: List[Dict]) -> int:
         """
@@ -354,32 +2106,132 @@ class CorpusDatabase:
         Returns:
             成功导入的记录数
         """
-        count = 0
-        for entry in entries:
+        return self.bulk_import(entries).imported
+
+    def bulk_import(self, entries: List[Dict], chunk_size: int = IMPORT_CHUNK_SIZE,
+                    progress_callback: Callable[[int, int], None] = None) -> ImportResult:
+        """
+        单事务批量导入语料
+
+        按 chunk_size 分块调用 executemany，整个导入只提交一次。
+        某一块写入失败时回滚该块并逐行重试，记录失败行而不中断整批导入。
+        导入期间暂停全文索引的逐行触发器（写入后整批补齐）并放大页缓存，
+        耗时与行数成正比。
+
+        Args:
+            entries: 语料记录列表，每个元素为字典
+            chunk_size: 每块行数
+            progress_callback: 进度回调 (已处理数, 总数)，每块完成后调用一次
+
+        Returns:
+            ImportResult（成功数与失败记录）
+        """
+        result = ImportResult(total=len(entries))
+        now = _utc_now()
+        chunk_size = max(1, chunk_size)
+
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM corpus")
+        last_id = self.cursor.fetchone()[0]
+
+        cache_size = self.connection.execute("PRAGMA cache_size").fetchone()[0]
+        self.connection.execute(f"PRAGMA cache_size = {-IMPORT_CACHE_KIB}")
+        try:
+            with self.transaction(), self._suspended_triggers(_IMPORT_SUSPENDED_TRIGGERS):
+                self._import_chunks(entries, chunk_size, now, result, progress_callback)
+                self._index_imported(last_id)
+        finally:
+            self.connection.execute(f"PRAGMA cache_size = {cache_size}")
+
+        result.failed.sort()
+        for index, error in result.failed:
+            logger.error("导入记录失败 (第 %d 条): %s", index + 1, error)
+        return result
+
+    def _import_chunks(self, entries: List[Dict], chunk_size: int, now: str,
+                       result: ImportResult, progress_callback):
+        """bulk_import 的分块写入（在其事务中调用）"""
+        group_refs: Dict = {}
+        speaker_refs: Dict = {}
+        for start in range(0, len(entries), chunk_size):
+            rows = []
+            for index, entry in enumerate(entries[start:start + chunk_size], start):
+                try:
+                    rows.append((index, self._ref_row(_import_row(entry, now),
+                                                      group_refs, speaker_refs)))
+                except (TypeError, ValueError) as e:
+                    result.failed.append((index, str(e)))
+
+            self.cursor.execute("SAVEPOINT import_chunk")
             try:
-                self.insert_entry(
-                    example_id=entry.get("example_id", ""),
-                    source_text=entry.get("source_text", ""),
-                    gloss=entry.get("gloss", ""),
-                    translation=entry.get("translation", ""),
-                    notes=entry.get("notes", ""),
-                    source_text_cn=entry.get("source_text_cn", ""),
-                    gloss_cn=entry.get("gloss_cn", ""),
-                    translation_cn=entry.get("translation_cn", ""),
-                    entry_type=entry.get("entry_type", "sentence"),
-                    group_id=entry.get("group_id", ""),
-                    group_name=entry.get("group_name", ""),
-                    speaker=entry.get("speaker", ""),
-                    turn_number=entry.get("turn_number", None),
-                    tags=entry.get("tags", "")
+                self.cursor.executemany(_INSERT_SQL, [row for _, row in rows])
+                result.imported += len(rows)
+            except sqlite3.Error:
+                # 回滚本块后逐行重试，定位失败记录
+                self.cursor.execute("ROLLBACK TO import_chunk")
+                for index, row in rows:
+                    try:
+                        self.cursor.execute(_INSERT_SQL, row)
+                        result.imported += 1
+                    except sqlite3.Error as e:
+                        result.failed.append((index, str(e)))
+            self.cursor.execute("RELEASE import_chunk")
+
+            if progress_callback:
+                progress_callback(min(start + chunk_size, len(entries)), len(entries))
+
+    def _index_imported(self, last_id: int):
+        """为 id 大于 last_id 的新行整批写入全文索引、同步派生数据并累加词频与词例数（触发器暂停期间）"""
+        indexes = (("corpus_fts", SEARCH_FIELDS, self._fts_enabled),
+                   ("corpus_fold_fts", FOLD_KEY_COLUMNS, self._fold_fts_enabled))
+        for table, columns, enabled in indexes:
+            if enabled:
+                names = ", ".join(columns)
+                self.cursor.execute(
+                    f"INSERT INTO {table}(rowid, {names}) SELECT id, {names} FROM corpus WHERE id > ?",
+                    (last_id,)
                 )
-                count += 1
-            except Exception as e:
-                logger.error("导入记录失败: %s", e)
-                continue
-        return count
+        self.cursor.execute("SELECT id FROM corpus WHERE id > ?", (last_id,))
+        self._sync_derived([row[0] for row in self.cursor.fetchall()], inserted=True)
+        self.cursor.execute("""
+            INSERT INTO word_freq (form, count)
+            SELECT form, COUNT(*) FROM tokens WHERE entry_id > ? GROUP BY form
+            ON CONFLICT(form) DO UPDATE SET count = count + excluded.count
+        """, (last_id,))
+        self.cursor.execute("""
+            INSERT INTO word_freq_by_type (entry_type, form, count)
+            SELECT COALESCE(entry_type, ''), form, COUNT(*) FROM tokens WHERE entry_id > ?
+            GROUP BY COALESCE(entry_type, ''), form
+            ON CONFLICT(entry_type, form) DO UPDATE SET count = count + excluded.count
+        """, (last_id,))
+        self.cursor.execute("""
+            UPDATE stats_by_type SET tokens = tokens + (
+                SELECT COUNT(*) FROM tokens
+                WHERE entry_id > ? AND COALESCE(tokens.entry_type, '') = stats_by_type.entry_type
+            )
+        """, (last_id,))
+
+    @contextmanager
+    def _suspended_triggers(self, names):
+        """
+        在当前事务中暂时删除指定的触发器，退出时按原定义重建（须在 transaction() 内使用）
+
+        删除与重建都在事务中，其他连接看不到中间状态；事务回滚时触发器随之恢复。
+        """
+        placeholders = ", ".join("?" * len(names))
+        self.cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+            tuple(names)
+        )
+        triggers = self.cursor.fetchall()
+        for name, _ in triggers:
+            self.cursor.execute(f"DROP TRIGGER {name}")
+        try:
+            yield
+        finally:
+            for _, sql in triggers:
+                self.cursor.execute(sql)
 
-    def get_entries_by_type(self, entry_type: str) -> List[Dict]:
+    def get_entries_by_type(self, entry_type: str) -> List[Entry]:
         """
         按类型获取语料记录
 
@@ -389,34 +2241,29 @@ class CorpusDatabase:
         Returns:
             符合类型的语料记录列表
         """
-        self.cursor.execute(
-            "SELECT * FROM corpus WHERE entry_type = ? ORDER BY id",
-            (entry_type,)
-        )
-        rows = self.cursor.fetchall()
-        return [dict(row) for row in rows]
+        return self._fetch_entries("WHERE entry_type = ? ORDER BY id", (entry_type,))
 
     def get_groups_by_type(self, entry_type: str) -> List[Dict]:
         """
         获取指定类型的所有分组（语篇或对话）
 
+        只读 groups 表（成员数由触发器维护），不扫描语料表。
+
         Args:
             entry_type: discourse 或 dialogue
 
         Returns:
             分组列表，每个包含 group_id, group_name, count
         """
-        self.cursor.execute("""
-            SELECT group_id, group_name, COUNT(*) as count
-            FROM corpus
-            WHERE entry_type = ? AND group_id IS NOT NULL AND group_id != ''
-            GROUP BY group_id, group_name
-            ORDER BY group_id
+        rows = self._fetchall("""
+            SELECT code AS group_id, name AS group_name, member_count AS count
+            FROM groups
+            WHERE entry_type = ?
+            ORDER BY code
         """, (entry_type,))
-        rows = self.cursor.fetchall()
         return [dict(row) for row in rows]
 
-    def get_entries_by_group(self, group_id: str) -> List[Dict]:
+    def get_entries_by_group(self, group_id: str) -> List[Entry]:
         """
         获取某个分组（语篇/对话）的所有条目
 
@@ -426,45 +2273,66 @@ class CorpusDatabase:
         Returns:
             该分组的所有语料记录
         """
-        self.cursor.execute("""
-            SELECT * FROM corpus
-            WHERE group_id = ?
+        return self._fetch_entries("""
+            WHERE group_ref = (SELECT id FROM groups WHERE code = ?)
             ORDER BY turn_number, id
         """, (group_id,))
-        rows = self.cursor.fetchall()
-        return [dict(row) for row in rows]
 
-    def get_next_group_id(self, entry_type: str) -> str:
+    def get_next_group_id(self, entry_type: str) -> str:
+        """
+        预览下一个分组ID（不占用编号，创建分组请用 create_group）
+
+        Args:
+            entry_type: discourse 或 dialogue
+
+        Returns:
+            新的分组ID (如 DSC001, DLG001)
+        """
+        prefix = _group_prefix(entry_type)
+        row = self._fetchone(
+            "SELECT last_value FROM group_sequences WHERE prefix = ?", (prefix,)
+        )
+        return f"{prefix}{(row[0] if row else 0) + 1:03d}"
+
+    def create_group(self, entry_type: str, group_name: str = "") -> str:
         """
-        生成下一个分组ID
+        从编号序列分配一个分组ID并创建分组（尚无条目时也会出现在分组列表中）
 
         Args:
             entry_type: discourse 或 dialogue
+            group_name: 分组名称
 
         Returns:
-            新的分组ID (如 DSC001, DLG001)
+            新的分组ID
         """
-        prefix = "DSC" if entry_type == "discourse" else "DLG"
-        self.cursor.execute("""
-            SELECT group_id FROM corpus
-            WHERE entry_type = ? AND group_id LIKE ?
-            ORDER BY group_id DESC LIMIT 1
-        """, (entry_type, f"{prefix}%"))
-        row = self.cursor.fetchone()
+        with self.transaction():
+            group_id = self._allocate_group_code(entry_type)
+            self.cursor.execute(
+                "INSERT INTO groups (code, entry_type, name) VALUES (?, ?, ?)",
+                (group_id, entry_type, group_name or "")
+            )
+        return group_id
 
-        if row and row[0]:
-            # 提取数字部分并加1
-            last_id = row[0]
-            try:
-                num = int(last_id[3:]) + 1
-                return f"{prefix}{num:03d}"
-            except:
-                return f"{prefix}001"
-        return f"{prefix}001"
+    def _allocate_group_code(self, entry_type: str) -> str:
+        """从编号序列取下一个未被占用的分组编号（须在事务中调用）"""
+        prefix = _group_prefix(entry_type)
+        while True:
+            self.cursor.execute("""
+                INSERT INTO group_sequences (prefix, last_value) VALUES (?, 1)
+                ON CONFLICT(prefix) DO UPDATE SET last_value = last_value + 1
+            """, (prefix,))
+            self.cursor.execute(
+                "SELECT last_value FROM group_sequences WHERE prefix = ?", (prefix,)
+            )
+            code = f"{prefix}{self.cursor.fetchone()[0]:03d}"
+            # 其他类型的分组可能已占用同名编号，跳过
+            self.cursor.execute("SELECT 1 FROM groups WHERE code = ?", (code,))
+            if self.cursor.fetchone() is None:
+                return code
 
     def delete_group(self, group_id: str) -> bool:
         """
-        删除整个分组（语篇/对话）的所有条目
+        删除整个分组（语篇/对话）及其所有条目
 
         Args:
             group_id: 分组ID
@@ -472,13 +2340,17 @@ class CorpusDatabase:
         Returns:
             是否删除成功
         """
-        self.cursor.execute("DELETE FROM corpus WHERE group_id = ?", (group_id,))
-        self.connection.commit()
+        with self.transaction():
+            self.cursor.execute("""
+                DELETE FROM corpus WHERE group_ref = (SELECT id FROM groups WHERE code = ?)
+            """, (group_id,))
+            self._purge_ngrams()
+            self.cursor.execute("DELETE FROM groups WHERE code = ?", (group_id,))
         return self.cursor.rowcount > 0
 
     def rename_group(self, group_id: str, new_name: str) -> bool:
         """
-        重命名分组
+        重命名分组（只修改 groups 表中的一行）
 
         Args:
             group_id: 分组ID
@@ -487,10 +2359,10 @@ class CorpusDatabase:
         Returns:
             是否重命名成功
         """
-        self.cursor.execute("""
-            UPDATE corpus SET group_name = ? WHERE group_id = ?
-        """, (new_name, group_id))
-        self.connection.commit()
+        with self.transaction():
+            self.cursor.execute("""
+                UPDATE groups SET name = ? WHERE code = ?
+            """, (new_name, group_id))
         return self.cursor.rowcount > 0
 
     def example_id_exists(self, example_id: str, exclude_id: int = None) -> bool:
@@ -505,16 +2377,16 @@ class CorpusDatabase:
             是否已存在
         """
         if exclude_id is not None:
-            self.cursor.execute(
+            row = self._fetchone(
                 "SELECT COUNT(*) FROM corpus WHERE example_id = ? AND id != ?",
                 (example_id, exclude_id)
             )
         else:
-            self.cursor.execute(
+            row = self._fetchone(
                 "SELECT COUNT(*) FROM corpus WHERE example_id = ?",
                 (example_id,)
             )
-        return self.cursor.fetchone()[0] > 0
+        return row[0] > 0
 
     def get_stats(self) -> Dict:
         """
@@ -524,31 +2396,30 @@ class CorpusDatabase:
             {total, by_type: {word, sentence, discourse, dialogue},
              today_count, week_count}
         """
-        # 总计
-        self.cursor.execute("SELECT COUNT(*) FROM corpus")
-        total = self.cursor.fetchone()[0]
-
-        # 按类型统计
-        by_type = {}
-        for t in ['word', 'sentence', 'discourse', 'dialogue']:
-            self.cursor.execute("SELECT COUNT(*) FROM corpus WHERE entry_type = ?", (t,))
-            by_type[t] = self.cursor.fetchone()[0]
-
-        # 今日新增
-        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM corpus WHERE created_at LIKE ?",
-            (f"{today}%",)
-        )
-        today_count = self.cursor.fetchone()[0]
-
-        # 本周新增
-        week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM corpus WHERE created_at >= ?",
-            (week_ago,)
-        )
-        week_count = self.cursor.fetchone()[0]
+        by_type = {t: 0 for t in ['word', 'sentence', 'discourse', 'dialogue']}
+        total = 0
+        for entry_type, count in self._fetchall("SELECT entry_type, count FROM stats_by_type"):
+            total += count
+            if entry_type in by_type:
+                by_type[entry_type] = count
+
+        now = datetime.now(timezone.utc)
+        today = now.strftime('%Y-%m-%d')
+        row = self._fetchone("SELECT count FROM stats_by_day WHERE day = ?", (today,))
+        today_count = row[0] if row else 0
+
+        # 本周新增：边界日之后的整日直接累加日计数，边界日当天按时间戳走索引范围查询
+        week_ago = now - timedelta(days=7)
+        boundary_day = week_ago.strftime('%Y-%m-%d')
+        next_day = (week_ago + timedelta(days=1)).strftime('%Y-%m-%d')
+        week_count = self._fetchone(
+            "SELECT COALESCE(SUM(count), 0) FROM stats_by_day WHERE day > ?",
+            (boundary_day,)
+        )[0]
+        week_count += self._fetchone(
+            "SELECT COUNT(*) FROM corpus WHERE created_at >= ? AND created_at < ?",
+            (week_ago.isoformat(timespec="milliseconds"), next_day)
+        )[0]
 
         return {
             'total': total,
@@ -557,9 +2428,31 @@ class CorpusDatabase:
             'week_count': week_count
         }
 
+    def get_daily_counts(self, days: int = None) -> List[Tuple[str, int]]:
+        """
+        获取每日新增条目数（UTC 日期）时间序列
+
+        Args:
+            days: 只返回最近 N 天（含今天），None 表示全部
+
+        Returns:
+            [(YYYY-MM-DD, 条目数), ...]，按日期升序，没有新增的日期不出现
+        """
+        if days:
+            start = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+            rows = self._fetchall(
+                "SELECT day, count FROM stats_by_day WHERE day >= ? AND count > 0 ORDER BY day",
+                (start,)
+            )
+        else:
+            rows = self._fetchall(
+                "SELECT day, count FROM stats_by_day WHERE count > 0 ORDER BY day"
+            )
+        return [(row[0], row[1]) for row in rows]
+
     def get_word_frequencies(self, entry_type: str = None, limit: int = 20) -> List[Tuple[str, int]]:
         """
-        从 source_text 中分词统计词频
+        从 source_text 中分词统计词频（读取 tokens 触发器维护的词频表）
 
         Args:
             entry_type: 可选的类型筛选
@@ -569,26 +2462,35 @@ class CorpusDatabase:
             [(词, 频次), ...]
         """
         if entry_type:
-            self.cursor.execute(
-                "SELECT source_text FROM corpus WHERE entry_type = ?",
-                (entry_type,)
-            )
+            rows = self._fetchall("""
+                SELECT form, count FROM word_freq_by_type
+                WHERE entry_type = ? ORDER BY count DESC, form LIMIT ?
+            """, (entry_type, limit))
         else:
-            self.cursor.execute("SELECT source_text FROM corpus")
+            rows = self._fetchall(
+                "SELECT form, count FROM word_freq ORDER BY count DESC, form LIMIT ?", (limit,)
+            )
+        return [(row[0], row[1]) for row in rows]
 
-        rows = self.cursor.fetchall()
-        word_counts: Dict[str, int] = {}
+    def get_entries_containing_word(self, form: str, entry_type: str = None) -> List[Entry]:
+        """
+        查找 source_text 中包含某个词（按空白切分后完全相同）的条目
 
-        for row in rows:
-            text = row[0] or ''
-            for word in text.strip().split():
-                word = word.strip()
-                if word:
-                    word_counts[word] = word_counts.get(word, 0) + 1
+        Args:
+            form: 词形
+            entry_type: 可选的类型筛选
 
-        # 按频次降序排列
-        sorted_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)
-        return sorted_words[:limit]
+        Returns:
+            语料记录列表
+        """
+        if entry_type:
+            return self._fetch_entries("""
+                WHERE id IN (SELECT entry_id FROM tokens WHERE form = ? AND entry_type = ?)
+                ORDER BY id
+            """, (form, entry_type))
+        return self._fetch_entries(
+            "WHERE id IN (SELECT entry_id FROM tokens WHERE form = ?) ORDER BY id", (form,)
+        )
 
     def get_all_tags(self) -> List[str]:
         """
@@ -597,19 +2499,14 @@ class CorpusDatabase:
         Returns:
             标签列表
         """
-        self.cursor.execute("SELECT tags FROM corpus WHERE tags IS NOT NULL AND tags != ''")
-        rows = self.cursor.fetchall()
-
-        tag_set = set()
-        for row in rows:
-            for tag in row[0].split(','):
-                tag = tag.strip()
-                if tag:
-                    tag_set.add(tag)
-
-        return sorted(tag_set)
+        rows = self._fetchall("""
+            SELECT name FROM tags
+            WHERE EXISTS (SELECT 1 FROM entry_tags WHERE tag_id = tags.id)
+            ORDER BY name
+        """)
+        return [row[0] for row in rows]
 
-    def get_entries_by_tags(self, tags: List[str]) -> List[Dict]:
+    def get_entries_by_tags(self, tags: List[str]) -> List[Entry]:
         """
         返回包含任意一个指定标签的条目
 
@@ -622,20 +2519,10 @@ class CorpusDatabase:
         if not tags:
             return []
 
-        # 获取所有有标签的条目，在内存中过滤
-        self.cursor.execute(
-            "SELECT * FROM corpus WHERE tags IS NOT NULL AND tags != '' ORDER BY id"
+        return self._fetch_entries(
+            f"WHERE id IN ({_TAGGED_IDS_SQL}) ORDER BY id",
+            (json.dumps(list(tags)),)
         )
-        rows = self.cursor.fetchall()
-
-        results = []
-        for row in rows:
-            entry = dict(row)
-            entry_tags = [t.strip() for t in (entry.get('tags', '') or '').split(',') if t.strip()]
-            if any(t in entry_tags for t in tags):
-                results.append(entry)
-
-        return results
 
     def get_tag_distribution(self) -> List[Tuple[str, int]]:
         """
@@ -644,17 +2531,13 @@ class CorpusDatabase:
         Returns:
             [(标签, 数量), ...] 按数量降序
         """
-        self.cursor.execute("SELECT tags FROM corpus WHERE tags IS NOT NULL AND tags != ''")
-        rows = self.cursor.fetchall()
-
-        tag_counts: Dict[str, int] = {}
-        for row in rows:
-            for tag in row[0].split(','):
-                tag = tag.strip()
-                if tag:
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-
-        return sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
+        rows = self._fetchall("""
+            SELECT t.name, c.count
+            FROM (SELECT tag_id, COUNT(*) AS count FROM entry_tags GROUP BY tag_id) c
+            JOIN tags t ON t.id = c.tag_id
+            ORDER BY c.count DESC, t.name
+        """)
+        return [(row[0], row[1]) for row in rows]
 
     def batch_update_tags(self, entry_ids: List[int],
                           add_tags: List[str] = None,
@@ -662,6 +2545,8 @@ class CorpusDatabase:
         """
         批量更新标签
 
+        在 entry_tags 上执行集合操作，再由关联表回写 corpus.tags。
+
         Args:
             entry_ids: 条目ID列表
             add_tags: 要添加的标签列表
@@ -673,128 +2558,187 @@ class CorpusDatabase:
         if not entry_ids:
             return 0
 
-        updated = 0
-        now = datetime.now(timezone.utc).isoformat()
-
-        for eid in entry_ids:
-            self.cursor.execute("SELECT tags FROM corpus WHERE id = ?", (eid,))
-            row = self.cursor.fetchone()
-            if not row:
-                continue
-
-            current_tags = [t.strip() for t in (row[0] or '').split(',') if t.strip()]
+        ids = _json_ids(entry_ids)
+        now = _utc_now()
 
+        with self.transaction():
             if add_tags:
+                add_tags = _split_tags(",".join(add_tags))
+                self.cursor.executemany(
+                    "INSERT OR IGNORE INTO tags (name) VALUES (?)", [(tag,) for tag in add_tags]
+                )
+                # 逐个标签追加到末尾，保持标签顺序
                 for tag in add_tags:
-                    if tag not in current_tags:
-                        current_tags.append(tag)
+                    self.cursor.execute("""
+                        INSERT OR IGNORE INTO entry_tags (entry_id, tag_id, position)
+                        SELECT c.id, t.id,
+                               COALESCE((SELECT MAX(position) + 1 FROM entry_tags
+                                         WHERE entry_id = c.id), 0)
+                        FROM corpus c JOIN tags t ON t.name = ?
+                        WHERE c.id IN (SELECT value FROM json_each(?))
+                    """, (tag, ids))
 
             if remove_tags:
-                current_tags = [t for t in current_tags if t not in remove_tags]
-
-            new_tags_str = ','.join(current_tags)
-            self.cursor.execute(
-                "UPDATE corpus SET tags = ?, updated_at = ? WHERE id = ?",
-                (new_tags_str, now, eid)
-            )
-            updated += 1
+                self.cursor.execute("""
+                    DELETE FROM entry_tags
+                    WHERE entry_id IN (SELECT value FROM json_each(?))
+                      AND tag_id IN (SELECT id FROM tags WHERE name IN (SELECT value FROM json_each(?)))
+                """, (ids, json.dumps(list(remove_tags))))
 
-        self.connection.commit()
+            self.cursor.execute("""
+                UPDATE corpus
+                SET tags = COALESCE((
+                        SELECT group_concat(name, ',') FROM (
+                            SELECT t.name FROM entry_tags et JOIN tags t ON t.id = et.tag_id
+                            WHERE et.entry_id = corpus.id
+                            ORDER BY et.position
+                        )
+                    ), ''),
+                    updated_at = ?
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (now, ids))
+            updated = self.cursor.rowcount
         return updated
 
-    def find_duplicates(self, threshold: float = 1.0) -> List[List[Dict]]:
+    def find_duplicates(self, threshold: float = 1.0,
+                        progress_callback: Optional[Callable[[int, int], None]] = None,
+                        cancel_event: Optional[threading.Event] = None) -> List[List[Entry]]:
         """
         查找重复/相似语料
 
         Args:
             threshold: 匹配阈值
                 - 1.0: 精确匹配 (source_text.strip().lower() 分组)
-                - <1.0: 模糊匹配 (difflib.SequenceMatcher)
+                - <1.0: 模糊匹配（MinHash/LSH 生成候选对，多进程 SequenceMatcher 校验）
+            progress_callback: 模糊匹配的打分进度回调 (已完成对数, 总对数)
+            cancel_event: 模糊匹配的取消信号，置位后抛出 dedup.DetectionCancelled
 
         Returns:
             重复组列表，每组是包含相似条目的列表
         """
         if threshold >= 1.0:
             # SQL-based exact match - O(n) instead of O(n²)
-            self.cursor.execute("""
+            rows = self._fetchall("""
                 SELECT LOWER(TRIM(source_text)) as normalized
                 FROM corpus
                 WHERE source_text IS NOT NULL AND source_text != ''
                 GROUP BY normalized
                 HAVING COUNT(*) > 1
             """)
-            duplicate_keys = [row[0] for row in self.cursor.fetchall()]
+            duplicate_keys = [row[0] for row in rows]
 
             result = []
             for key in duplicate_keys:
-                self.cursor.execute(
-                    "SELECT * FROM corpus WHERE LOWER(TRIM(source_text)) = ? ORDER BY id",
-                    (key,)
+                group = self._fetch_entries(
+                    "WHERE LOWER(TRIM(source_text)) = ? ORDER BY id", (key,)
                 )
-                group = [dict(r) for r in self.cursor.fetchall()]
                 if len(group) > 1:
                     result.append(group)
             return result
         else:
-            self.cursor.execute("SELECT * FROM corpus ORDER BY id")
-            rows = self.cursor.fetchall()
-            entries = [dict(row) for row in rows]
+            entries = self._fetch_entries("ORDER BY id")
+            return dedup.find_near_duplicates(
+                self, entries, threshold,
+                progress_callback=progress_callback, cancel_event=cancel_event,
+            )
 
-            if not entries:
-                return []
+    def get_minhash_signatures(self) -> Dict[int, Tuple[str, bytes]]:
+        """
+        读取已缓存的 MinHash 签名
 
-            # 模糊匹配
-            used = set()
-            result = []
-            for i, a in enumerate(entries):
-                if i in used:
-                    continue
-                text_a = (a.get('source_text') or '').strip().lower()
-                if not text_a:
-                    continue
-                group = [a]
-                for j in range(i + 1, len(entries)):
-                    if j in used:
-                        continue
-                    text_b = (entries[j].get('source_text') or '').strip().lower()
-                    if not text_b:
-                        continue
-                    ratio = difflib.SequenceMatcher(None, text_a, text_b).ratio()
-                    if ratio >= threshold:
-                        group.append(entries[j])
-                        used.add(j)
-                if len(group) > 1:
-                    used.add(i)
-                    result.append(group)
-            return result
+        Returns:
+            {条目ID: (text_key, 签名 BLOB)}
+        """
+        rows = self._fetchall("SELECT entry_id, text_key, signature FROM minhash_signatures")
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def save_minhash_signatures(self, rows: List[Tuple[int, str, bytes]]):
+        """
+        写入（覆盖）MinHash 签名缓存
 
-    def create_backup(self) -> str:
+        Args:
+            rows: [(条目ID, text_key, 签名 BLOB), ...]
         """
-        创建数据库备份
+        with self._write_connection() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO minhash_signatures (entry_id, text_key, signature)
+                VALUES (?, ?, ?)
+            """, rows)
+
+    def create_backup(self, progress_callback: Optional[Callable[[int, int], None]] = None,
+                      backup_dir: Optional[str] = None) -> backup.SnapshotInfo:
+        """
+        创建增量快照备份（读取一致镜像，不阻塞写入，可在后台线程调用）
+
+        只保存相对上一快照变化的数据库页（按内容哈希去重、压缩），
+        随后按快照链执行保留策略，见 backup.SnapshotStore。
+
+        Args:
+            progress_callback: 备份进度回调 (已处理页数, 总页数)
+            backup_dir: 快照仓库目录，默认 ~/.fieldnote/backups
 
         Returns:
-            备份文件路径
+            新快照的 SnapshotInfo
         """
-        backup_dir = os.path.join(os.path.expanduser("~"), ".fieldnote", "backups")
-        os.makedirs(backup_dir, exist_ok=True)
+        store = backup.SnapshotStore(backup_dir or backup.DEFAULT_BACKUP_DIR)
+        info = store.create(self, progress_callback)
+        store.prune()
+        return info
 
-        # 清理 30 天前的旧备份
-        cutoff = datetime.now() - timedelta(days=30)
-        for filepath in glob_mod.glob(os.path.join(backup_dir, "corpus_*.db")):
-            try:
-                mtime = datetime.fromtimestamp(os.path.getmtime(filepath))
-                if mtime < cutoff:
-                    os.remove(filepath)
-                    logger.info("已清理旧备份: %s", filepath)
-            except OSError:
-                pass
+    def serialize(self, max_bytes: Optional[int] = None) -> Optional[bytes]:
+        """
+        读取数据库当前内容的一致内存镜像（一个读事务内完成，不写磁盘），可在后台线程调用
+
+        Args:
+            max_bytes: 数据库超过该大小时不读取，返回 None
+
+        Returns:
+            与数据库文件格式相同的字节串
+        """
+        with self._read_connection() as conn:
+            if max_bytes is not None:
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                if page_count * page_size > max_bytes:
+                    return None
+            return conn.serialize()
+
+    def backup_to(self, path: str,
+                  progress_callback: Optional[Callable[[int, int], None]] = None,
+                  pages: int = BACKUP_PAGES_PER_STEP):
+        """
+        使用 SQLite 在线备份 API 将数据库复制到 path
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"corpus_{timestamp}.db")
+        按页分步复制，得到一致的快照，复制期间不阻塞其他连接的写入。
+        先写入同目录的临时文件，完成后再替换目标文件。可在后台线程调用。
 
-        shutil.copy2(self.db_path, backup_path)
-        logger.info("数据库备份已创建: %s", backup_path)
-        return backup_path
+        Args:
+            path: 目标文件路径（已存在则覆盖）
+            progress_callback: 每步回调 (已复制页数, 总页数)
+            pages: 每步复制的页数
+        """
+        path = os.path.abspath(path)
+        if path == os.path.abspath(self.db_path):
+            raise ValueError("备份目标不能是当前数据库文件")
+
+        def on_progress(status, remaining, total):
+            if progress_callback:
+                progress_callback(total - remaining, total)
+
+        temp_path = path + ".part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        target = sqlite3.connect(temp_path)
+        try:
+            with self._read_connection() as source:
+                source.backup(target, pages=pages, progress=on_progress)
+            target.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
     def check_integrity(self) -> tuple:
         """
@@ -804,8 +2748,7 @@ class CorpusDatabase:
             (is_ok: bool, message: str)
         """
         try:
-            self.cursor.execute("PRAGMA integrity_check")
-            result = self.cursor.fetchone()
+            result = self._fetchone("PRAGMA integrity_check")
             if result and result[0] == "ok":
                 logger.info("数据库完整性检查通过")
                 return True, "数据库完整性检查通过，数据库状态正常。"
@@ -817,54 +2760,655 @@ class CorpusDatabase:
             logger.error("数据库完整性检查失败: %s", e)
             return False, f"完整性检查执行失败: {e}"
 
-    def get_context_entries_for_gloss(self, limit: int = 5) -> List[Dict]:
+    def find_relevant_entries(self, text: str, limit: int = 5, tags: List[str] = None,
+                              exclude_ids: List[int] = None) -> List[Entry]:
+        """
+        按 BM25 相关度查找与 text 最相似的有 gloss 条目
+
+        只读取查询词在 tokens 表中的倒排记录（form 索引）和候选条目的词数；
+        条目总数和平均词数取自触发器维护的 stats_by_type 汇总表（每个类型一行）。
+
+        Args:
+            text: 查询文本（按 tokens 表的规则分词）
+            limit: 最大返回条目数
+            tags: 只在带有任一这些标签的条目中检索，None 表示不限
+            exclude_ids: 排除的条目ID（例如正在编辑的条目）
+
+        Returns:
+            按相关度降序排列的条目列表（没有共同词的条目不返回）
+        """
+        terms = sorted(set(relevance.tokenize(text)))
+        if not terms or limit <= 0:
+            return []
+        terms_json = json.dumps(terms, ensure_ascii=False)
+
+        doc_count, total_tokens = self._fetchone(
+            "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(tokens), 0) FROM stats_by_type"
+        )
+        if not doc_count or not total_tokens:
+            return []
+        doc_freqs = dict(self._fetchall("""
+            SELECT form, COUNT(DISTINCT entry_id) FROM tokens
+            WHERE form IN (SELECT value FROM json_each(?))
+            GROUP BY form
+        """, (terms_json,)))
+
+        conditions = ["c.gloss IS NOT NULL AND c.gloss != ''"]
+        params = [terms_json]
+        if tags is not None:
+            conditions.append(f"t.entry_id IN ({_TAGGED_IDS_SQL})")
+            params.append(json.dumps(tags, ensure_ascii=False))
+        if exclude_ids:
+            conditions.append("t.entry_id NOT IN (SELECT value FROM json_each(?))")
+            params.append(_json_ids(exclude_ids))
+        postings: Dict[int, Dict[str, int]] = {}
+        for entry_id, form, tf in self._fetchall(f"""
+            SELECT t.entry_id, t.form, COUNT(*) FROM tokens t
+            JOIN corpus c ON c.id = t.entry_id
+            WHERE t.form IN (SELECT value FROM json_each(?)) AND {" AND ".join(conditions)}
+            GROUP BY t.entry_id, t.form
+        """, params):
+            postings.setdefault(entry_id, {})[form] = tf
+        if not postings:
+            return []
+
+        doc_lengths = dict(self._fetchall("""
+            SELECT entry_id, COUNT(*) FROM tokens
+            WHERE entry_id IN (SELECT value FROM json_each(?))
+            GROUP BY entry_id
+        """, (_json_ids(postings),)))
+
+        scores = relevance.bm25_scores(terms, postings, doc_lengths, doc_freqs,
+                                       doc_count, total_tokens / doc_count)
+        ranked = relevance.top_k(scores, limit)
+        by_id = {entry['id']: entry for entry in self._fetch_entries(
+            "WHERE id IN (SELECT value FROM json_each(?))", (_json_ids(ranked),)
+        )}
+        return [by_id[entry_id] for entry_id in ranked if entry_id in by_id]
+
+    def similar_entries(self, entry_id: int, k: int = 10) -> List[Tuple[Entry, float]]:
+        """
+        查找与指定条目最相似的条目（原文/词汇分解/翻译的字符 n-gram TF-IDF 余弦相似度）
+
+        候选生成只读取查询条目中 IDF 最高的若干 n-gram 的倒排记录
+        （总量不超过 SIMILAR_POSTINGS_BUDGET），再读取候选条目的完整向量做精确余弦重排，
+        耗时与语料规模基本无关。
+
+        Args:
+            entry_id: 查询条目ID
+            k: 最大返回条目数
+
+        Returns:
+            [(条目, 相似度), ...]，按相似度降序，不含查询条目本身
+        """
+        if k <= 0:
+            return []
+        doc_count = self._fetchone("SELECT COALESCE(SUM(count), 0) FROM stats_by_type")[0]
+        row = self._fetchone("SELECT grams FROM ngram_vectors WHERE entry_id = ?", (entry_id,))
+        if row is None:
+            return []
+        counts = relevance.unpack_vector(row[0])
+        doc_freqs = self._ngram_doc_freqs(counts)
+        query_rows = [(gram, tf, doc_freqs[gram]) for gram, tf in counts.items()
+                      if gram in doc_freqs]
+        query = {gram: relevance.tfidf_weight(tf, doc_count, df) for gram, tf, df in query_rows}
+
+        # 候选生成：按 IDF 从高到低（df 从低到高）选取查询 n-gram，直到读取预算用完
+        selected = []
+        budget = relevance.SIMILAR_POSTINGS_BUDGET
+        for gram, tf, df in sorted(query_rows, key=lambda row: row[2]):
+            if df <= 1:
+                continue  # 只有查询条目自身包含
+            if selected and budget - df < 0:
+                break
+            budget -= df
+            weight = relevance.tfidf_weight(1, doc_count, df)
+            selected.append([gram, query[gram] * weight])
+        if not selected:
+            return []
+        candidate_count = max(relevance.SIMILAR_MIN_CANDIDATES, 4 * k)
+        candidates = [row[0] for row in self._fetchall("""
+            WITH q(gram, weight) AS (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+                FROM json_each(?)
+            )
+            SELECT p.entry_id FROM q CROSS JOIN ngram_postings p ON p.gram = q.gram
+            WHERE p.entry_id != ?
+            GROUP BY p.entry_id
+            ORDER BY SUM(q.weight * p.tf) DESC, p.entry_id DESC
+            LIMIT ?
+        """, (json.dumps(selected), entry_id, candidate_count))]
+        if not candidates:
+            return []
+
+        # 精确重排：读取候选条目的完整 TF-IDF 向量
+        rows = self._fetchall("""
+            SELECT entry_id, grams FROM ngram_vectors
+            WHERE entry_id IN (SELECT value FROM json_each(?))
+        """, (_json_ids(candidates),), row_factory=lambda cursor, row: row)
+        candidate_counts = {candidate: relevance.unpack_vector(blob) for candidate, blob in rows}
+        doc_freqs.update(self._ngram_doc_freqs(
+            {gram for grams in candidate_counts.values() for gram in grams} - doc_freqs.keys()
+        ))
+        vectors = {candidate: {gram: relevance.tfidf_weight(tf, doc_count, doc_freqs[gram])
+                               for gram, tf in grams.items() if gram in doc_freqs}
+                   for candidate, grams in candidate_counts.items()}
+
+        ranked = relevance.cosine_top_k(query, vectors, k)
+        by_id = {entry['id']: entry for entry in self._fetch_entries(
+            "WHERE id IN (SELECT value FROM json_each(?))",
+            (_json_ids([candidate for candidate, _ in ranked]),)
+        )}
+        return [(by_id[candidate], score) for candidate, score in ranked if candidate in by_id]
+
+    def _ngram_doc_freqs(self, grams) -> Dict[int, int]:
+        """n-gram 的文档频率 {编号: df}"""
+        return dict(self._fetchall(
+            "SELECT gram, df FROM ngram_df WHERE gram IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(grams)),), row_factory=lambda cursor, row: row
+        ))
+
+    def get_context_entries_for_gloss(self, limit: int = 5, source_text: str = None,
+                                      exclude_id: int = None) -> List[Entry]:
         """
         获取用于 AI few-shot 示例的高质量上下文条目
 
-        优先返回标签含「已审核」或「定稿」的条目，
-        不足则用最近更新的有 gloss 的条目补充。
+        给出 source_text 时先按 BM25 相关度选取标签含「已审核」或「定稿」的条目，
+        再选取其他相关的有 gloss 条目；仍不足时按原规则补充：
+        优先标签含「已审核」或「定稿」的条目，再用最近更新的有 gloss 的条目。
 
         Args:
             limit: 最大返回条目数
+            source_text: 待分析的原文，None 表示不按相关度排序
+            exclude_id: 排除的条目ID（正在编辑的条目）
 
         Returns:
             条目列表
         """
         results = []
+        existing_ids = {exclude_id} if exclude_id is not None else set()
+
+        def extend(entries: List[Entry]):
+            for entry in entries:
+                if entry['id'] not in existing_ids and len(results) < limit:
+                    existing_ids.add(entry['id'])
+                    results.append(entry)
+
+        if source_text:
+            extend(self.find_relevant_entries(source_text, limit, tags=["已审核", "定稿"],
+                                              exclude_ids=existing_ids))
+            if len(results) < limit:
+                extend(self.find_relevant_entries(source_text, limit - len(results),
+                                                  exclude_ids=existing_ids))
 
         # 优先：标签含「已审核」或「定稿」的高质量条目
-        self.cursor.execute("""
-            SELECT * FROM corpus
-            WHERE gloss IS NOT NULL AND gloss != ''
-              AND source_text IS NOT NULL AND source_text != ''
-              AND (tags LIKE '%已审核%' OR tags LIKE '%定稿%')
-            ORDER BY updated_at DESC
-            LIMIT ?
-        """, (limit,))
-        rows = self.cursor.fetchall()
-        results.extend(dict(row) for row in rows)
+        if len(results) < limit:
+            extend(self._fetch_entries(f"""
+                WHERE gloss IS NOT NULL AND gloss != ''
+                  AND source_text IS NOT NULL AND source_text != ''
+                  AND id IN ({_TAGGED_IDS_SQL})
+                ORDER BY updated_at DESC
+                LIMIT ?
+            """, (json.dumps(["已审核", "定稿"]), limit + len(existing_ids))))
 
         # 不足则用最近更新的有 gloss 的条目补充
         if len(results) < limit:
-            existing_ids = {r['id'] for r in results}
-            remaining = limit - len(results)
-            self.cursor.execute("""
-                SELECT * FROM corpus
+            extend(self._fetch_entries("""
                 WHERE gloss IS NOT NULL AND gloss != ''
                   AND source_text IS NOT NULL AND source_text != ''
                 ORDER BY updated_at DESC
                 LIMIT ?
-            """, (remaining + len(existing_ids),))
-            rows = self.cursor.fetchall()
-            for row in rows:
-                entry = dict(row)
-                if entry['id'] not in existing_ids and len(results) < limit:
-                    results.append(entry)
+            """, (limit + len(existing_ids),)))
 
         return results
 
+    # ---- 变更日志 ----
+
+    def latest_change_seq(self) -> int:
+        """最新一条变更的序号（尚无变更时为 0）；全量处理后以此作为增量起点"""
+        row = self._fetchone("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")
+        return row[0] if row else 0
+
+    def changes_since(self, seq: int = 0, limit: int = None) -> List[Change]:
+        """
+        读取序号大于 seq 的变更（按序号升序）
+
+        Args:
+            seq: 调用方已处理到的序号
+            limit: 最多返回的条数，None 表示全部
+
+        Returns:
+            变更列表；处理完后以最后一条的 seq 作为下次的起点
+
+        Raises:
+            ChangeLogTruncated: seq 早于已清理的位置（中间的变更已不可用）
+        """
+        horizon = self._fetchone("SELECT seq FROM changes_horizon")[0]
+        if seq < horizon:
+            raise ChangeLogTruncated(f"变更日志已清理到 {horizon}，无法从 {seq} 继续")
+        rows = self._fetchall(
+            "SELECT seq, entry_id, op, ts FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, -1 if limit is None else limit),
+        )
+        return [Change(*row) for row in rows]
+
+    def compact_changes(self, through_seq: int = None) -> int:
+        """
+        压缩变更日志：每个条目只保留最新一条记录
+
+        压缩不影响任何起点的增量结果（见 Change 的消费约定）。
+        指定 through_seq 时还会删除 seq <= through_seq 的全部记录，
+        应在所有消费方都处理到该位置后使用，更早的起点此后会得到 ChangeLogTruncated。
+
+        Returns:
+            删除的记录数
+        """
+        with self.transaction():
+            self.cursor.execute("""
+                DELETE FROM changes WHERE seq NOT IN (
+                    SELECT MAX(seq) FROM changes GROUP BY entry_id
+                )
+            """)
+            removed = self.cursor.rowcount
+            if through_seq is not None:
+                self.cursor.execute("DELETE FROM changes WHERE seq <= ?", (through_seq,))
+                removed += self.cursor.rowcount
+                self.cursor.execute(
+                    "UPDATE changes_horizon SET seq = MAX(seq, ?)", (through_seq,)
+                )
+        return removed
+
+    def _auto_compact_changes(self):
+        """变更日志过长时压缩（关闭数据库前调用）"""
+        try:
+            count = self.connection.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+            if count > CHANGE_LOG_COMPACT_ROWS:
+                removed = self.compact_changes()
+                logger.info("变更日志已压缩，删除 %d 条", removed)
+        except sqlite3.Error as e:
+            logger.warning("压缩变更日志失败: %s", e)
+
+    # ---- 跨文件同步（见 sync.py） ----
+
+    def get_sync_digests(self) -> Dict[str, Tuple[str, bytes]]:
+        """全部条目的 {uid: (updated_at, 行哈希)}"""
+        rows = self._fetchall(_SYNC_DIGEST_SQL, row_factory=lambda cursor, row: row)
+        return _sync_digests(rows)
+
+    def get_tombstones(self) -> Dict[str, str]:
+        """已删除条目的 {uid: 删除时间}"""
+        return dict(self._fetchall(_TOMBSTONES_SQL, row_factory=lambda cursor, row: row))
+
+    def get_sync_groups(self) -> Dict[str, Tuple[str, str]]:
+        """全部分组的 {uid: (名称, 改名时间)}"""
+        return {row[0]: (row[1], row[2] or "") for row in self._fetchall(
+            _SYNC_GROUPS_SQL, row_factory=lambda cursor, row: row
+        )}
+
+    def export_sync_rows(self, uids: List[str]) -> List[Dict]:
+        """
+        读取要复制到另一方的条目（含分组 uid/编号/名称/类型与说话人）
+
+        Returns:
+            字典列表，交给另一方的 apply_sync_rows 写入
+        """
+        rows = self._fetchall(f"""
+            SELECT c.uid, c.created_at, c.updated_at, {_SYNC_SELECT},
+                   g.code AS group_code, g.name AS group_name,
+                   g.entry_type AS group_type, g.updated_at AS group_updated_at
+            {_SYNC_FROM}
+            WHERE c.uid IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(uids)),))
+        return [dict(row) for row in rows]
+
+    def _sync_group_ref(self, row: Dict) -> Optional[int]:
+        """
+        同步写入时的分组 uid -> groups.id（须在事务中调用）
+
+        本地没有该分组时创建；编号已被本地另一个分组占用时重新分配编号。
+        """
+        if row["group_uid"] is None:
+            return None
+        self.cursor.execute("SELECT id FROM groups WHERE uid = ?", (row["group_uid"],))
+        found = self.cursor.fetchone()
+        if found is not None:
+            return found[0]
+        code, entry_type = row["group_code"], row["group_type"]
+        self.cursor.execute("SELECT 1 FROM groups WHERE code = ?", (code,))
+        if self.cursor.fetchone() is not None:
+            code = self._allocate_group_code(entry_type)
+        self.cursor.execute("""
+            INSERT INTO groups (uid, code, entry_type, name, updated_at) VALUES (?, ?, ?, ?, ?)
+        """, (row["group_uid"], code, entry_type, row["group_name"] or "",
+              row["group_updated_at"]))
+        self._advance_group_sequence(code, entry_type)
+        return self.cursor.lastrowid
+
+    def apply_sync_rows(self, rows: List[Dict]) -> int:
+        """
+        写入另一方 export_sync_rows 读出的条目：uid 已存在则覆盖，否则新增
+
+        保留原有的 created_at / updated_at，并清除这些 uid 的删除记录。
+
+        Returns:
+            写入的行数
+        """
+        if not rows:
+            return 0
+        uids = json.dumps([row["uid"] for row in rows])
+        group_refs: Dict = {}
+        speaker_refs: Dict = {}
+        staged, inserts = [], []
+        updates: Dict[Tuple[int, ...], list] = {}  # {变化的列序号: [uid, ...]}
+        columns = ", ".join(_SYNC_WRITE_COLUMNS)
+        with self.transaction():
+            self.cursor.execute(f"""
+                SELECT {", ".join(_SYNC_WRITE_COLUMNS)} FROM corpus
+                WHERE uid IN (SELECT value FROM json_each(?))
+            """, (uids,))
+            existing = {row[-1]: tuple(row) for row in self.cursor.fetchall()}
+            for row in rows:
+                group_uid, speaker = row["group_uid"], row["speaker"]
+                if group_uid not in group_refs:
+                    group_refs[group_uid] = self._sync_group_ref(row)
+                if speaker not in speaker_refs:
+                    speaker_refs[speaker] = self._speaker_ref(speaker)
+                values = (*(row[name] for name in _SYNC_CONTENT_COLUMNS),
+                          group_refs[group_uid], speaker_refs[speaker],
+                          row["created_at"], row["updated_at"], row["uid"])
+                current = existing.get(row["uid"])
+                if current is None:
+                    inserts.append(row["uid"])
+                    staged.append(values)
+                    continue
+                changed = tuple(i for i, value in enumerate(values) if value != current[i])
+                if changed:
+                    updates.setdefault(changed, []).append(row["uid"])
+                    staged.append(values)
+
+            self.cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS sync_incoming ({columns}, PRIMARY KEY (uid))
+            """)
+            self.cursor.execute("DELETE FROM temp.sync_incoming")
+            self.cursor.executemany(
+                f"INSERT INTO temp.sync_incoming ({columns}) "
+                f"VALUES ({', '.join('?' * len(_SYNC_WRITE_COLUMNS))})", staged
+            )
+            for changed, changed_uids in updates.items():
+                names = ", ".join(_SYNC_WRITE_COLUMNS[i] for i in changed)
+                self.cursor.execute(f"""
+                    UPDATE corpus SET ({names}) = (
+                        SELECT {names} FROM temp.sync_incoming s WHERE s.uid = corpus.uid
+                    )
+                    WHERE uid IN (SELECT value FROM json_each(?))
+                """, (json.dumps(changed_uids),))
+            self.cursor.execute(f"""
+                INSERT INTO corpus ({columns})
+                SELECT {columns} FROM temp.sync_incoming
+                WHERE uid IN (SELECT value FROM json_each(?))
+            """, (json.dumps(inserts),))
+            self.cursor.execute("DELETE FROM temp.sync_incoming")
+            self.cursor.execute(
+                "DELETE FROM tombstones WHERE uid IN (SELECT value FROM json_each(?))", (uids,)
+            )
+            self.cursor.execute(
+                "SELECT id FROM corpus WHERE uid IN (SELECT value FROM json_each(?))", (uids,)
+            )
+            self._sync_derived([row[0] for row in self.cursor.fetchall()])
+        return len(rows)
+
+    def delete_entries_by_uid(self, uids: List[str]) -> int:
+        """
+        按 uid 删除条目（同步另一方的删除；删除记录由触发器写入）
+
+        Returns:
+            删除的行数
+        """
+        if not uids:
+            return 0
+        with self.transaction():
+            self.cursor.execute(
+                "DELETE FROM corpus WHERE uid IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(uids)),)
+            )
+            deleted = self.cursor.rowcount
+            self._purge_ngrams()
+        return deleted
+
+    def apply_group_renames(self, renames: List[Tuple[str, str, str]]) -> int:
+        """
+        同步分组名称
+
+        Args:
+            renames: [(分组 uid, 名称, 改名时间), ...]
+
+        Returns:
+            修改的分组数
+        """
+        if not renames:
+            return 0
+        with self.transaction():
+            self.cursor.executemany(
+                "UPDATE groups SET name = ?, updated_at = ? WHERE uid = ?",
+                [(name, updated_at, uid) for uid, name, updated_at in renames]
+            )
+            return self.cursor.rowcount
+
+    # ---- 联合检索（ATTACH 多个语料库） ----
+
+    def attach_corpus(self, path: str, label: str = None) -> str:
+        """
+        以只读方式附加另一个语料库文件，供 federated_* 方法联合查询
+
+        只读访问，不会写入该文件；schema 较旧的文件不会被迁移，需先在程序中打开一次完成升级。
+        附加关系只在本连接（及其只读连接池）中有效，关闭数据库后失效。
+
+        Args:
+            path: 语料库文件路径
+            label: 来源标签（结果中标记来源语料库），默认取文件名，重名时加序号
+
+        Returns:
+            实际使用的来源标签
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            ValueError: 不是语料库文件、已附加、版本与当前程序不同或超出可附加数量
+            sqlite3.OperationalError: 无法以只读方式附加
+        """
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"语料库文件不存在: {path}")
+        attached_paths = {os.path.abspath(self.db_path)}
+        attached_paths.update(source.path for source in self._sources.values())
+        if path in attached_paths:
+            raise ValueError(f"语料库已打开或已附加: {path}")
+        limit = self.connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(self._sources) >= limit:
+            raise ValueError(f"最多附加 {limit} 个语料库")
+
+        version = _corpus_schema_version(path)
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"语料库版本 (v{version}) 高于当前程序支持的版本: {path}")
+        if version < SCHEMA_VERSION:
+            raise ValueError(
+                f"语料库版本 (v{version}) 低于当前版本 (v{SCHEMA_VERSION})，"
+                f"请先打开该文件完成升级后再附加: {path}"
+            )
+
+        self._attach_seq += 1
+        alias = f"fed_{self._attach_seq}"
+        uri = Path(path).as_uri() + "?mode=ro"
+        self.connection.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+        self._check_attached_read_only(alias, path)
+        tables = {row[0] for row in self.connection.execute(
+            f"SELECT name FROM {alias}.sqlite_master WHERE type = 'table'"
+        )}
+
+        base = label or Path(path).stem
+        label, n = base, 1
+        while label in self._sources or label == self._main_label():
+            n += 1
+            label = f"{base} ({n})"
+        self._sources[label] = CorpusSource(alias, label, path, "corpus_fts" in tables,
+                                            "corpus_fold_fts" in tables)
+        self._update_reader_attachments()
+        logger.info("已附加语料库 %s: %s", label, path)
+        return label
+
+    def _check_attached_read_only(self, alias: str, path: str):
+        """
+        确认附加库确实以只读方式打开（URI 文件名未生效时 ATTACH 会把 URI 当作普通文件名）
+
+        Raises:
+            sqlite3.OperationalError: 附加的不是该文件或可以写入（已 DETACH）
+        """
+        attached = {row[1]: row[2] for row in self.connection.execute("PRAGMA database_list")}
+        writable = False
+        if os.path.realpath(attached.get(alias) or "") == os.path.realpath(path):
+            self.connection.execute("SAVEPOINT attach_probe")
+            try:
+                self.connection.execute(f"CREATE TABLE {alias}.attach_probe (x)")
+                writable = True
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                self.connection.execute("ROLLBACK TO attach_probe")
+                self.connection.execute("RELEASE attach_probe")
+        else:
+            writable = True
+        if writable:
+            self.connection.execute(f"DETACH DATABASE {alias}")
+            raise sqlite3.OperationalError(f"无法以只读方式附加语料库: {path}")
+
+    def detach_corpus(self, label: str) -> bool:
+        """
+        移除附加的语料库
+
+        Returns:
+            是否移除成功（标签不存在时返回 False）
+        """
+        source = self._sources.pop(label, None)
+        if source is None:
+            return False
+        self.connection.execute(f"DETACH DATABASE {source.schema}")
+        self._update_reader_attachments()
+        return True
+
+    def attached_corpora(self) -> List[CorpusSource]:
+        """已附加的语料库（按附加顺序，不含当前数据库）"""
+        return list(self._sources.values())
+
+    def _update_reader_attachments(self):
+        if self._readers is not None:
+            self._readers.set_attachments({
+                source.schema: Path(source.path).as_uri() + "?mode=ro"
+                for source in self._sources.values()
+            })
+
+    def _main_label(self) -> str:
+        return Path(self.db_path).stem
+
+    def _federation_sources(self) -> List[CorpusSource]:
+        """当前数据库及所有附加库"""
+        main = CorpusSource("main", self._main_label(), self.db_path,
+                            self._fts_enabled, self._fold_fts_enabled)
+        return [main, *self._sources.values()]
+
+    def federated_search(self, field: str, keyword: str, use_regex: bool = False,
+                         entry_type: str = None, tags: List[str] = None,
+                         ignore_diacritics: bool = False) -> List[Tuple[str, Entry]]:
+        """
+        在当前数据库及所有附加库中搜索（各库条件 UNION ALL 成一条 SQL），参数同 search_entries
+
+        Returns:
+            [(来源标签, Entry), ...]，按附加顺序（当前数据库在前）、库内按 id 排序；
+            Entry 的 id 为其所在库中的 id
+
+        Raises:
+            re.error: use_regex 为 True 且正则表达式无效
+        """
+        sources = self._federation_sources()
+        selects, params = [], []
+        for rank, source in enumerate(sources):
+            where = self._search_conditions(field, keyword, entry_type, tags, use_regex,
+                                            ignore_diacritics, source=source)
+            if where is None:
+                return []
+            conditions, condition_params = where
+            selects.append(f"SELECT ? AS source_rank, {_ENTRY_SELECT} "
+                           f"FROM {source.schema}.corpus_entries "
+                           f"WHERE {' AND '.join(conditions)}")
+            params.extend([rank, *condition_params])
+
+        labels = [source.label for source in sources]
+        return self._fetchall(
+            " UNION ALL ".join(selects) + " ORDER BY source_rank, id", params,
+            row_factory=lambda cursor, row: (labels[row[0]], Entry(*row[1:])),
+        )
+
+    def federated_stats(self) -> Dict[str, Dict]:
+        """
+        各语料库的条目统计（一条 SQL 读取各库的 stats_by_type 汇总表）
+
+        Returns:
+            {来源标签: {total, by_type: {word, sentence, discourse, dialogue}}}，
+            按附加顺序（当前数据库在前）
+        """
+        sources = self._federation_sources()
+        result = {}
+        for source in sources:
+            result[source.label] = {
+                'total': 0,
+                'by_type': {t: 0 for t in ['word', 'sentence', 'discourse', 'dialogue']},
+            }
+        rows = self._fetchall(" UNION ALL ".join(
+            f"SELECT ?, entry_type, count FROM {source.schema}.stats_by_type"
+            for source in sources
+        ), [source.label for source in sources])
+        for label, entry_type, count in rows:
+            stats = result[label]
+            stats['total'] += count
+            if entry_type in stats['by_type']:
+                stats['by_type'][entry_type] = count
+        return result
+
+    def federated_word_frequencies(self, entry_type: str = None,
+                                   limit: int = 20) -> List[Tuple[str, int, Dict[str, int]]]:
+        """
+        所有语料库合计的高频词（一条 SQL 合并各库的词频表）
+
+        Args:
+            entry_type: 可选的类型筛选
+            limit: 返回前N个高频词
+
+        Returns:
+            [(词, 合计频次, {来源标签: 频次}), ...]
+        """
+        sources = self._federation_sources()
+        selects, params = [], []
+        for source in sources:
+            if entry_type:
+                selects.append(f"SELECT ? AS corpus, form, count "
+                               f"FROM {source.schema}.word_freq_by_type WHERE entry_type = ?")
+                params.extend([source.label, entry_type])
+            else:
+                selects.append(f"SELECT ? AS corpus, form, count FROM {source.schema}.word_freq")
+                params.append(source.label)
+        rows = self._fetchall(f"""
+            SELECT form, SUM(count) AS total, json_group_object(corpus, count)
+            FROM ({" UNION ALL ".join(selects)})
+            GROUP BY form ORDER BY total DESC, form LIMIT ?
+        """, (*params, limit))
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
     def close(self):
         """关闭数据库连接"""
+        if self._readers:
+            self._readers.close()
         if self.connection:
+            self._auto_compact_changes()
+            self._optimize()
+            if self.profiler is not None:
+                self.profiler.flush()
             self.connection.close()
             logger.info("数据库已关闭: %s", self.db_path)
@@ -20,6 +20,7 @@ from PyQt6.QtGui import QFont, QAction, QShortcut, QKeySequence, QBrush, QColor,
 from PyQt6.QtPrintSupport import QPrintDialog, QPrinter
 
 from database import CorpusDatabase
+import query_log
 from exporter import WordExporter, TextFormatter
 from theme import ThemeManager
 import os
@@ -48,6 +49,7 @@ from ui.search_manager import SearchManagerMixin
 from ui.export_manager import ExportManagerMixin
 from ui.ai_coordinator import AICoordinatorMixin
 from ui.dialogs import DialogsMixin
+from ui.workers import WriteBehindWorker
 
 
 class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
@@ -56,6 +58,7 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
 
     def __init__(self):
         super().__init__()
+        self._init_query_log()
         self.db = CorpusDatabase()
         self.exporter = WordExporter()
         self.current_entry_id = None
@@ -71,6 +74,14 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
         self._ai_worker = None
         self._init_ai_manager()
 
+        # 后台备份线程
+        self._backup_workers = []
+
+        # 写后队列：交互式编辑在后台写线程中合并提交
+        self.write_queue = None
+        self._pending_writes = {}
+        self._init_write_queue()
+
         self.init_ui()
         self.apply_theme()
         self.apply_fonts()
@@ -208,7 +219,8 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
 
         if ok and group_name.strip():
             group_name = group_name.strip()
-            group_id = self.db.get_next_group_id(entry_type)
+            self.flush_pending_writes()
+            group_id = self.db.create_group(entry_type, group_name)
 
             QMessageBox.information(
                 self,
@@ -302,6 +314,13 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
 
         self.stats_layout.addWidget(overview_group)
 
+        # === 联合统计（附加了其他语料库时显示） ===
+        self.federation_stats_group = QGroupBox("联合统计")
+        self.federation_stats_layout = QVBoxLayout()
+        self.federation_stats_group.setLayout(self.federation_stats_layout)
+        self.federation_stats_group.setVisible(False)
+        self.stats_layout.addWidget(self.federation_stats_group)
+
         # === 高频词汇 ===
         freq_group = QGroupBox("高频词汇 (Top 20)")
         self.freq_layout = QVBoxLayout()
@@ -337,6 +356,12 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
         self.stats_recent_label.setText(
             f"今日新增: {stats['today_count']}条  本周: {stats['week_count']}条"
         )
+        daily = self.db.get_daily_counts(days=7)
+        self.stats_recent_label.setToolTip(
+            "\n".join(f"{day}: {count}条" for day, count in daily) or "近 7 日无新增"
+        )
+
+        self._refresh_federation_stats()
 
         # 高频词汇
         self._clear_layout(self.freq_layout)
@@ -385,6 +410,35 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
         else:
             self.tags_dist_layout.addWidget(QLabel("暂无标签数据"))
 
+    def _refresh_federation_stats(self):
+        """刷新联合统计：各语料库条目数及合计高频词"""
+        self._clear_layout(self.federation_stats_layout)
+        federated = bool(self.db.attached_corpora())
+        self.federation_stats_group.setVisible(federated)
+        if not federated:
+            return
+
+        type_labels = {"word": "单词", "sentence": "单句", "discourse": "语篇", "dialogue": "对话"}
+        for label, stats in self.db.federated_stats().items():
+            counts = "  ".join(
+                f"{type_labels[t]} {count}" for t, count in stats['by_type'].items()
+            )
+            self.federation_stats_layout.addWidget(
+                QLabel(f"{label}: {stats['total']:,} 条（{counts}）")
+            )
+
+        frequencies = self.db.federated_word_frequencies(limit=10)
+        if frequencies:
+            words = QLabel("合计高频词: " + "  ".join(
+                f"{word} ({total})" for word, total, _ in frequencies
+            ))
+            words.setWordWrap(True)
+            words.setToolTip("\n".join(
+                f"{word}: " + ", ".join(f"{label} {count}" for label, count in by_source.items())
+                for word, _, by_source in frequencies
+            ))
+            self.federation_stats_layout.addWidget(words)
+
     def _clear_layout(self, layout):
         """清空布局中的所有子项"""
         while layout.count():
@@ -420,6 +474,10 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
         backup_action.triggered.connect(self.manual_backup)
         file_menu.addAction(backup_action)
 
+        sync_action = QAction("与其他数据库同步...", self)
+        sync_action.triggered.connect(self.sync_database)
+        file_menu.addAction(sync_action)
+
         file_menu.addSeparator()
 
         print_action = QAction("打印...", self)
@@ -506,9 +564,13 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
                 file_path += '.db'
 
             try:
+                self.wait_for_backup_workers()
+                self._close_write_queue()
                 self.db.close()
                 self.db = CorpusDatabase(file_path)
+                self._init_write_queue()
                 self.refresh_table()
+                self.update_federation_label()
                 self.update_status_bar()
                 QMessageBox.information(
                     self,
@@ -533,9 +595,13 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
 
         if file_path:
             try:
+                self.wait_for_backup_workers()
+                self._close_write_queue()
                 self.db.close()
                 self.db = CorpusDatabase(file_path)
+                self._init_write_queue()
                 self.refresh_table()
+                self.update_federation_label()
                 self.update_status_bar()
                 self.clear_inputs()
                 QMessageBox.information(
@@ -571,52 +637,68 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
             if not file_path.endswith('.db'):
                 file_path += '.db'
 
-            try:
-                import shutil
-
-                if os.path.exists(file_path):
-                    reply = QMessageBox.question(
-                        self,
-                        "确认覆盖",
-                        f"文件已存在：\n{file_path}\n\n是否覆盖？",
-                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-                    )
-                    if reply != QMessageBox.StandardButton.Yes:
-                        return
-
-                shutil.copy2(current_db, file_path)
-
+            if os.path.exists(file_path):
                 reply = QMessageBox.question(
                     self,
-                    "另存为成功",
-                    f"数据库已保存到：\n{file_path}\n\n是否切换到新数据库？\n"
-                    f"(选择\"否\"将继续使用当前数据库)",
+                    "确认覆盖",
+                    f"文件已存在：\n{file_path}\n\n是否覆盖？",
                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
                 )
+                if reply != QMessageBox.StandardButton.Yes:
+                    return
 
-                if reply == QMessageBox.StandardButton.Yes:
-                    self.db.close()
-                    self.db = CorpusDatabase(file_path)
-                    self.refresh_table()
-                    self.update_status_bar()
-                    QMessageBox.information(
-                        self,
-                        "成功",
-                        f"已切换到新数据库：\n{file_path}"
-                    )
-                else:
-                    QMessageBox.information(
-                        self,
-                        "成功",
-                        f"数据库已保存到：\n{file_path}\n\n当前仍在使用：\n{current_db}"
-                    )
+            def on_error(message):
+                QMessageBox.critical(
+                    self,
+                    "错误",
+                    f"另存为失败：\n{message}"
+                )
 
+            self.flush_pending_writes()
+            db = self.db
+            self.start_backup_worker(
+                lambda progress, cancel: db.backup_to(file_path, progress),
+                lambda _: self._on_database_saved_as(current_db, file_path),
+                on_error, progress_label="正在保存数据库副本...",
+            )
+
+    def _on_database_saved_as(self, current_db, file_path):
+        """另存为完成后询问是否切换到新数据库"""
+        reply = QMessageBox.question(
+            self,
+            "另存为成功",
+            f"数据库已保存到：\n{file_path}\n\n是否切换到新数据库？\n"
+            f"(选择\"否\"将继续使用当前数据库)",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+
+        if reply == QMessageBox.StandardButton.Yes:
+            try:
+                self.wait_for_backup_workers()
+                self._close_write_queue()
+                self.db.close()
+                self.db = CorpusDatabase(file_path)
+                self._init_write_queue()
+                self.refresh_table()
+                self.update_federation_label()
+                self.update_status_bar()
+                QMessageBox.information(
+                    self,
+                    "成功",
+                    f"已切换到新数据库：\n{file_path}"
+                )
             except Exception as e:
                 QMessageBox.critical(
                     self,
                     "错误",
-                    f"另存为失败：\n{str(e)}"
+                    f"切换数据库失败：\n{str(e)}"
                 )
+        else:
+            QMessageBox.information(
+                self,
+                "成功",
+                f"数据库已保存到：\n{file_path}\n\n当前仍在使用：\n{current_db}"
+            )
 
     def load_font_config(self):
         """加载字体配置"""
@@ -798,6 +880,53 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
         except Exception as e:
             logger.error("保存主题偏好失败: %s", e)
 
+    # ===== 慢查询日志 =====
+
+    def _init_query_log(self):
+        """
+        按 app_config.json 启用慢查询日志（默认关闭）
+
+        "slow_query_log": true 启用，"slow_query_threshold_ms" 设置阈值（毫秒）。
+        """
+        config_path = os.path.join(os.path.expanduser("~"), ".fieldnote", "app_config.json")
+        try:
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                if config.get("slow_query_log", False):
+                    query_log.enable(float(config.get(
+                        "slow_query_threshold_ms", query_log.SLOW_QUERY_THRESHOLD_MS
+                    )))
+        except Exception as e:
+            logger.error("启用慢查询日志失败: %s", e)
+
+    # ===== 写后队列 =====
+
+    def _init_write_queue(self):
+        """启动写后队列（app_config.json 中 "write_behind": false 时改为同步写入）"""
+        config_path = os.path.join(os.path.expanduser("~"), ".fieldnote", "app_config.json")
+        try:
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    if not json.load(f).get("write_behind", True):
+                        return
+        except Exception:
+            pass
+        try:
+            self.write_queue = WriteBehindWorker(self.db.db_path, self)
+        except Exception as e:
+            logger.error("写后队列启动失败，改为同步写入: %s", e)
+            return
+        self.write_queue.batch_written_signal.connect(self._on_writes_landed)
+        self.write_queue.error_signal.connect(self._on_write_failed)
+
+    def _close_write_queue(self):
+        """写入全部待写操作并停止写后队列"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+            self.write_queue.deleteLater()
+            self.write_queue = None
+
     def apply_theme(self):
         """应用当前主题到整个应用"""
         app = QApplication.instance()
@@ -863,6 +992,8 @@ class MainWindow(QMainWindow, DataOperationsMixin, SearchManagerMixin,
     def closeEvent(self, event):
         """关闭事件处理"""
         self.save_window_state()
+        self.wait_for_backup_workers()
+        self._close_write_queue()  # 保证已提交的编辑全部落盘
         self.db.close()
         event.accept()
 
@@ -1191,11 +1322,17 @@ class BatchTagDialog(QDialog):
 class DuplicateDetectionDialog(QDialog):
     """语料去重检测对话框"""
 
-    def __init__(self, parent, db, theme_manager):
+    def __init__(self, parent, db, theme_manager, flush_writes=None):
+        """
+        Args:
+            flush_writes: 检测和删除前调用，等待写后队列落盘（None 表示没有写后队列）
+        """
         super().__init__(parent)
         self.db = db
         self.theme_manager = theme_manager
+        self._flush_writes = flush_writes or (lambda: None)
         self._groups = []
+        self._worker = None
         self.setWindowTitle("去重检测")
         self.setMinimumSize(1000, 650)
         self._build_ui()
@@ -1211,9 +1348,19 @@ class DuplicateDetectionDialog(QDialog):
         self.mode_combo.addItems(["完全相同", "相似>90%", "相似>80%"])
         control_layout.addWidget(self.mode_combo)
 
-        detect_btn = QPushButton("开始检测")
-        detect_btn.clicked.connect(self._run_detection)
-        control_layout.addWidget(detect_btn)
+        self.detect_btn = QPushButton("开始检测")
+        self.detect_btn.clicked.connect(self._run_detection)
+        control_layout.addWidget(self.detect_btn)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.hide()
+        control_layout.addWidget(self.progress_bar)
+
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.clicked.connect(self._cancel_detection)
+        self.cancel_btn.hide()
+        control_layout.addWidget(self.cancel_btn)
         control_layout.addStretch()
         layout.addLayout(control_layout)
 
@@ -1272,14 +1419,85 @@ class DuplicateDetectionDialog(QDialog):
         layout.addLayout(bottom_layout)
 
     def _run_detection(self):
-        """执行检测"""
+        """在后台线程执行检测，显示进度并允许取消"""
+        from ui.workers import DatabaseWorkerThread
+
+        if self._worker is not None:
+            return
         mode_map = {"完全相同": 1.0, "相似>90%": 0.9, "相似>80%": 0.8}
         threshold = mode_map[self.mode_combo.currentText()]
+        self._flush_writes()
 
-        self._groups = self.db.find_duplicates(threshold)
         self.group_list.clear()
         self.detail_table.setRowCount(0)
         self.diff_display.clear()
+        self.group_list.addItem("正在检测...")
+        self.detect_btn.setEnabled(False)
+        self.delete_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.show()
+
+        self._worker = DatabaseWorkerThread(
+            lambda progress, cancel: self.db.find_duplicates(
+                threshold, progress_callback=progress, cancel_event=cancel
+            ),
+            self,
+        )
+        self._worker.progress_signal.connect(self._on_detection_progress)
+        self._worker.finished_signal.connect(self._show_groups)
+        self._worker.error_signal.connect(self._on_detection_error)
+        self._worker.cancelled_signal.connect(self._on_detection_cancelled)
+        self._worker.finished.connect(self._on_worker_done)
+        self._worker.start()
+
+    def _cancel_detection(self):
+        """取消正在进行的检测"""
+        if self._worker is not None:
+            self.cancel_btn.setEnabled(False)
+            self._worker.cancel()
+
+    def _on_detection_progress(self, done, total):
+        """更新相似度打分进度"""
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat(f"比对候选 {done}/{total}")
+
+    def _on_detection_error(self, message):
+        self.group_list.clear()
+        QMessageBox.warning(self, "检测失败", f"去重检测出错：\n{message}")
+
+    def _on_detection_cancelled(self):
+        self.group_list.clear()
+        self.group_list.addItem("检测已取消")
+
+    def _on_worker_done(self):
+        """检测线程结束后恢复控件状态"""
+        self._worker = None
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+        self.detect_btn.setEnabled(True)
+        self.delete_btn.setEnabled(True)
+
+    def closeEvent(self, event):
+        """关闭对话框时取消并等待后台检测结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+        super().closeEvent(event)
+
+    def reject(self):
+        """Esc 关闭时同样先结束后台检测"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+        super().reject()
+
+    def _show_groups(self, groups):
+        """显示检测结果"""
+        self._groups = groups
+        self.group_list.clear()
 
         if not self._groups:
             self.group_list.addItem("未发现重复项")
@@ -1379,14 +1597,13 @@ class DuplicateDetectionDialog(QDialog):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            deleted = 0
+            entry_ids = []
             for index in selected:
-                row = index.row()
-                item = self.detail_table.item(row, 0)
+                item = self.detail_table.item(index.row(), 0)
                 if item:
-                    entry_id = int(item.text())
-                    if self.db.delete_entry(entry_id):
-                        deleted += 1
+                    entry_ids.append(int(item.text()))
+            self._flush_writes()
+            deleted = self.db.delete_entries(entry_ids)
 
             QMessageBox.information(self, "删除成功", f"已删除 {deleted} 条语料！")
             # 重新检测
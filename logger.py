@@ -7,6 +7,12 @@ import logging
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
 
+# 慢查询日志记录器名（不向上传播，只写入独立的慢查询日志文件）
+SLOW_QUERY_LOGGER = "fieldnote.slow_query"
+
+# 慢查询日志文件名
+SLOW_QUERY_LOG_FILE = "slow_queries.log"
+
 
 def setup_logger() -> logging.Logger:
     """
@@ -57,6 +63,38 @@ def setup_logger() -> logging.Logger:
     return logger
 
 
+def setup_slow_query_logger(log_dir: str = None) -> logging.Logger:
+    """
+    配置并返回慢查询日志记录器
+
+    - 日志目录: ~/.fieldnote/logs/（可指定）
+    - 文件名: slow_queries.log, 单文件最大 2MB, 保留 3 个备份
+    - 不向上传播到应用日志
+    """
+    if log_dir is None:
+        log_dir = os.path.join(os.path.expanduser("~"), ".fieldnote", "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, SLOW_QUERY_LOG_FILE)
+
+    logger = logging.getLogger(SLOW_QUERY_LOGGER)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    # 日志目录变化时替换 handler，相同目录不重复添加
+    for handler in list(logger.handlers):
+        if getattr(handler, "baseFilename", None) == os.path.abspath(log_file):
+            return logger
+        logger.removeHandler(handler)
+        handler.close()
+
+    handler = RotatingFileHandler(
+        log_file, maxBytes=2 * 1024 * 1024, backupCount=3, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
 def _cleanup_old_logs(log_dir: str, max_days: int = 30):
     """清理超过 max_days 天的日志文件"""
     cutoff = datetime.now() - timedelta(days=max_days)
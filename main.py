@@ -4,6 +4,7 @@ Fieldnotes Lite - 主程序
 """
 import sys
 import os
+import multiprocessing
 
 # 修复 Qt 路径问题（必须在导入 PyQt6 之前）
 if getattr(sys, 'frozen', False):
@@ -71,5 +72,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序中，去重检测的进程池子进程需要从这里分流
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,382 @@
+"""
+查询计时模块 - 慢查询日志（默认关闭）
+
+启用后，数据库连接以 QueryProfiler.connect 打开：execute / fetch 等执行语句的调用
+计入墙钟时间（含 I/O 与锁等待），set_trace_callback 标记语句的开始，调用时间
+归属到最近开始的语句；CorpusDatabase 的公开方法另有方法级计时。
+超过阈值的语句连同 EXPLAIN QUERY PLAN 写入 ~/.fieldnote/logs/slow_queries.log。
+"""
+import functools
+import inspect
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from logger import SLOW_QUERY_LOGGER, setup_slow_query_logger
+
+logger = logging.getLogger(__name__)
+
+# 默认慢查询阈值（毫秒）
+SLOW_QUERY_THRESHOLD_MS = 200.0
+
+# 日志中语句文本的最大长度（展开后的参数可能很长）
+MAX_SQL_LENGTH = 2000
+
+# 不做方法计时的 CorpusDatabase 公开方法
+UNTIMED_METHODS = frozenset({"close", "transaction"})
+
+_default_profiler: Optional["QueryProfiler"] = None
+
+
+@dataclass
+class MethodStats:
+    """单个方法的累计计时"""
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    slow: int = 0
+
+
+@dataclass
+class SlowStatement:
+    """一条慢语句"""
+    sql: str
+    duration_ms: float
+    db_path: str
+    method: Optional[str] = None
+
+
+class _StatementClock:
+    """
+    单个连接的语句计时状态（同一时刻只被执行语句的一个线程使用）
+
+    只累计 execute / fetch 调用内的时间，语句之间 Python 处理结果的时间不计入。
+    """
+
+    def __init__(self, profiler: "QueryProfiler", db_path: str):
+        self.profiler = profiler
+        self.db_path = db_path
+        self.sql: Optional[str] = None
+        self.elapsed = 0.0      # 当前语句已累计的秒数
+        self.calls = 0          # 正在进行的调用层数
+        self.since = 0.0        # 当前计时段的开始
+
+    def enter(self):
+        if self.calls == 0:
+            self.since = time.perf_counter()
+        self.calls += 1
+
+    def leave(self):
+        self.calls -= 1
+        if self.calls == 0:
+            self.elapsed += time.perf_counter() - self.since
+            self.profiler._leave()
+
+    def timed(self, call: Callable, *args, **kwargs):
+        """执行一次会运行语句的调用并计时"""
+        self.enter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            self.leave()
+
+    def on_statement(self, sql: str):
+        """trace 回调：上一条语句在此结束，之后的调用时间归属新语句"""
+        now = time.perf_counter()
+        if self.calls:
+            self.elapsed += now - self.since
+            self.since = now
+        self.finish()
+        self.sql = sql
+        self.elapsed = 0.0
+        self.profiler._touch(self)
+
+    def finish(self):
+        """结束当前语句的计时，超过阈值时登记为慢语句"""
+        if self.sql is None:
+            return
+        duration_ms = self.elapsed * 1000
+        if self.calls:
+            duration_ms += (time.perf_counter() - self.since) * 1000
+        sql, self.sql = self.sql, None
+        if duration_ms >= self.profiler.threshold_ms:
+            self.profiler._record(SlowStatement(sql, duration_ms, self.db_path))
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """执行与读取结果的调用计入连接的语句计时"""
+
+    def execute(self, *args):
+        return self.connection._clock.timed(super().execute, *args)
+
+    def executemany(self, *args):
+        return self.connection._clock.timed(super().executemany, *args)
+
+    def executescript(self, *args):
+        return self.connection._clock.timed(super().executescript, *args)
+
+    def fetchone(self):
+        return self.connection._clock.timed(super().fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self.connection._clock.timed(super().fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self.connection._clock.timed(super().fetchall)
+
+    def __next__(self):
+        return self.connection._clock.timed(super().__next__)
+
+
+class _TimedConnection(sqlite3.Connection):
+    """游标为 _TimedCursor 的连接（Connection.execute 等快捷方法与提交、回滚同样计时）"""
+
+    _clock: _StatementClock
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        return self._clock.timed(super().commit)
+
+    def rollback(self):
+        return self._clock.timed(super().rollback)
+
+
+class QueryProfiler:
+    """
+    语句计时与方法计时
+
+    慢语句先登记在执行线程中，最外层计时方法返回时（或关闭数据库调用 flush 时）
+    再查询执行计划并写日志，不在 SQLite 回调中访问数据库；不在计时方法中执行的语句
+    在其后第一次数据库调用返回时写出。
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+                 log: Optional[logging.Logger] = None):
+        self.threshold_ms = threshold_ms
+        self.log = log or logging.getLogger(SLOW_QUERY_LOGGER)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, MethodStats] = {}
+
+    # ---- 连接 ----
+
+    def connect(self, database: str, db_path: str, **kwargs) -> sqlite3.Connection:
+        """
+        打开带语句计时的连接
+
+        Args:
+            database: 传给 sqlite3.connect 的文件名或 URI
+            db_path: 日志中显示、获取执行计划用的数据库路径
+            **kwargs: sqlite3.connect 的其他参数
+        """
+        conn = sqlite3.connect(database, factory=_TimedConnection, **kwargs)
+        conn._clock = _StatementClock(self, db_path)
+        conn.set_trace_callback(conn._clock.on_statement)
+        return conn
+
+    def _state(self):
+        local = self._local
+        if not hasattr(local, "depth"):
+            local.depth = 0
+            local.method = None
+            local.clocks = set()
+            local.pending = []
+        return local
+
+    def _touch(self, clock: _StatementClock):
+        self._state().clocks.add(clock)
+
+    def _record(self, statement: SlowStatement):
+        state = self._state()
+        statement.method = state.method
+        state.pending.append(statement)
+
+    def _leave(self):
+        """一次数据库调用返回：不在计时方法中时写出已结束的慢语句"""
+        state = self._state()
+        if state.depth == 0 and state.pending:
+            pending, state.pending = state.pending, []
+            for statement in pending:
+                self._write(statement)
+
+    def flush(self):
+        """结束本线程各连接上正在计时的语句，并把登记的慢语句写入日志"""
+        state = self._state()
+        clocks, state.clocks = state.clocks, set()
+        for clock in clocks:
+            clock.finish()
+        pending, state.pending = state.pending, []
+        for statement in pending:
+            self._write(statement)
+
+    def _write(self, statement: SlowStatement):
+        sql = statement.sql
+        if len(sql) > MAX_SQL_LENGTH:
+            sql = sql[:MAX_SQL_LENGTH] + " ..."
+        lines = [f"慢语句 {statement.duration_ms:.1f} ms"
+                 + (f"（{statement.method}）" if statement.method else "")
+                 + f" [{statement.db_path}]", f"  SQL: {sql}"]
+        lines.extend(f"  计划: {step}" for step in explain(statement.db_path, statement.sql))
+        self.log.warning("\n".join(lines))
+
+    # ---- 方法 ----
+
+    def instrument(self, db):
+        """为 CorpusDatabase 实例的公开方法安装方法级计时"""
+        for name, member in inspect.getmembers(type(db), inspect.isfunction):
+            if name.startswith("_") or name in UNTIMED_METHODS:
+                continue
+            bound = getattr(db, name)
+            if inspect.isgeneratorfunction(member):
+                setattr(db, name, self._time_generator(name, bound))
+            else:
+                setattr(db, name, self._time_method(name, bound))
+
+    def _time_method(self, name: str, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with self._timer(name):
+                return method(*args, **kwargs)
+        return timed
+
+    def _time_generator(self, name: str, method: Callable) -> Callable:
+        """
+        生成器方法只计每次 next() 的执行时间：挂起期间调用方的耗时和语句不归属本方法，
+        各步累加后按一次调用计数
+        """
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            spent = [0.0]
+            with self._timer(name, spent):
+                steps = method(*args, **kwargs)
+            try:
+                while True:
+                    with self._timer(name, spent):
+                        try:
+                            item = next(steps)
+                        except StopIteration:
+                            return
+                    yield item
+            finally:
+                # 提前关闭（GeneratorExit）时内层生成器的清理同样计入
+                with self._timer(name, spent):
+                    steps.close()
+                self._count(name, spent[0])
+                if self._state().depth == 0 and spent[0] >= self.threshold_ms:
+                    self.log.warning("慢方法 %s %.1f ms", name, spent[0])
+        return timed
+
+    @contextmanager
+    def _timer(self, name: str, spent: List[float] = None):
+        """
+        方法计时；最外层方法返回时写出本线程登记的慢语句
+
+        Args:
+            name: 方法名
+            spent: 分段计时的累加器（生成器的一步），给出时只累加耗时，由调用方计数
+        """
+        state = self._state()
+        outer = state.method
+        if state.depth == 0:
+            state.method = name
+        state.depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            state.depth -= 1
+            if spent is None:
+                self._count(name, elapsed_ms)
+            else:
+                spent[0] += elapsed_ms
+            if state.depth == 0:
+                if spent is None and elapsed_ms >= self.threshold_ms:
+                    self.log.warning("慢方法 %s %.1f ms", name, elapsed_ms)
+                self.flush()  # 方法最后一条语句在此结束计时，仍归属本方法
+                state.method = outer
+
+    def _count(self, name: str, elapsed_ms: float):
+        with self._lock:
+            stats = self._stats.setdefault(name, MethodStats())
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if elapsed_ms >= self.threshold_ms:
+                stats.slow += 1
+
+    def method_stats(self) -> Dict[str, MethodStats]:
+        """各方法的累计计时（副本）"""
+        with self._lock:
+            return {name: MethodStats(**vars(stats)) for name, stats in self._stats.items()}
+
+
+def explain(db_path: str, sql: str) -> List[str]:
+    """
+    在独立的只读连接上获取语句的 EXPLAIN QUERY PLAN
+
+    Returns:
+        计划步骤（按层级缩进）；无法获取时返回一行说明
+    """
+    if db_path == ":memory:":
+        return ["（内存数据库，无法获取查询计划）"]
+    from database import _register_functions
+
+    try:
+        conn = sqlite3.connect(Path(db_path).absolute().as_uri() + "?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"（无法获取查询计划: {e}）"]
+    try:
+        _register_functions(conn)
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.Error as e:
+        return [f"（无法获取查询计划: {e}）"]
+    finally:
+        conn.close()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def enable(threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, log_dir: str = None) -> QueryProfiler:
+    """
+    启用慢查询日志：之后打开的 CorpusDatabase 默认使用返回的计时器
+
+    Args:
+        threshold_ms: 慢查询阈值（毫秒）
+        log_dir: 日志目录，None 表示 ~/.fieldnote/logs
+    """
+    global _default_profiler
+    _default_profiler = QueryProfiler(threshold_ms, setup_slow_query_logger(log_dir))
+    logger.info("慢查询日志已启用（阈值 %.0f ms）", threshold_ms)
+    return _default_profiler
+
+
+def disable():
+    """停用慢查询日志（已打开的数据库不受影响）"""
+    global _default_profiler
+    _default_profiler = None
+
+
+def default_profiler() -> Optional[QueryProfiler]:
+    """enable() 设置的计时器，未启用时为 None"""
+    return _default_profiler
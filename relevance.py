@@ -0,0 +1,164 @@
+"""
+相关度模块 - BM25 检索与字符 n-gram TF-IDF 相似条目
+
+BM25：为 AI few-shot 选取与待分析句子最相似的已有条目。分词规则与 tokens 表一致
+（按空白切分 source_text），倒排表由数据库写入路径维护，查询时只读取
+查询词的倒排记录和候选条目的长度，不扫描全表。
+
+TF-IDF：原文/词汇分解/翻译的字符 n-gram（哈希为整数）写入 ngram_postings 倒排表，
+每个条目的完整向量另以 pack_vector 的紧凑格式存为 ngram_vectors 的一行。
+「相似条目」先用高 IDF 的 n-gram 在倒排表上累加得到候选，再按完整向量的余弦相似度重排。
+"""
+import heapq
+import math
+import sys
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# BM25 词频饱和参数
+BM25_K1 = 1.2
+
+# BM25 文档长度归一化参数
+BM25_B = 0.75
+
+# 相似条目使用的字符 n-gram 长度（首尾加边界符）
+NGRAM_SIZE = 3
+
+# 参与相似度计算的字段
+NGRAM_FIELDS = ("source_text", "gloss", "translation")
+
+# 候选生成阶段最多读取的倒排记录数（按 IDF 从高到低选取查询 n-gram）
+SIMILAR_POSTINGS_BUDGET = 20000
+
+# 进入余弦重排的候选数下限（实际取 max(该值, 4k)）
+SIMILAR_MIN_CANDIDATES = 40
+
+_BOUNDARY_START = "\x02"
+_BOUNDARY_END = "\x03"
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """按空白切分文本（tokens 表使用同一规则）"""
+    return (text or "").split()
+
+
+def idf(doc_count: int, doc_freq: int) -> float:
+    """BM25 逆文档频率（加 1 平滑，高频词也不会得到负分）"""
+    return math.log(1.0 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def bm25_scores(query_terms: Iterable[str],
+                postings: Dict[int, Dict[str, int]],
+                doc_lengths: Dict[int, int],
+                doc_freqs: Dict[str, int],
+                doc_count: int, avg_length: float,
+                k1: float = BM25_K1, b: float = BM25_B) -> Dict[int, float]:
+    """
+    计算候选条目对查询的 BM25 得分
+
+    Args:
+        query_terms: 查询词（重复的词只计一次）
+        postings: {条目ID: {词: 词频}}，只需包含候选条目
+        doc_lengths: {条目ID: 词数}
+        doc_freqs: {词: 包含该词的条目数}（按全部条目统计）
+        doc_count: 条目总数
+        avg_length: 平均词数
+
+    Returns:
+        {条目ID: 得分}
+    """
+    weights = {term: idf(doc_count, doc_freqs.get(term, 0)) for term in set(query_terms)}
+    avg_length = avg_length or 1.0
+    scores = {}
+    for entry_id, freqs in postings.items():
+        norm = k1 * (1.0 - b + b * doc_lengths.get(entry_id, 0) / avg_length)
+        score = 0.0
+        for term, tf in freqs.items():
+            weight = weights.get(term)
+            if weight:
+                score += weight * tf * (k1 + 1.0) / (tf + norm)
+        if score > 0:
+            scores[entry_id] = score
+    return scores
+
+
+def top_k(scores: Dict[int, float], k: int) -> List[int]:
+    """得分最高的 k 个条目ID（同分时新条目优先）"""
+    return [entry_id for entry_id, _ in
+            heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))]
+
+
+def char_ngrams(text: Optional[str], n: int = NGRAM_SIZE) -> Counter:
+    """文本的字符 n-gram 计数（小写、合并空白、首尾加边界符；空文本没有 n-gram）"""
+    text = " ".join((text or "").casefold().split())
+    if not text:
+        return Counter()
+    padded = f"{_BOUNDARY_START}{text}{_BOUNDARY_END}"
+    return Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+
+def gram_id(gram: str) -> int:
+    """n-gram 的稳定整数编号（CRC32，跨进程、跨平台一致）"""
+    return zlib.crc32(gram.encode("utf-8"))
+
+
+def entry_ngrams(texts: Iterable[Optional[str]]) -> Dict[int, int]:
+    """多个字段合并后的 {n-gram 编号: 词频}"""
+    counts: Dict[int, int] = {}
+    for text in texts:
+        for gram, tf in char_ngrams(text).items():
+            key = gram_id(gram)
+            counts[key] = counts.get(key, 0) + tf
+    return counts
+
+
+def pack_vector(counts: Dict[int, int]) -> bytes:
+    """
+    n-gram 词频向量的存储格式：小端 uint32 编号序列，词频为 n 的编号重复 n 次
+
+    绝大多数 n-gram 在一个条目中只出现一次，每个 n-gram 约占 4 字节。
+    """
+    grams = array("I", [gram for gram, tf in counts.items() for _ in range(tf)])
+    if sys.byteorder == "big":
+        grams.byteswap()
+    return grams.tobytes()
+
+
+def unpack_vector(blob: bytes) -> Dict[int, int]:
+    """pack_vector 的逆操作：{n-gram 编号: 词频}"""
+    grams = array("I")
+    grams.frombytes(blob)
+    if sys.byteorder == "big":
+        grams.byteswap()
+    return dict(Counter(grams))
+
+
+def tfidf_weight(tf: int, doc_count: int, doc_freq: int) -> float:
+    """TF-IDF 权重（平滑 IDF，与文档频率同为全体条目统计）"""
+    return tf * (math.log((1.0 + doc_count) / (1.0 + doc_freq)) + 1.0)
+
+
+def cosine_top_k(query: Dict[int, float], docs: Dict[int, Dict[int, float]],
+                 k: int) -> List[Tuple[int, float]]:
+    """
+    余弦相似度最高的 k 个文档
+
+    Args:
+        query: 查询向量 {n-gram 编号: 权重}
+        docs: {条目ID: 向量}
+
+    Returns:
+        [(条目ID, 相似度), ...]，按相似度降序（同分时新条目优先），不含零分
+    """
+    query_norm = math.sqrt(sum(w * w for w in query.values()))
+    if not query_norm:
+        return []
+    scores = {}
+    for entry_id, vector in docs.items():
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        dot = sum(w * query.get(gram, 0.0) for gram, w in vector.items())
+        if norm and dot > 0:
+            scores[entry_id] = dot / (norm * query_norm)
+    return [(entry_id, scores[entry_id]) for entry_id in top_k(scores, k)]
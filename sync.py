@@ -0,0 +1,252 @@
+"""
+同步模块 - 两个语料库文件之间的双向合并
+
+条目以 uid（创建时生成的随机标识，复制文件后两边一致）对应。先读取两边的
+{uid: (updated_at, 行哈希)} 摘要并比较，只读取、写入内容不同的行，不做整库导出/导入：
+- 两边都有且哈希相同：跳过
+- 两边都有但内容不同：以 updated_at 较新的一方为准（相同时按哈希决定，两边结果一致）
+- 只有一方有：另一方的删除记录（tombstones）晚于该行最后修改时，在这一方也删除；
+  否则复制到另一方（包括删除后又在另一方修改过的行）
+分组名称按分组 uid 单独比较，取改名时间较新的一方。
+
+dry_run=True 只生成报告，不写入任何一方（sync_files 预览时以只读连接读取两个文件）。
+"""
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 同步方向：both 双向，pull 只把对方的修改写入本地，push 只把本地的修改写入对方
+SYNC_DIRECTIONS = ("both", "pull", "push")
+
+# 每批读取/写入的行数
+SYNC_BATCH_SIZE = 2000
+
+
+def row_hash(values: Sequence) -> bytes:
+    """一行内容的哈希（128 位 BLAKE2b；值的类型参与计算，'' 与 None 不同）"""
+    return hashlib.blake2b(repr(tuple(values)).encode("utf-8"), digest_size=16).digest()
+
+
+def timestamp_key(value: str) -> str:
+    """
+    修改/删除时间的比较键：统一为 UTC、精确到毫秒的固定宽度字符串
+
+    新写入的时间已是这一格式；旧版本写入的 updated_at 带 6 位小数（整秒时没有小数），
+    直接按字符串比较会与触发器写入的 3 位小数时间错序。无法解析的值按原样比较。
+    """
+    if not value:
+        return ""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+
+@dataclass
+class SyncReport:
+    """同步报告（dry_run 时为将要执行的操作）"""
+    direction: str = "both"
+    dry_run: bool = False
+    pull_inserts: List[str] = field(default_factory=list)   # 对方 -> 本地 新增（uid）
+    pull_updates: List[str] = field(default_factory=list)   # 对方 -> 本地 覆盖
+    pull_deletes: List[str] = field(default_factory=list)   # 本地删除（对方已删除）
+    push_inserts: List[str] = field(default_factory=list)   # 本地 -> 对方 新增
+    push_updates: List[str] = field(default_factory=list)   # 本地 -> 对方 覆盖
+    push_deletes: List[str] = field(default_factory=list)   # 对方删除（本地已删除）
+    pull_group_renames: List[Tuple[str, str, str]] = field(default_factory=list)  # (uid, 名称, 改名时间)
+    push_group_renames: List[Tuple[str, str, str]] = field(default_factory=list)
+    conflicts: int = 0    # 两边都有且内容不同的行数
+    unchanged: int = 0    # 两边相同的行数
+
+    @property
+    def total_changes(self) -> int:
+        """需要写入的行数（含分组改名）"""
+        return sum(len(items) for items in (
+            self.pull_inserts, self.pull_updates, self.pull_deletes,
+            self.push_inserts, self.push_updates, self.push_deletes,
+            self.pull_group_renames, self.push_group_renames,
+        ))
+
+    def summary(self) -> str:
+        """报告的文字摘要"""
+        lines = [
+            f"对方 -> 本地：新增 {len(self.pull_inserts)}，更新 {len(self.pull_updates)}，"
+            f"删除 {len(self.pull_deletes)}，分组改名 {len(self.pull_group_renames)}",
+            f"本地 -> 对方：新增 {len(self.push_inserts)}，更新 {len(self.push_updates)}，"
+            f"删除 {len(self.push_deletes)}，分组改名 {len(self.push_group_renames)}",
+            f"两边内容不同的条目 {self.conflicts} 条（按修改时间取较新的一方），"
+            f"相同 {self.unchanged} 条",
+        ]
+        if self.dry_run:
+            lines.append("（预览，未写入）")
+        return "\n".join(lines)
+
+
+def plan(local: Dict[str, Tuple[str, bytes]], remote: Dict[str, Tuple[str, bytes]],
+         local_tombstones: Dict[str, str], remote_tombstones: Dict[str, str],
+         direction: str = "both") -> SyncReport:
+    """
+    比较两边的摘要，得到需要执行的操作
+
+    Args:
+        local, remote: {uid: (updated_at, 行哈希)}
+        local_tombstones, remote_tombstones: {uid: deleted_at}
+        direction: 见 SYNC_DIRECTIONS
+
+    Returns:
+        SyncReport（不含分组改名）
+    """
+    if direction not in SYNC_DIRECTIONS:
+        raise ValueError(f"无效的同步方向: {direction}")
+    report = SyncReport(direction=direction)
+    for uid, (updated_at, digest) in local.items():
+        other = remote.get(uid)
+        if other is None:
+            deleted_at = remote_tombstones.get(uid)
+            if deleted_at is not None and timestamp_key(deleted_at) >= timestamp_key(updated_at):
+                report.pull_deletes.append(uid)
+            else:
+                report.push_inserts.append(uid)
+        elif other[1] == digest:
+            report.unchanged += 1
+        else:
+            report.conflicts += 1
+            if (timestamp_key(other[0]), other[1]) > (timestamp_key(updated_at), digest):
+                report.pull_updates.append(uid)
+            else:
+                report.push_updates.append(uid)
+    for uid, (updated_at, _) in remote.items():
+        if uid in local:
+            continue
+        deleted_at = local_tombstones.get(uid)
+        if deleted_at is not None and timestamp_key(deleted_at) >= timestamp_key(updated_at):
+            report.push_deletes.append(uid)
+        else:
+            report.pull_inserts.append(uid)
+
+    if direction == "pull":
+        report.push_inserts, report.push_updates, report.push_deletes = [], [], []
+    elif direction == "push":
+        report.pull_inserts, report.pull_updates, report.pull_deletes = [], [], []
+    return report
+
+
+def plan_group_renames(local: Dict[str, Tuple[str, str]], remote: Dict[str, Tuple[str, str]],
+                       report: SyncReport):
+    """
+    比较两边都有的分组的名称，较旧的一方改为较新的名称
+
+    Args:
+        local, remote: {分组 uid: (名称, 改名时间)}
+        report: 结果追加到 pull_group_renames / push_group_renames
+    """
+    for uid, (name, updated_at) in local.items():
+        other = remote.get(uid)
+        if other is None or other[0] == name:
+            continue
+        if (timestamp_key(other[1]), other[0]) > (timestamp_key(updated_at), name):
+            if report.direction != "push":
+                report.pull_group_renames.append((uid, other[0], other[1]))
+        elif report.direction != "pull":
+            report.push_group_renames.append((uid, name, updated_at))
+
+
+def sync(local, remote, direction: str = "both", dry_run: bool = False,
+         progress_callback: Callable[[int, int], None] = None,
+         batch_size: int = SYNC_BATCH_SIZE) -> SyncReport:
+    """
+    同步两个已打开的 CorpusDatabase（dry_run 时也可以是只读的 SyncReader）
+
+    每一方的写入在一个事务中完成；两个文件无法共用一个事务，写入对方失败时本地的修改
+    已经提交，重新同步即可补齐（同步结果与执行次数无关）。
+
+    Args:
+        local: 本地数据库
+        remote: 对方数据库
+        direction: 见 SYNC_DIRECTIONS
+        dry_run: 只生成报告，不写入
+        progress_callback: 进度回调 (已写入行数, 总行数)
+        batch_size: 每批读取/写入的行数
+
+    Returns:
+        SyncReport
+    """
+    report = plan(local.get_sync_digests(), remote.get_sync_digests(),
+                  local.get_tombstones(), remote.get_tombstones(), direction)
+    plan_group_renames(local.get_sync_groups(), remote.get_sync_groups(), report)
+    report.dry_run = dry_run
+    if dry_run or not report.total_changes:
+        return report
+
+    total = report.total_changes
+    done = 0
+
+    def step(count: int):
+        nonlocal done
+        done += count
+        if progress_callback:
+            progress_callback(done, total)
+
+    for source, target, uids, deletes, renames in (
+        (remote, local, report.pull_inserts + report.pull_updates,
+         report.pull_deletes, report.pull_group_renames),
+        (local, remote, report.push_inserts + report.push_updates,
+         report.push_deletes, report.push_group_renames),
+    ):
+        with target.transaction():
+            for start in range(0, len(uids), batch_size):
+                batch = uids[start:start + batch_size]
+                target.apply_sync_rows(source.export_sync_rows(batch))
+                step(len(batch))
+            target.delete_entries_by_uid(deletes)
+            step(len(deletes))
+            target.apply_group_renames(renames)
+            step(len(renames))
+
+    logger.info("同步完成: %s <-> %s\n%s", local.db_path, remote.db_path, report.summary())
+    return report
+
+
+def sync_files(local_path: str, remote_path: str, direction: str = "both",
+               dry_run: bool = False,
+               progress_callback: Callable[[int, int], None] = None) -> SyncReport:
+    """
+    打开两个语料库文件并同步（在调用线程中打开，完成后关闭）
+
+    预览（dry_run）只用只读连接读取摘要，不迁移、不写入任何一方；
+    真正同步时才以读写方式打开（schema 较旧的文件此时完成迁移）。
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 不是语料库文件、两个路径相同或对方版本高于当前程序
+    """
+    from database import SCHEMA_VERSION, CorpusDatabase, SyncReader, _corpus_schema_version
+
+    for path in (local_path, remote_path):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"语料库文件不存在: {path}")
+    if os.path.samefile(local_path, remote_path):
+        raise ValueError("不能与同一个文件同步")
+    for path in (local_path, remote_path):
+        version = _corpus_schema_version(path)
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"语料库版本 (v{version}) 高于当前程序支持的版本: {path}")
+
+    opener = SyncReader if dry_run else CorpusDatabase
+    local = opener(local_path)
+    try:
+        remote = opener(remote_path)
+        try:
+            return sync(local, remote, direction, dry_run, progress_callback)
+        finally:
+            remote.close()
+    finally:
+        local.close()
@@ -0,0 +1,219 @@
+"""Tests for backup.py - content-addressed incremental snapshots."""
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import backup
+from backup import SnapshotError, SnapshotStore
+from database import CorpusDatabase
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "backups"))
+
+
+def _entries(n, prefix="E"):
+    return [{"example_id": f"{prefix}{i}", "source_text": f"ŋa˧ tə˥ {prefix} {i}",
+             "gloss": "g", "translation": "t"} for i in range(n)]
+
+
+def _object_count(store):
+    return sum(len(files) for _, _, files in os.walk(store.objects_dir))
+
+
+def _set_created_at(store, snapshot_id, when):
+    manifest = store._load_manifest(snapshot_id)
+    manifest["created_at"] = when.isoformat(timespec="seconds")
+    store._write_manifest(manifest)
+
+
+class TestSnapshotCreateRestore:
+    """Creating, restoring and chaining snapshots."""
+
+    def test_round_trip(self, tmp_db, store, tmp_path):
+        tmp_db.bulk_import(_entries(200))
+        info = store.create(tmp_db)
+        assert info.is_base
+        assert info.changed_pages == info.page_count
+        assert 0 < info.new_objects <= info.page_count  # identical pages are stored once
+
+        restored = store.restore(info.snapshot_id, str(tmp_path / "restored.db"))
+        db = CorpusDatabase(restored)
+        assert db.get_count() == 200
+        db.close()
+
+    def test_incremental_snapshot_stores_only_changed_pages(self, tmp_db, store, tmp_path):
+        tmp_db.bulk_import(_entries(2000))
+        first = store.create(tmp_db)
+        objects_before = _object_count(store)
+
+        tmp_db.insert_entry(example_id="NEW", source_text="ni˧ kʰɤ˥", gloss="g", translation="t")
+        second = store.create(tmp_db)
+        assert second.parent == first.snapshot_id
+        assert 0 < second.changed_pages < first.page_count // 4
+        assert _object_count(store) - objects_before == second.new_objects <= second.changed_pages
+
+        db = CorpusDatabase(store.restore(second.snapshot_id, str(tmp_path / "second.db")))
+        assert db.get_count() == 2001
+        db.close()
+        db = CorpusDatabase(store.restore(first.snapshot_id, str(tmp_path / "first.db")))
+        assert db.get_count() == 2000
+        db.close()
+
+    def test_unchanged_database_adds_no_objects(self, tmp_db, store):
+        tmp_db.bulk_import(_entries(50))
+        store.create(tmp_db)
+        info = store.create(tmp_db)
+        assert info.changed_pages == 0
+        assert info.new_objects == 0
+
+    def test_chain_restarts_after_max_length(self, tmp_db, store, monkeypatch):
+        monkeypatch.setattr(backup, "MAX_CHAIN_LENGTH", 2)
+        infos = [store.create(tmp_db) for _ in range(3)]
+        assert [info.is_base for info in infos] == [True, False, True]
+
+    def test_progress_reaches_total(self, tmp_db, store):
+        tmp_db.bulk_import(_entries(500))
+        progress = []
+        store.create(tmp_db, lambda done, total: progress.append((done, total)))
+        assert progress[-1][0] == progress[-1][1]
+        assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+
+    def test_snapshot_is_read_without_a_temporary_copy(self, tmp_db, store, tmp_path, monkeypatch):
+        tmp_db.bulk_import(_entries(500))
+        monkeypatch.setattr(tmp_db, "backup_to", None)  # any copy would fail
+        info = store.create(tmp_db)
+        db = CorpusDatabase(store.restore(info.snapshot_id, str(tmp_path / "restored.db")))
+        assert db.get_count() == 500
+        db.close()
+
+    def test_large_database_goes_through_a_copy(self, tmp_db, store, tmp_path, monkeypatch):
+        tmp_db.bulk_import(_entries(500))
+        first = store.create(tmp_db)
+        monkeypatch.setattr(backup, "MEMORY_IMAGE_MAX_BYTES", 0)
+        progress = []
+        second = store.create(tmp_db, lambda done, total: progress.append((done, total)))
+        assert progress[-1][0] == progress[-1][1]
+        assert second.parent == first.snapshot_id
+        assert second.changed_pages <= 1  # only the header's change counters differ
+        assert os.listdir(store.tmp_dir) == []
+        assert store.verify() == []
+
+    def test_snapshots_are_tracked_per_source(self, tmp_db, store, tmp_path):
+        other = CorpusDatabase(str(tmp_path / "other.db"))
+        try:
+            store.create(tmp_db)
+            info = store.create(other)
+        finally:
+            other.close()
+        assert info.is_base
+        assert store.latest(source=tmp_db.db_path).is_base
+        assert len(store.list_snapshots()) == 2
+
+    def test_restore_unknown_snapshot(self, store, tmp_path):
+        with pytest.raises(SnapshotError):
+            store.restore("missing", str(tmp_path / "x.db"))
+        assert not os.path.exists(tmp_path / "x.db.part")
+
+
+class TestSnapshotVerify:
+    """verify() detects missing and corrupted page objects."""
+
+    def test_verify_ok(self, tmp_db, store):
+        tmp_db.bulk_import(_entries(100))
+        store.create(tmp_db)
+        store.create(tmp_db)
+        assert store.verify() == []
+
+    def test_verify_detects_corruption(self, tmp_db, store, tmp_path):
+        tmp_db.bulk_import(_entries(100))
+        info = store.create(tmp_db)
+        digest = store._resolve_pages(info.snapshot_id)[1][0]
+        with open(store._object_path(digest), "wb") as f:
+            f.write(b"garbage")
+        problems = store.verify(info.snapshot_id)
+        assert len(problems) == 1 and digest in problems[0]
+        with pytest.raises(SnapshotError):
+            store.restore(info.snapshot_id, str(tmp_path / "restored.db"))
+        assert not os.path.exists(tmp_path / "restored.db")
+
+    def test_verify_detects_missing_parent(self, tmp_db, store):
+        base = store.create(tmp_db)
+        tmp_db.bulk_import(_entries(10))
+        child = store.create(tmp_db)
+        os.remove(store._manifest_path(base.snapshot_id))
+        assert store.verify(child.snapshot_id)
+
+
+class TestSnapshotRetention:
+    """prune() removes whole expired chains and collects their objects."""
+
+    def test_prune_removes_expired_chains(self, tmp_db, store, monkeypatch):
+        monkeypatch.setattr(backup, "MAX_CHAIN_LENGTH", 2)
+        old = datetime.now() - timedelta(days=40)
+        infos = []
+        for i in range(4):
+            tmp_db.bulk_import(_entries(20, prefix=f"P{i}-"))
+            infos.append(store.create(tmp_db))
+        for info in infos[:3]:
+            _set_created_at(store, info.snapshot_id, old)
+
+        # chains: [0, 1] expired, [2, 3] still has a recent member
+        assert store.prune() == 2
+        assert [s.snapshot_id for s in store.list_snapshots()] == [i.snapshot_id for i in infos[2:]]
+        assert store.verify() == []
+
+    def test_latest_chain_is_always_kept(self, tmp_db, store):
+        info = store.create(tmp_db)
+        _set_created_at(store, info.snapshot_id, datetime.now() - timedelta(days=400))
+        assert store.prune() == 0
+        assert store.latest().snapshot_id == info.snapshot_id
+
+    def test_prune_removes_legacy_full_backups(self, store):
+        os.makedirs(store.root)
+        legacy = os.path.join(store.root, "corpus_20200101_000000.db")
+        sqlite3.connect(legacy).close()
+        old = (datetime.now() - timedelta(days=40)).timestamp()
+        os.utime(legacy, (old, old))
+        store.prune()
+        assert not os.path.exists(legacy)
+
+    def test_collect_garbage_waits_for_snapshot_in_progress(self, tmp_db, store, monkeypatch):
+        tmp_db.bulk_import(_entries(50))
+        collector = []
+        write_manifest = store._write_manifest
+
+        def write_manifest_late(manifest):
+            # objects are on disk but not yet referenced by any manifest
+            other = SnapshotStore(store.root)
+            collector.append(threading.Thread(target=other.collect_garbage))
+            collector[0].start()
+            collector[0].join(0.2)
+            assert collector[0].is_alive()  # blocked on the repository lock
+            write_manifest(manifest)
+
+        monkeypatch.setattr(store, "_write_manifest", write_manifest_late)
+        info = store.create(tmp_db)
+        collector[0].join()
+        assert store.verify(info.snapshot_id) == []
+
+
+class TestCommandLine:
+    """backup.py list / verify / restore."""
+
+    def test_cli_round_trip(self, tmp_db, store, tmp_path, capsys):
+        tmp_db.bulk_import(_entries(30))
+        info = store.create(tmp_db)
+        assert backup.main(["--store", store.root, "list"]) == 0
+        assert info.snapshot_id in capsys.readouterr().out
+        assert backup.main(["--store", store.root, "verify"]) == 0
+
+        target = str(tmp_path / "restored.db")
+        assert backup.main(["--store", store.root, "restore", info.snapshot_id, target]) == 0
+        assert backup.main(["--store", store.root, "restore", info.snapshot_id, target]) == 1
+        assert backup.main(["--store", store.root, "restore", info.snapshot_id, target, "--force"]) == 0
+        assert backup.main(["--store", store.root, "verify", "missing"]) == 1
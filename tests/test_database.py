@@ -1,11 +1,18 @@
 """Comprehensive tests for CorpusDatabase (CRUD, search, tags, groups, stats, duplicates, backup)."""
 import os
+import re
+import sqlite3
+import threading
 import time
-from datetime import datetime, timezone
+import unicodedata
+from datetime import datetime, timedelta, timezone
 
 import pytest
 
-from database import CorpusDatabase, SCHEMA_VERSION
+import database
+from backup import SnapshotStore
+from database import (CorpusDatabase, SCHEMA_VERSION, Change, ChangeLogTruncated, Entry,
+                      ImportResult)
 
 
 # ---------------------------------------------------------------------------
@@ -62,6 +69,45 @@ class TestDatabaseCRUD:
     def test_delete_nonexistent_returns_false(self, tmp_db):
         assert tmp_db.delete_entry(99999) is False
 
+    def test_delete_entries(self, populated_db):
+        ids = [e["id"] for e in populated_db.get_all_entries()]
+        assert populated_db.delete_entries(ids[:2] + [99999]) == 2
+        assert populated_db.get_count() == 1
+        assert populated_db.delete_entries([]) == 0
+
+    def test_delete_entries_updates_derived_tables(self, tmp_db):
+        ids = [tmp_db.insert_entry(example_id=f"T{i}", source_text="ŋa˧ tə˥", gloss="g",
+                                   translation="t", tags="x") for i in range(3)]
+        tmp_db.delete_entries(ids[:2])
+        assert tmp_db.get_tag_distribution() == [("x", 1)]
+        assert dict(tmp_db.get_word_frequencies())["ŋa˧"] == 1
+        assert tmp_db.get_stats()["total"] == 1
+
+    def test_update_entries(self, tmp_db):
+        ids = [tmp_db.insert_entry(example_id=f"T{i}", source_text="ŋa˧", gloss="g",
+                                   translation="t") for i in range(3)]
+        before = tmp_db.get_entry(ids[0])["updated_at"]
+        time.sleep(0.01)
+        assert tmp_db.update_entries(ids[:2], entry_type="word", speaker="A") == 2
+        entries = {e["id"]: e for e in tmp_db.get_all_entries()}
+        assert [entries[i]["entry_type"] for i in ids] == ["word", "word", "sentence"]
+        assert entries[ids[0]]["speaker"] == "A"
+        assert entries[ids[0]]["updated_at"] > before
+
+    def test_update_entries_syncs_tags_and_tokens(self, tmp_db):
+        ids = [tmp_db.insert_entry(example_id=f"T{i}", source_text="ŋa˧", gloss="g",
+                                   translation="t", tags="old") for i in range(2)]
+        tmp_db.update_entries(ids, tags="new,extra", source_text="tə˥ tə˥")
+        assert dict(tmp_db.get_tag_distribution()) == {"new": 2, "extra": 2}
+        assert dict(tmp_db.get_word_frequencies()) == {"tə˥": 4}
+
+    def test_update_entries_rejects_unknown_fields(self, tmp_db):
+        entry_id = tmp_db.insert_entry(example_id="T", source_text="a", gloss="g", translation="t")
+        for bad in ({"id": 5}, {"created_at": "x"}, {"bogus": 1}):
+            with pytest.raises(TypeError):
+                tmp_db.update_entries([entry_id], **bad)
+        assert tmp_db.get_entry(entry_id)["id"] == entry_id
+
     def test_get_all_entries(self, populated_db):
         entries = populated_db.get_all_entries()
         assert len(entries) == 3
@@ -212,6 +258,79 @@ class TestDatabaseTags:
         assert len(results) == 1
         assert results[0]["example_id"] == "T1"
 
+    def test_get_entries_by_tags(self, tmp_db):
+        tmp_db.insert_entry(
+            example_id="T1", source_text="a", gloss="a", translation="a", tags="x,y",
+        )
+        tmp_db.insert_entry(
+            example_id="T2", source_text="b", gloss="b", translation="b", tags="y",
+        )
+        tmp_db.insert_entry(
+            example_id="T3", source_text="c", gloss="c", translation="c", tags="z",
+        )
+        results = tmp_db.get_entries_by_tags(["x", "z"])
+        assert [r["example_id"] for r in results] == ["T1", "T3"]
+        assert tmp_db.get_entries_by_tags([]) == []
+
+    def test_tag_match_is_exact(self, tmp_db):
+        tmp_db.insert_entry(
+            example_id="T1", source_text="a", gloss="a", translation="a", tags="已审核",
+        )
+        tmp_db.insert_entry(
+            example_id="T2", source_text="b", gloss="b", translation="b", tags="未审核",
+        )
+        results = tmp_db.get_entries_by_tags(["审核"])
+        assert results == []
+
+    def test_entry_tags_follow_update_and_delete(self, tmp_db):
+        row_id = tmp_db.insert_entry(
+            example_id="T1", source_text="a", gloss="a", translation="a", tags="old",
+        )
+        tmp_db.update_entry(
+            entry_id=row_id, example_id="T1", source_text="a", gloss="a",
+            translation="a", tags="new",
+        )
+        assert tmp_db.get_all_tags() == ["new"]
+        tmp_db.delete_entry(row_id)
+        assert tmp_db.get_all_tags() == []
+        assert tmp_db.get_tag_distribution() == []
+
+    def test_batch_update_tags_keeps_order(self, tmp_db):
+        row_id = tmp_db.insert_entry(
+            example_id="T1", source_text="a", gloss="a", translation="a", tags="b,a",
+        )
+        tmp_db.batch_update_tags([row_id], add_tags=["c", "a"])
+        assert tmp_db.get_entry(row_id)["tags"] == "b,a,c"
+        tmp_db.batch_update_tags([row_id], remove_tags=["b", "c"])
+        assert tmp_db.get_entry(row_id)["tags"] == "a"
+        tmp_db.batch_update_tags([row_id], remove_tags=["a"])
+        assert tmp_db.get_entry(row_id)["tags"] == ""
+
+    def test_batch_update_tags_skips_missing_ids(self, tmp_db):
+        row_id = tmp_db.insert_entry(
+            example_id="T1", source_text="a", gloss="a", translation="a",
+        )
+        assert tmp_db.batch_update_tags([row_id, 99999], add_tags=["x"]) == 1
+        assert tmp_db.get_tag_distribution() == [("x", 1)]
+
+    def test_migration_populates_entry_tags(self, tmp_path):
+        db_path = str(tmp_path / "legacy.db")
+        db = CorpusDatabase(db_path)
+        db.insert_entry(
+            example_id="L1", source_text="a", gloss="g", translation="t", tags="p, q,p",
+        )
+        # 模拟 v5 数据库：删除标签关联表并回退版本号
+        db.cursor.execute("DROP TRIGGER entry_tags_ad")
+        db.cursor.execute("DROP TABLE entry_tags")
+        db.cursor.execute("DROP TABLE tags")
+        db._set_schema_version(5)
+        db.close()
+
+        db = CorpusDatabase(db_path)
+        assert db.get_all_tags() == ["p", "q"]
+        assert db.get_tag_distribution() == [("p", 1), ("q", 1)]
+        db.close()
+
 
 # ---------------------------------------------------------------------------
 # Task 4: Groups, stats, duplicates, backup tests
@@ -283,6 +402,102 @@ class TestDatabaseGroups:
         assert entries[0]["group_name"] == "new_name"
 
 
+class TestDatabaseGroupTables:
+    """groups / speakers tables referenced by integer key."""
+
+    def _add(self, db, example_id, group_id="DLG001", group_name="", speaker="", **kwargs):
+        return db.insert_entry(example_id=example_id, source_text="a", gloss="g",
+                               translation="t", entry_type="dialogue", group_id=group_id,
+                               group_name=group_name, speaker=speaker, **kwargs)
+
+    def _group(self, db, group_id):
+        return {g["group_id"]: g for g in db.get_groups_by_type("dialogue")}[group_id]
+
+    def test_migrates_text_columns(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE corpus (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        example_id TEXT, source_text TEXT, gloss TEXT, translation TEXT,
+                        notes TEXT, entry_type TEXT, group_id TEXT, group_name TEXT, speaker TEXT,
+                        turn_number INTEGER)""")
+        conn.executemany(
+            "INSERT INTO corpus (example_id, source_text, entry_type, group_id, group_name,"
+            " speaker, turn_number) VALUES (?, 'a', ?, ?, ?, ?, ?)",
+            [("E1", "dialogue", "DLG004", "first", "A", 1),
+             ("E2", "dialogue", "DLG004", "second", "B", 2),
+             ("E3", "dialogue", "DLG004", "", "A", 3),
+             ("E4", "sentence", "", "", "", None)])
+        conn.commit()
+        conn.close()
+
+        db = CorpusDatabase(path)
+        try:
+            columns = {row[1] for row in db.cursor.execute("PRAGMA table_info(corpus)")}
+            assert not columns & {"group_id", "group_name", "speaker"}
+            assert db.get_groups_by_type("dialogue") == [
+                {"group_id": "DLG004", "group_name": "second", "count": 3}
+            ]
+            entries = db.get_entries_by_group("DLG004")
+            assert [e["speaker"] for e in entries] == ["A", "B", "A"]
+            assert db.get_entry(4)["group_id"] == ""
+            assert db.get_next_group_id("dialogue") == "DLG005"
+        finally:
+            db.close()
+
+    def test_rename_updates_one_row(self, tmp_db):
+        for i in range(3):
+            self._add(tmp_db, f"E{i}", group_name="old")
+        assert tmp_db.rename_group("DLG001", "new") is True
+        tmp_db.cursor.execute("SELECT changes()")
+        assert tmp_db.cursor.fetchone()[0] == 1
+        assert {e["group_name"] for e in tmp_db.get_entries_by_group("DLG001")} == {"new"}
+        assert tmp_db.rename_group("DLG999", "x") is False
+
+    def test_member_count_follows_writes(self, tmp_db):
+        a = self._add(tmp_db, "A")
+        b = self._add(tmp_db, "B")
+        self._add(tmp_db, "C", group_id="DLG002")
+        assert self._group(tmp_db, "DLG001")["count"] == 2
+        tmp_db.update_entries([b], group_id="DLG002")
+        assert self._group(tmp_db, "DLG001")["count"] == 1
+        assert self._group(tmp_db, "DLG002")["count"] == 2
+        tmp_db.delete_entry(a)
+        assert self._group(tmp_db, "DLG001")["count"] == 0
+        tmp_db.update_entries([b], group_name="renamed")
+        assert self._group(tmp_db, "DLG002")["group_name"] == "renamed"
+
+    def test_create_group_allocates_from_sequence(self, tmp_db):
+        assert tmp_db.create_group("discourse", "story") == "DSC001"
+        assert tmp_db.get_groups_by_type("discourse") == [
+            {"group_id": "DSC001", "group_name": "story", "count": 0}
+        ]
+        assert tmp_db.create_group("discourse") == "DSC002"
+        assert tmp_db.delete_group("DSC002") is True
+        # 编号不回收
+        assert tmp_db.get_next_group_id("discourse") == "DSC003"
+        self._add(tmp_db, "X", group_id="DLG003")
+        assert tmp_db.create_group("dialogue") == "DLG004"
+
+    def test_speakers_are_shared(self, tmp_db):
+        ids = [self._add(tmp_db, f"E{i}", speaker="A") for i in range(3)]
+        tmp_db.update_entry(entry_id=ids[0], example_id="E0", source_text="a", gloss="g",
+                            translation="t", entry_type="dialogue", group_id="DLG001",
+                            speaker="B")
+        assert [r[0] for r in tmp_db._fetchall("SELECT name FROM speakers ORDER BY name")] == ["A", "B"]
+        assert [e["speaker"] for e in tmp_db.get_entries_by_group("DLG001")] == ["B", "A", "A"]
+
+    def test_bulk_import_resolves_references(self, tmp_db):
+        rows = [{"example_id": f"E{i}", "source_text": "a", "entry_type": "discourse",
+                 "group_id": "DSC007", "group_name": "imported", "speaker": "A"}
+                for i in range(5)]
+        assert tmp_db.bulk_import(rows, chunk_size=2).imported == 5
+        assert tmp_db.get_groups_by_type("discourse") == [
+            {"group_id": "DSC007", "group_name": "imported", "count": 5}
+        ]
+        assert tmp_db._fetchall("SELECT COUNT(*) FROM speakers")[0][0] == 1
+        assert tmp_db.get_next_group_id("discourse") == "DSC008"
+
+
 class TestDatabaseStats:
     """Statistics and word frequency."""
 
@@ -313,6 +528,134 @@ class TestDatabaseStats:
         # Excluding itself, TEST001 should not exist
         assert populated_db.example_id_exists("TEST001", exclude_id=test001["id"]) is False
 
+    def _set_created_at(self, db, entry_id, when):
+        db.cursor.execute("UPDATE corpus SET created_at = ? WHERE id = ?", (when.isoformat(), entry_id))
+        db.connection.commit()
+
+    def test_stats_tables_follow_writes(self, populated_db):
+        word = populated_db.get_entries_by_type("word")[0]
+        populated_db.update_entry(entry_id=word["id"], example_id="W001", source_text="fan",
+                                  gloss="rice", translation="t", entry_type="discourse")
+        populated_db.delete_entry(populated_db.get_entries_by_type("sentence")[0]["id"])
+        stats = populated_db.get_stats()
+        assert stats["total"] == populated_db.get_count() == 2
+        assert stats["by_type"] == {"word": 0, "sentence": 1, "discourse": 1, "dialogue": 0}
+        assert stats["today_count"] == 2
+
+    def test_get_stats_does_not_scan_corpus(self, populated_db):
+        plans = []
+        populated_db.connection.set_trace_callback(plans.append)
+        populated_db.get_stats()
+        populated_db.connection.set_trace_callback(None)
+        corpus_queries = [sql for sql in plans if "FROM corpus" in sql]
+        assert len(corpus_queries) == 1
+        plan = populated_db.connection.execute(
+            "EXPLAIN QUERY PLAN " + corpus_queries[0]
+        ).fetchall()
+        assert "idx_corpus_created_at" in plan[0][3]
+
+    def test_week_count_boundary(self, tmp_db):
+        now = datetime.now(timezone.utc)
+        offsets = [timedelta(days=7, hours=-1), timedelta(days=7, hours=1),
+                   timedelta(days=3), timedelta(days=10)]
+        for i, offset in enumerate(offsets):
+            row_id = tmp_db.insert_entry(example_id=f"D{i}", source_text=f"s{i}",
+                                         gloss="g", translation="t")
+            self._set_created_at(tmp_db, row_id, now - offset)
+        tmp_db.insert_entry(example_id="today", source_text="x", gloss="g", translation="t")
+        stats = tmp_db.get_stats()
+        assert stats["today_count"] == 1
+        assert stats["week_count"] == 3
+
+    def test_get_daily_counts(self, tmp_db):
+        now = datetime.now(timezone.utc)
+        for i, days in enumerate([0, 0, 2, 40]):
+            row_id = tmp_db.insert_entry(example_id=f"D{i}", source_text=f"s{i}",
+                                         gloss="g", translation="t")
+            self._set_created_at(tmp_db, row_id, now - timedelta(days=days))
+        day = lambda d: (now - timedelta(days=d)).strftime("%Y-%m-%d")
+        assert tmp_db.get_daily_counts() == [(day(40), 1), (day(2), 1), (day(0), 2)]
+        assert tmp_db.get_daily_counts(days=7) == [(day(2), 1), (day(0), 2)]
+        tmp_db.delete_entry(row_id)
+        assert tmp_db.get_daily_counts(days=7) == [(day(2), 1), (day(0), 2)]
+        assert tmp_db.get_daily_counts()[0] == (day(2), 1)
+
+    def test_word_frequencies_follow_writes(self, tmp_db):
+        a = tmp_db.insert_entry(example_id="A", source_text="ŋa˧ fan˨˩ ŋa˧", gloss="g", translation="t")
+        b = tmp_db.insert_entry(example_id="B", source_text="fan˨˩", gloss="g", translation="t",
+                                entry_type="word")
+        assert tmp_db.get_word_frequencies() == [("fan˨˩", 2), ("ŋa˧", 2)]
+        assert tmp_db.get_word_frequencies(entry_type="word") == [("fan˨˩", 1)]
+
+        tmp_db.update_entry(entry_id=a, example_id="A", source_text="ni˧ fan˨˩",
+                            gloss="g", translation="t")
+        assert tmp_db.get_word_frequencies() == [("fan˨˩", 2), ("ni˧", 1)]
+
+        tmp_db.update_entry(entry_id=b, example_id="B", source_text="fan˨˩",
+                            gloss="g", translation="t", entry_type="sentence")
+        assert tmp_db.get_word_frequencies(entry_type="word") == []
+        assert tmp_db.get_word_frequencies(entry_type="sentence") == [("fan˨˩", 2), ("ni˧", 1)]
+
+        tmp_db.delete_entry(a)
+        assert tmp_db.get_word_frequencies() == [("fan˨˩", 1)]
+        assert tmp_db.get_word_frequencies(limit=0) == []
+
+    def test_word_frequencies_match_full_scan(self, tmp_db, sample_entries):
+        tmp_db.bulk_import(sample_entries * 3)
+        counts = {}
+        for entry in tmp_db.get_all_entries():
+            for word in entry["source_text"].split():
+                counts[word] = counts.get(word, 0) + 1
+        expected = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+        assert tmp_db.get_word_frequencies(limit=100) == expected
+
+    def test_get_entries_containing_word(self, populated_db):
+        ids = [e["example_id"] for e in populated_db.get_entries_containing_word("fan˨˩")]
+        assert ids == ["TEST001", "W001"]
+        words = populated_db.get_entries_containing_word("fan˨˩", entry_type="word")
+        assert [e["example_id"] for e in words] == ["W001"]
+        # 按整词匹配，不做子串匹配
+        assert populated_db.get_entries_containing_word("fan") == []
+
+    def test_migration_backfills_tokens(self, tmp_path):
+        db_path = str(tmp_path / "legacy.db")
+        db = CorpusDatabase(db_path)
+        db.insert_entry(example_id="L1", source_text="a b a", gloss="g", translation="t")
+        # 模拟 v7 数据库：删除分词表、词频表和触发器并回退版本号
+        for trigger in ("corpus_tokens_ad", "corpus_tokens_au"):
+            db.cursor.execute(f"DROP TRIGGER {trigger}")
+        for table in ("tokens", "word_freq", "word_freq_by_type"):
+            db.cursor.execute(f"DROP TABLE {table}")
+        db._set_schema_version(7)
+        db.close()
+
+        db = CorpusDatabase(db_path)
+        assert db.get_word_frequencies() == [("a", 2), ("b", 1)]
+        assert len(db.get_entries_containing_word("b")) == 1
+        db.close()
+
+    def test_migration_backfills_stats(self, tmp_path):
+        db_path = str(tmp_path / "legacy.db")
+        db = CorpusDatabase(db_path)
+        for i in range(3):
+            db.insert_entry(example_id=f"L{i}", source_text="a", gloss="g", translation="t",
+                            entry_type="word" if i else "dialogue")
+        # 模拟 v6 数据库：删除统计表和触发器并回退版本号
+        for trigger in ("stats_ai", "stats_ad", "stats_au"):
+            db.cursor.execute(f"DROP TRIGGER {trigger}")
+        db.cursor.execute("DROP TABLE stats_by_type")
+        db.cursor.execute("DROP TABLE stats_by_day")
+        db._set_schema_version(6)
+        db.close()
+
+        db = CorpusDatabase(db_path)
+        stats = db.get_stats()
+        assert stats["total"] == 3
+        assert stats["by_type"]["word"] == 2
+        assert stats["by_type"]["dialogue"] == 1
+        assert stats["today_count"] == 3
+        db.close()
+
 
 class TestDatabaseDuplicates:
     """Duplicate detection."""
@@ -352,15 +695,60 @@ class TestDatabaseDuplicates:
 class TestDatabaseBackupAndIntegrity:
     """Backup and integrity check."""
 
-    def test_create_backup(self, tmp_db, sample_entry):
+    def test_create_backup(self, tmp_db, sample_entry, tmp_path):
         tmp_db.insert_entry(**sample_entry)
-        backup_path = tmp_db.create_backup()
-        assert os.path.exists(backup_path)
-        # Backup should be a valid database
-        backup_db = CorpusDatabase(backup_path)
+        backup_dir = str(tmp_path / "backups")
+        info = tmp_db.create_backup(backup_dir=backup_dir)
+        # The snapshot restores to a valid database
+        restored = SnapshotStore(backup_dir).restore(info.snapshot_id, str(tmp_path / "restored.db"))
+        backup_db = CorpusDatabase(restored)
         assert backup_db.get_count() == 1
         backup_db.close()
 
+    def test_backup_to_reports_progress(self, tmp_db, sample_entries, tmp_path):
+        tmp_db.bulk_import(sample_entries * 50)
+        target = str(tmp_path / "copy.db")
+        progress = []
+        tmp_db.backup_to(target, lambda done, total: progress.append((done, total)), pages=1)
+        assert len(progress) > 1
+        assert progress[-1][0] == progress[-1][1]
+        assert not os.path.exists(target + ".part")
+        copy = CorpusDatabase(target)
+        assert copy.get_count() == len(sample_entries) * 50
+        copy.close()
+
+    def test_backup_to_from_background_thread(self, tmp_db, sample_entry, tmp_path):
+        tmp_db.insert_entry(**sample_entry)
+        target = str(tmp_path / "copy.db")
+        errors = []
+
+        def run():
+            try:
+                tmp_db.backup_to(target)
+            except Exception as e:  # pragma: no cover - surfaced by the assert
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        assert errors == []
+        copy = CorpusDatabase(target)
+        assert copy.get_count() == 1
+        copy.close()
+
+    def test_backup_to_overwrites_existing_file(self, tmp_db, sample_entry, tmp_path):
+        target = tmp_path / "copy.db"
+        target.write_bytes(b"not a database")
+        tmp_db.insert_entry(**sample_entry)
+        tmp_db.backup_to(str(target))
+        copy = CorpusDatabase(str(target))
+        assert copy.get_count() == 1
+        copy.close()
+
+    def test_backup_to_rejects_source_path(self, tmp_db):
+        with pytest.raises(ValueError):
+            tmp_db.backup_to(tmp_db.db_path)
+
     def test_check_integrity(self, tmp_db):
         is_ok, message = tmp_db.check_integrity()
         assert is_ok is True
@@ -375,7 +763,7 @@ class TestDatabaseMigration:
         assert version == SCHEMA_VERSION
 
     def test_new_db_has_all_columns(self, tmp_db):
-        tmp_db.cursor.execute("PRAGMA table_info(corpus)")
+        tmp_db.cursor.execute("PRAGMA table_info(corpus_entries)")
         columns = [row[1] for row in tmp_db.cursor.fetchall()]
         expected = [
             "id", "example_id", "source_text", "gloss", "translation", "notes",
@@ -392,6 +780,266 @@ class TestDatabaseMigration:
         assert tmp_db.get_count() == len(sample_entries)
 
 
+class TestDatabaseBulkImport:
+    """Chunked single-transaction bulk import."""
+
+    def test_bulk_import_reports_chunk_progress(self, tmp_db):
+        entries = [
+            {"example_id": f"B{i}", "source_text": f"text {i}", "translation": "t"}
+            for i in range(25)
+        ]
+        progress = []
+        result = tmp_db.bulk_import(
+            entries, chunk_size=10, progress_callback=lambda done, total: progress.append((done, total))
+        )
+        assert isinstance(result, ImportResult)
+        assert result.total == 25
+        assert result.imported == 25
+        assert result.failed == []
+        assert progress == [(10, 25), (20, 25), (25, 25)]
+        assert tmp_db.get_count() == 25
+
+    def test_bulk_import_records_failures_without_aborting(self, tmp_db):
+        entries = [
+            {"example_id": "OK1", "source_text": "a", "translation": "t"},
+            {"example_id": "BAD1", "source_text": "b", "turn_number": "not a number"},
+            "not a dict",
+            {"example_id": "BAD2", "source_text": {"nested": "value"}},
+            {"example_id": "OK2", "source_text": "c", "translation": "t"},
+        ]
+        result = tmp_db.bulk_import(entries, chunk_size=10)
+        assert result.imported == 2
+        assert [index for index, _ in result.failed] == [1, 2, 3]
+        ids = sorted(e["example_id"] for e in tmp_db.get_all_entries())
+        assert ids == ["OK1", "OK2"]
+
+    def test_bulk_import_normalizes_csv_fields(self, tmp_db):
+        entries = [{"example_id": "C1", "source_text": "a", "entry_type": "", "turn_number": "",
+                    "tags": "x,y"}]
+        tmp_db.bulk_import(entries)
+        entry = tmp_db.get_all_entries()[0]
+        assert entry["entry_type"] == "sentence"
+        assert entry["turn_number"] is None
+        assert tmp_db.get_entries_by_tags(["y"])[0]["example_id"] == "C1"
+
+    def test_bulk_import_single_commit(self, tmp_db, sample_entries):
+        commits = []
+        tmp_db.connection.set_trace_callback(
+            lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None
+        )
+        tmp_db.bulk_import(sample_entries * 10, chunk_size=4)
+        tmp_db.connection.set_trace_callback(None)
+        assert len(commits) == 1
+        assert tmp_db.get_count() == 30
+
+    def test_bulk_import_indexes_for_search(self, tmp_db, sample_entries):
+        tmp_db.bulk_import(sample_entries)
+        assert len(tmp_db.search_entries("source_text", "tɕʰi˥")) == 1
+
+    def test_bulk_import_matches_per_entry_inserts(self, tmp_path, tmp_db, sample_entries):
+        """Set-based FTS, fold-key and word-frequency writes agree with the trigger path."""
+        tmp_db.insert_entry(example_id="PRE", source_text="tɕʰi˥ lɑ˧", gloss="g",
+                            translation="t", entry_type="dialogue")
+        tmp_db.bulk_import(sample_entries * 2)
+        reference = CorpusDatabase(str(tmp_path / "reference.db"))
+        try:
+            reference.insert_entry(example_id="PRE", source_text="tɕʰi˥ lɑ˧", gloss="g",
+                                   translation="t", entry_type="dialogue")
+            for entry in sample_entries * 2:
+                reference.insert_entry(**entry)
+            for sql in ("SELECT form, count FROM word_freq ORDER BY form",
+                        "SELECT entry_type, form, count FROM word_freq_by_type ORDER BY 1, 2",
+                        f"SELECT id, {', '.join(database.FOLD_KEY_COLUMNS)} FROM corpus ORDER BY id"):
+                assert tmp_db._fetchall(sql) == reference._fetchall(sql)
+            for folded in (False, True):
+                found = [[e["id"] for e in db.search_entries("source_text", "tɕʰi",
+                                                              ignore_diacritics=folded)]
+                         for db in (tmp_db, reference)]
+                assert found[0] == found[1] and len(found[0]) == 3
+        finally:
+            reference.close()
+
+    def test_bulk_import_restores_triggers_and_cache_size(self, tmp_db, sample_entries):
+        triggers_sql = "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+        triggers = tmp_db._fetchall(triggers_sql)
+        cache_size = tmp_db.connection.execute("PRAGMA cache_size").fetchone()[0]
+        tmp_db.bulk_import(sample_entries)
+        assert tmp_db._fetchall(triggers_sql) == triggers
+        assert tmp_db.connection.execute("PRAGMA cache_size").fetchone()[0] == cache_size
+
+    def test_bulk_import_scales_linearly(self, tmp_path):
+        """Doubling the rows should roughly double the import time, not quadruple it."""
+        import random
+        rng = random.Random(7)
+        syllables = ["tɕʰi˥", "lɑ˧", "mu˨˩", "ŋa˥˧", "pʰu˧˥", "sɨ˩", "kʰɤ˧", "ʐo˥"]
+
+        def entries(n, prefix):
+            return [{"example_id": f"{prefix}{i}",
+                     "source_text": " ".join(rng.choices(syllables, k=8)) + f" x{i}",
+                     "gloss": " ".join(rng.choices(["1SG", "go", "PFV", "water", "eat"], k=6)),
+                     "translation": f"sentence number {i} " + rng.choice(["goes", "eats", "sees"])}
+                    for i in range(n)]
+
+        def import_time(n, name):
+            db = CorpusDatabase(str(tmp_path / f"{name}.db"))
+            try:
+                rows = entries(n, name)
+                start = time.perf_counter()
+                db.bulk_import(rows)
+                return time.perf_counter() - start
+            finally:
+                db.close()
+
+        import_time(200, "warmup")
+        small = min(import_time(1500, "small1"), import_time(1500, "small2"))
+        large = import_time(3000, "large")
+        assert large / small < 3.0, (small, large)
+
+
+class TestDatabaseTransaction:
+    """db.transaction() unit of work with savepoint nesting."""
+
+    @staticmethod
+    def _commits(db):
+        commits = []
+        db.connection.set_trace_callback(
+            lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None
+        )
+        return commits
+
+    def test_groups_writes_into_one_commit(self, tmp_db, sample_entry):
+        commits = self._commits(tmp_db)
+        with tmp_db.transaction():
+            ids = [tmp_db.insert_entry(**sample_entry) for _ in range(5)]
+            assert tmp_db.delete_entry(ids[0]) is True
+            tmp_db.update_entries(ids[1:], speaker="A")
+            tmp_db.batch_update_tags(ids[1:], add_tags=["x"])
+            assert commits == []
+        tmp_db.connection.set_trace_callback(None)
+        assert len(commits) == 1
+        assert tmp_db.get_count() == 4
+
+    def test_exception_rolls_back_everything(self, tmp_db, sample_entry):
+        tmp_db.insert_entry(**sample_entry)
+        with pytest.raises(RuntimeError):
+            with tmp_db.transaction():
+                tmp_db.insert_entry(**sample_entry)
+                tmp_db.delete_entries([1])
+                raise RuntimeError("boom")
+        assert [e["id"] for e in tmp_db.get_all_entries()] == [1]
+        assert tmp_db.get_stats()["total"] == 1
+        assert not tmp_db.connection.in_transaction
+
+    def test_nested_failure_only_rolls_back_inner(self, tmp_db, sample_entry):
+        with tmp_db.transaction():
+            outer = tmp_db.insert_entry(**sample_entry)
+            with pytest.raises(ValueError):
+                with tmp_db.transaction():
+                    tmp_db.insert_entry(**sample_entry)
+                    raise ValueError
+            tmp_db.rename_group("", "kept")
+        assert [e["id"] for e in tmp_db.get_all_entries()] == [outer]
+
+    def test_changes_invisible_to_readers_until_exit(self, tmp_db, sample_entry):
+        other = sqlite3.connect(tmp_db.db_path)
+        try:
+            with tmp_db.transaction():
+                tmp_db.insert_entry(**sample_entry)
+                assert other.execute("SELECT COUNT(*) FROM corpus").fetchone()[0] == 0
+            assert other.execute("SELECT COUNT(*) FROM corpus").fetchone()[0] == 1
+        finally:
+            other.close()
+
+    def test_bulk_import_inside_transaction(self, tmp_db, sample_entries):
+        commits = self._commits(tmp_db)
+        with tmp_db.transaction():
+            tmp_db.bulk_import(sample_entries, chunk_size=1)
+            tmp_db.bulk_import(sample_entries, chunk_size=1)
+        tmp_db.connection.set_trace_callback(None)
+        assert len(commits) == 1
+        assert tmp_db.get_count() == 2 * len(sample_entries)
+
+
+class TestDatabaseEntryRecord:
+    """Compact slots-based Entry records returned by read methods."""
+
+    def test_reads_return_entry_records(self, populated_db):
+        entry = populated_db.get_all_entries()[0]
+        assert isinstance(entry, Entry)
+        assert not hasattr(entry, "__dict__")
+        assert isinstance(populated_db.get_entry(entry.id), Entry)
+        assert all(isinstance(e, Entry) for e in populated_db.search_entries("gloss", "rice"))
+
+    def test_mapping_access(self, tmp_db, sample_entry):
+        row_id = tmp_db.insert_entry(**sample_entry)
+        entry = tmp_db.get_entry(row_id)
+        assert entry["gloss"] == entry.get("gloss") == entry.gloss == sample_entry["gloss"]
+        assert entry.get("missing", "default") == "default"
+        assert "source_text" in entry and "missing" not in entry
+        with pytest.raises(KeyError):
+            entry["missing"]
+        assert list(entry.keys())[:3] == ["id", "example_id", "source_text"]
+
+    def test_converts_to_plain_dict(self, tmp_db, sample_entry):
+        row_id = tmp_db.insert_entry(**sample_entry)
+        entry = tmp_db.get_entry(row_id)
+        row = dict(tmp_db.connection.execute(
+            "SELECT * FROM corpus_entries WHERE id = ?", (row_id,)).fetchone())
+        for key in (*database.FOLD_KEY_COLUMNS, "group_ref", "speaker_ref", "uid"):
+            row.pop(key)
+        assert dict(entry) == entry.to_dict() == row
+        assert entry == row
+
+    def test_item_assignment(self):
+        entry = Entry(id=1, source_text="a")
+        entry["source_text"] = "b"
+        assert entry.source_text == "b"
+        with pytest.raises(KeyError):
+            entry["missing"] = "x"
+
+
+class TestDatabaseIterators:
+    """Keyset-paginated streaming iterators."""
+
+    def _fill(self, db, n):
+        db.bulk_import([
+            {"example_id": f"I{i}", "source_text": f"text {i}",
+             "entry_type": "word" if i % 2 else "sentence"}
+            for i in range(n)
+        ])
+
+    def test_iter_entries_yields_all_in_id_order(self, tmp_db):
+        self._fill(tmp_db, 23)
+        entries = list(tmp_db.iter_entries(page_size=5))
+        assert [e["example_id"] for e in entries] == [f"I{i}" for i in range(23)]
+        assert entries == tmp_db.get_all_entries()
+
+    def test_iter_entries_fetches_bounded_pages(self, tmp_db):
+        self._fill(tmp_db, 12)
+        pages = []
+        original = tmp_db._fetch_entries
+        tmp_db._fetch_entries = lambda where, params=(): pages.append(original(where, params)) or pages[-1]
+        list(tmp_db.iter_entries(page_size=5))
+        assert [len(p) for p in pages] == [5, 5, 2]
+
+    def test_iter_entries_filters_type_and_resumes(self, tmp_db):
+        self._fill(tmp_db, 10)
+        words = list(tmp_db.iter_entries("word", page_size=2))
+        assert [e["example_id"] for e in words] == ["I1", "I3", "I5", "I7", "I9"]
+        rest = list(tmp_db.iter_entries("word", after_id=words[1]["id"]))
+        assert [e["example_id"] for e in rest] == ["I5", "I7", "I9"]
+
+    def test_iter_entries_empty_db(self, tmp_db):
+        assert list(tmp_db.iter_entries()) == []
+
+    def test_iter_search_entries_matches_search(self, populated_db):
+        expected = populated_db.search_entries("gloss", "rice")
+        assert list(populated_db.iter_search_entries("gloss", "rice", page_size=1)) == expected
+
+    def test_iter_search_entries_invalid_field(self, populated_db):
+        assert list(populated_db.iter_search_entries("nonexistent", "x")) == []
+
+
 class TestDatabasePerformance:
     """Test database performance optimizations."""
 
@@ -404,8 +1052,35 @@ class TestDatabasePerformance:
         assert "idx_corpus_entry_type" in indexes
         assert "idx_corpus_tags" in indexes
 
-    def test_schema_version_is_4(self, tmp_db):
-        assert tmp_db._get_schema_version() == 4
+    def test_schema_version_is_17(self, tmp_db):
+        assert tmp_db._get_schema_version() == 17
+
+    @pytest.mark.parametrize("sql, params", [
+        ("SELECT * FROM corpus_entries WHERE entry_type = ? ORDER BY id", ("sentence",)),
+        ("""SELECT * FROM corpus_entries WHERE group_ref = (SELECT id FROM groups WHERE code = ?)
+            ORDER BY turn_number, id""", ("DLG001",)),
+        ("""SELECT code, name, member_count FROM groups
+            WHERE entry_type = ? ORDER BY code""", ("dialogue",)),
+    ])
+    def test_hot_queries_use_indexes(self, tmp_db, sql, params):
+        for i in range(200):
+            tmp_db.insert_entry(
+                example_id=f"E{i}", source_text=f"text{i}", gloss="g", translation="t",
+                entry_type=["sentence", "dialogue"][i % 2], group_id=f"DLG{i % 7:03d}",
+                turn_number=i,
+            )
+        tmp_db.cursor.execute("ANALYZE")
+        plan = [row[3] for row in tmp_db.cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        assert not any(step.startswith("SCAN") for step in plan), plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+    def test_next_group_id_follows_type_sequence(self, tmp_db):
+        assert tmp_db.get_next_group_id("dialogue") == "DLG001"
+        for group_id in ("DLG001", "DLG002", "DLH001", "DSC009"):
+            tmp_db.insert_entry(example_id=group_id, source_text="a", gloss="g",
+                                translation="t", entry_type="dialogue", group_id=group_id)
+        assert tmp_db.get_next_group_id("dialogue") == "DLG003"
+        assert tmp_db.get_next_group_id("discourse") == "DSC001"
 
     def test_find_duplicates_exact_with_many_entries(self, tmp_db):
         # Insert 100 entries, 50 pairs of duplicates
@@ -416,3 +1091,485 @@ class TestDatabasePerformance:
             )
         dupes = tmp_db.find_duplicates(threshold=1.0)
         assert len(dupes) == 50
+
+
+class TestDatabaseFullTextSearch:
+    """FTS5 trigram index behind search_entries."""
+
+    def test_fts_table_created(self, tmp_db):
+        assert tmp_db._fts_enabled is True
+        assert tmp_db._table_exists("corpus_fts")
+
+    def test_search_ipa_substring_with_tone(self, populated_db):
+        results = populated_db.search_entries("source_text", "tɕʰi˥")
+        assert [r["example_id"] for r in results] == ["TEST001"]
+
+    def test_search_tone_letters(self, populated_db):
+        results = populated_db.search_entries("all", "an˨˩")
+        assert {r["example_id"] for r in results} == {"TEST001", "W001"}
+
+    def test_field_restricted_match(self, populated_db):
+        # "rice" 只出现在 gloss 中
+        assert populated_db.search_entries("source_text", "rice") == []
+        assert len(populated_db.search_entries("gloss", "rice")) == 2
+
+    def test_short_keyword_falls_back_to_like(self, populated_db):
+        results = populated_db.search_entries("source_text", "ni")
+        assert [r["example_id"] for r in results] == ["TEST002"]
+
+    def test_index_follows_update_and_delete(self, tmp_db):
+        row_id = tmp_db.insert_entry(
+            example_id="U1", source_text="old words", gloss="g", translation="t",
+        )
+        tmp_db.update_entry(
+            entry_id=row_id, example_id="U1", source_text="new words",
+            gloss="g", translation="t",
+        )
+        assert tmp_db.search_entries("source_text", "old") == []
+        assert len(tmp_db.search_entries("source_text", "new")) == 1
+        tmp_db.delete_entry(row_id)
+        assert tmp_db.search_entries("source_text", "new") == []
+
+    def test_search_with_entry_type(self, populated_db):
+        results = populated_db.search_entries("all", "fan", entry_type="word")
+        assert [r["example_id"] for r in results] == ["W001"]
+
+    def test_like_fallback_when_fts_disabled(self, populated_db):
+        populated_db._fts_enabled = False
+        results = populated_db.search_entries("all", "an˨˩")
+        assert {r["example_id"] for r in results} == {"TEST001", "W001"}
+
+    def test_quote_in_keyword(self, tmp_db):
+        tmp_db.insert_entry(
+            example_id="Q1", source_text='say "hello" now', gloss="g", translation="t",
+        )
+        assert len(tmp_db.search_entries("source_text", '"hello"')) == 1
+
+    def test_migration_indexes_existing_rows(self, tmp_path):
+        db_path = str(tmp_path / "legacy.db")
+        db = CorpusDatabase(db_path)
+        db.insert_entry(example_id="L1", source_text="legacy text", gloss="g", translation="t")
+        # 模拟 v4 数据库：删除全文索引并回退版本号
+        for trigger in ("corpus_fts_ai", "corpus_fts_ad", "corpus_fts_au"):
+            db.cursor.execute(f"DROP TRIGGER {trigger}")
+        db.cursor.execute("DROP TABLE corpus_fts")
+        db._set_schema_version(4)
+        db.close()
+
+        db = CorpusDatabase(db_path)
+        assert db._get_schema_version() == SCHEMA_VERSION
+        assert len(db.search_entries("source_text", "legacy")) == 1
+        db.close()
+
+
+class TestDatabaseRegexSearch:
+    """search_entries(use_regex=True) through the REGEXP SQL function."""
+
+    def test_tone_sequence(self, populated_db):
+        results = populated_db.search_entries("source_text", r"˥ \S+˨˩$", use_regex=True)
+        assert [r["example_id"] for r in results] == ["TEST001"]
+
+    def test_anchored_pattern_all_fields(self, populated_db):
+        results = populated_db.search_entries("all", r"^ni˧", use_regex=True)
+        assert [r["example_id"] for r in results] == ["TEST002"]
+
+    def test_regex_is_case_sensitive_unless_flagged(self, tmp_db):
+        tmp_db.insert_entry(example_id="C1", source_text="Morpheme-BOUNDARY", gloss="g", translation="t")
+        assert tmp_db.search_entries("source_text", "boundary", use_regex=True) == []
+        assert len(tmp_db.search_entries("source_text", "(?i)boundary", use_regex=True)) == 1
+
+    def test_literal_prefilter_uses_fts(self, populated_db):
+        statements = []
+        populated_db.connection.set_trace_callback(statements.append)
+        try:
+            populated_db.search_entries("source_text", r"fan˨˩$", use_regex=True)
+            populated_db.search_entries("source_text", r"˧|˥", use_regex=True)
+        finally:
+            populated_db.connection.set_trace_callback(None)
+        selects = [sql for sql in statements if "REGEXP" in sql]
+        assert "corpus_fts MATCH" in selects[0]
+        assert "corpus_fts MATCH" not in selects[1]
+
+    def test_literal_prefilter_matches_full_scan(self, populated_db):
+        pattern = r"(ŋa|ni)˧ \S+˥"
+        expected = populated_db.search_entries("all", pattern, use_regex=True)
+        populated_db._fts_enabled = False
+        assert populated_db.search_entries("all", pattern, use_regex=True) == expected
+        assert {r["example_id"] for r in expected} == {"TEST001", "TEST002"}
+
+    def test_prefilter_is_skipped_without_the_re_parser(self, populated_db, monkeypatch):
+        pattern = r"fan˨˩$"
+        expected = populated_db.search_entries("source_text", pattern, use_regex=True)
+        assert database._regex_literal(pattern) == "fan˨˩"
+        for parser in (None, object()):  # module missing / internal API changed
+            monkeypatch.setattr(database, "_sre_parse", parser)
+            assert database._regex_literal(pattern) == ""
+            assert populated_db.search_entries("source_text", pattern, use_regex=True) == expected
+        assert expected
+
+    def test_pattern_compiled_once_per_query(self, populated_db):
+        database._compile_regex.cache_clear()
+        populated_db.search_entries("all", r"[˥˧]{1}\s", use_regex=True)
+        info = database._compile_regex.cache_info()
+        assert info.misses == 1
+        assert info.hits > 0
+
+    def test_invalid_pattern_raises(self, populated_db):
+        with pytest.raises(re.error):
+            populated_db.search_entries("all", "(unclosed", use_regex=True)
+
+    def test_regex_in_background_thread(self, populated_db):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            populated_db.search_entries("source_text", r"li˥$", use_regex=True)))
+        thread.start()
+        thread.join()
+        assert [r["example_id"] for r in results[0]] == ["TEST002"]
+
+    def test_iter_search_entries_with_regex(self, populated_db):
+        results = list(populated_db.iter_search_entries("source_text", r"˨˩$", page_size=1,
+                                                         use_regex=True))
+        assert {r["example_id"] for r in results} == {"TEST001", "W001"}
+
+
+class TestDatabaseFoldedSearch:
+    """search_entries(ignore_diacritics=True) over the *_key shadow columns."""
+
+    def test_fold_key(self):
+        assert database.fold_key("Tá") == "ta"
+        assert database.fold_key("ta⁵⁵") == database.fold_key("ta˥˥") == "ta"
+        assert database.fold_key("ŋá") == database.fold_key("ŋa\u0301") == "ŋa"
+        assert database.fold_key("tɕʰi˥") == "tɕʰi"
+        assert database.fold_key(None) is None
+
+    def test_short_query_matches_all_forms(self, tmp_db):
+        for i, text in enumerate(["ta⁵⁵", "tá", "TA", "ta˧˥", "pa"]):
+            tmp_db.insert_entry(example_id=f"F{i}", source_text=text, gloss="g", translation="t")
+        folded = tmp_db.search_entries("source_text", "ta", ignore_diacritics=True)
+        assert [r["source_text"] for r in folded] == ["ta⁵⁵", "tá", "TA", "ta˧˥"]
+        exact = tmp_db.search_entries("source_text", "ta")
+        assert "tá" not in [r["source_text"] for r in exact]
+
+    def test_nfc_and_nfd_queries_agree(self, tmp_db):
+        tmp_db.insert_entry(example_id="N1", source_text="kʰáŋ tə̃", gloss="g", translation="t")
+        nfc = unicodedata.normalize("NFC", "kʰáŋ")
+        nfd = unicodedata.normalize("NFD", "kʰáŋ")
+        assert nfc != nfd
+        assert len(tmp_db.search_entries("source_text", nfc, ignore_diacritics=True)) == 1
+        assert len(tmp_db.search_entries("source_text", nfd, ignore_diacritics=True)) == 1
+
+    def test_long_query_uses_folded_index(self, populated_db):
+        statements = []
+        populated_db.connection.set_trace_callback(statements.append)
+        try:
+            results = populated_db.search_entries("source_text", "TCʰI FAN", ignore_diacritics=True)
+        finally:
+            populated_db.connection.set_trace_callback(None)
+        assert [r["example_id"] for r in results] == []
+        results = populated_db.search_entries("source_text", "tɕʰi⁵ fán", ignore_diacritics=True)
+        assert [r["example_id"] for r in results] == ["TEST001"]
+        assert any("corpus_fold_fts MATCH" in sql for sql in statements)
+
+    def test_keys_follow_writes(self, tmp_db):
+        row_id = tmp_db.insert_entry(example_id="W", source_text="pá", gloss="g", translation="t")
+        tmp_db.update_entry(entry_id=row_id, example_id="W", source_text="kó",
+                            gloss="g", translation="t")
+        assert tmp_db.search_entries("source_text", "pa", ignore_diacritics=True) == []
+        assert len(tmp_db.search_entries("source_text", "ko", ignore_diacritics=True)) == 1
+        tmp_db.update_entries([row_id], gloss="NÓUN")
+        assert len(tmp_db.search_entries("gloss", "noun", ignore_diacritics=True)) == 1
+        tmp_db.bulk_import([{"example_id": "B", "source_text": "mù˨˩"}])
+        assert len(tmp_db.search_entries("all", "mu", ignore_diacritics=True)) == 1
+
+    def test_regex_on_folded_text(self, tmp_db):
+        tmp_db.insert_entry(example_id="R", source_text="tá˥ pà", gloss="g", translation="t")
+        results = tmp_db.search_entries("source_text", r"^ta pa$", use_regex=True,
+                                        ignore_diacritics=True)
+        assert len(results) == 1
+
+    def test_like_fallback_without_fts(self, tmp_db):
+        tmp_db.insert_entry(example_id="L", source_text="ŋá˥ tə", gloss="g", translation="t")
+        tmp_db._fold_fts_enabled = False
+        assert len(tmp_db.search_entries("source_text", "ŋa tə", ignore_diacritics=True)) == 1
+
+    def test_migration_backfills_keys(self, tmp_path):
+        db_path = str(tmp_path / "legacy.db")
+        db = CorpusDatabase(db_path)
+        db.insert_entry(example_id="L1", source_text="lá˧ text", gloss="g", translation="t")
+        # 模拟 v9 数据库：删除折叠索引与影子列并回退版本号
+        for trigger in ("corpus_fold_fts_ai", "corpus_fold_fts_ad", "corpus_fold_fts_au"):
+            db.cursor.execute(f"DROP TRIGGER {trigger}")
+        db.cursor.execute("DROP TABLE corpus_fold_fts")
+        for key in database.FOLD_KEY_COLUMNS:
+            db.cursor.execute(f"ALTER TABLE corpus DROP COLUMN {key}")
+        db._set_schema_version(9)
+        db.close()
+
+        db = CorpusDatabase(db_path)
+        assert db._get_schema_version() == SCHEMA_VERSION
+        assert len(db.search_entries("source_text", "la text", ignore_diacritics=True)) == 1
+        db.close()
+
+
+class TestDatabaseConcurrency:
+    """WAL journaling and background read-only connections."""
+
+    def test_wal_mode_enabled(self, tmp_db):
+        mode = tmp_db.connection.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_wal_can_be_disabled(self, tmp_path):
+        db = CorpusDatabase(str(tmp_path / "rollback.db"), wal=False)
+        mode = db.connection.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "delete"
+        db.close()
+
+    def test_background_reads_use_reader_connections(self, populated_db):
+        results = {}
+
+        def worker():
+            results["count"] = populated_db.get_count()
+            results["stats"] = populated_db.get_stats()
+            results["search"] = populated_db.search_entries("gloss", "rice")
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert results["count"] == 3
+        assert results["stats"]["total"] == 3
+        assert len(results["search"]) == 2
+
+    def test_background_read_does_not_block_on_open_write(self, populated_db):
+        # 写连接持有未提交的事务时，后台只读连接仍可读到已提交数据
+        populated_db.cursor.execute("BEGIN")
+        populated_db.cursor.execute(
+            "INSERT INTO corpus (example_id, source_text) VALUES ('X', 'uncommitted')"
+        )
+        results = []
+        thread = threading.Thread(target=lambda: results.append(populated_db.get_count()))
+        thread.start()
+        thread.join(timeout=5)
+        assert results == [3]
+        # 创建连接的线程能看到自己未提交的修改
+        assert populated_db.get_count() == 4
+        populated_db.connection.rollback()
+
+    def test_reader_connections_are_read_only(self, populated_db):
+        errors = []
+
+        def worker():
+            try:
+                with populated_db._readers.connection() as conn:
+                    conn.execute("DELETE FROM corpus")
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+        assert populated_db.get_count() == 3
+
+    def test_concurrent_readers(self, populated_db):
+        counts = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(20):
+                count = populated_db.get_count()
+                with lock:
+                    counts.append(count)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert counts == [3] * 160
+
+
+class TestDatabaseFederation:
+    """Read-only ATTACH of other corpus files for federated queries."""
+
+    @pytest.fixture
+    def other_db_path(self, tmp_path):
+        path = str(tmp_path / "trip2.db")
+        other = CorpusDatabase(path)
+        other.insert_entry(example_id="B1", source_text="ŋa˧ tɕʰi˥ fan˨˩", gloss="1SG eat rice",
+                           translation="t", entry_type="word", tags="已审核")
+        other.insert_entry(example_id="B2", source_text="kʰɤ˥ mu˨", gloss="dog big",
+                           translation="t")
+        other.close()
+        return path
+
+    @pytest.fixture
+    def federated_db(self, tmp_db, other_db_path):
+        tmp_db.insert_entry(example_id="A1", source_text="ŋa˧ tə˥", gloss="1SG CLF",
+                            translation="t")
+        tmp_db.insert_entry(example_id="A2", source_text="ŋa˧ tɕʰi˥", gloss="1SG eat",
+                            translation="t", tags="已审核")
+        assert tmp_db.attach_corpus(other_db_path) == "trip2"
+        return tmp_db
+
+    def test_search_tags_results_by_source(self, federated_db):
+        results = federated_db.federated_search("source_text", "ŋa˧")
+        assert [(label, e["example_id"]) for label, e in results] == [
+            ("test_corpus", "A1"), ("test_corpus", "A2"), ("trip2", "B1")
+        ]
+        folded = federated_db.federated_search("all", "tɕʰi", ignore_diacritics=True,
+                                               tags=["已审核"])
+        assert [e["example_id"] for _, e in folded] == ["A2", "B1"]
+        assert [e["example_id"] for _, e in
+                federated_db.federated_search("gloss", "dog", use_regex=True)] == ["B2"]
+
+    def test_stats_and_frequencies(self, federated_db):
+        stats = federated_db.federated_stats()
+        assert list(stats) == ["test_corpus", "trip2"]
+        assert stats["trip2"]["total"] == 2
+        assert stats["trip2"]["by_type"]["word"] == 1
+        form, total, by_source = federated_db.federated_word_frequencies(limit=1)[0]
+        assert (form, total, by_source) == ("ŋa˧", 3, {"test_corpus": 2, "trip2": 1})
+        assert federated_db.federated_word_frequencies(entry_type="word") == [
+            ("fan˨˩", 1, {"trip2": 1}), ("tɕʰi˥", 1, {"trip2": 1}), ("ŋa˧", 1, {"trip2": 1})
+        ]
+
+    def test_attached_corpus_is_read_only(self, federated_db):
+        with pytest.raises(sqlite3.OperationalError):
+            federated_db.connection.execute("DELETE FROM fed_1.corpus")
+
+    def test_background_reads_see_attachments(self, federated_db):
+        results = {}
+        thread = threading.Thread(
+            target=lambda: results.update(search=federated_db.federated_search("gloss", "dog"))
+        )
+        thread.start()
+        thread.join()
+        assert [label for label, _ in results["search"]] == ["trip2"]
+
+    def test_detach(self, federated_db, other_db_path):
+        assert federated_db.detach_corpus("trip2") is True
+        assert federated_db.detach_corpus("trip2") is False
+        assert federated_db.attached_corpora() == []
+        assert [label for label, _ in federated_db.federated_search("gloss", "1SG")] == [
+            "test_corpus", "test_corpus"
+        ]
+        assert federated_db.attach_corpus(other_db_path, label="other") == "other"
+
+    def test_rejects_invalid_files(self, federated_db, other_db_path, tmp_path):
+        with pytest.raises(ValueError):
+            federated_db.attach_corpus(other_db_path)
+        with pytest.raises(ValueError):
+            federated_db.attach_corpus(federated_db.db_path)
+        with pytest.raises(FileNotFoundError):
+            federated_db.attach_corpus(str(tmp_path / "missing.db"))
+        plain = tmp_path / "plain.db"
+        sqlite3.connect(str(plain)).close()
+        with pytest.raises(ValueError):
+            federated_db.attach_corpus(str(plain))
+
+    def test_old_corpus_is_rejected_without_writing(self, tmp_db, tmp_path):
+        path = tmp_path / "old.db"
+        conn = sqlite3.connect(str(path))
+        conn.execute("""CREATE TABLE corpus (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        example_id TEXT, source_text TEXT, gloss TEXT, translation TEXT,
+                        notes TEXT)""")
+        conn.execute("CREATE TABLE schema_version (version INTEGER)")
+        conn.execute("INSERT INTO schema_version (version) VALUES (4)")
+        conn.execute("INSERT INTO corpus (example_id, source_text) VALUES ('O1', 'ŋa˧')")
+        conn.commit()
+        conn.close()
+        content, mtime = path.read_bytes(), path.stat().st_mtime_ns
+        with pytest.raises(ValueError, match="升级"):
+            tmp_db.attach_corpus(str(path))
+        assert path.read_bytes() == content
+        assert path.stat().st_mtime_ns == mtime
+        assert tmp_db.attached_corpora() == []
+
+    def test_writable_attachment_is_refused(self, tmp_db, other_db_path):
+        # what ATTACH yields when URI file names are not honoured: a read-write attachment
+        tmp_db.connection.execute("ATTACH DATABASE ? AS fed_rw", (other_db_path,))
+        with pytest.raises(sqlite3.OperationalError):
+            tmp_db._check_attached_read_only("fed_rw", other_db_path)
+        assert "fed_rw" not in [row[1] for row in tmp_db.connection.execute("PRAGMA database_list")]
+        tmp_db.connection.execute("ATTACH DATABASE ? AS fed_ro",
+                                  (database.Path(other_db_path).as_uri() + "?mode=ro",))
+        tmp_db._check_attached_read_only("fed_ro", other_db_path)
+
+
+class TestDatabaseChangeLog:
+    """Trigger-populated changes table for incremental consumers."""
+
+    def _ops(self, changes):
+        return [(c.entry_id, c.op) for c in changes]
+
+    def test_records_writes(self, tmp_db):
+        assert tmp_db.latest_change_seq() == 0
+        a = tmp_db.insert_entry(example_id="A", source_text="ŋa˧", gloss="g", translation="t",
+                                entry_type="dialogue", group_id="DLG001", group_name="x")
+        b = tmp_db.insert_entry(example_id="B", source_text="tə˥", gloss="g", translation="t")
+        tmp_db.update_entries([b], speaker="A")
+        tmp_db.rename_group("DLG001", "y")
+        tmp_db.delete_entry(a)
+        changes = tmp_db.changes_since(0)
+        assert self._ops(changes) == [(a, "I"), (b, "I"), (b, "U"), (a, "U"), (a, "D")]
+        assert [c.seq for c in changes] == sorted(c.seq for c in changes)
+        assert tmp_db.latest_change_seq() == changes[-1].seq
+        assert self._ops(tmp_db.changes_since(changes[2].seq, limit=1)) == [(a, "U")]
+
+    def test_derived_column_updates_are_not_logged(self, tmp_db):
+        entry_id = tmp_db.insert_entry(example_id="A", source_text="ŋa˧", gloss="g",
+                                       translation="t")
+        with tmp_db.transaction():
+            tmp_db._sync_fold_keys([entry_id])
+        assert self._ops(tmp_db.changes_since(0)) == [(entry_id, "I")]
+
+    def test_bulk_import_is_logged(self, tmp_db, sample_entries):
+        tmp_db.bulk_import(sample_entries)
+        changes = tmp_db.changes_since(0)
+        assert len(changes) == len(sample_entries)
+        assert {c.op for c in changes} == {"I"}
+
+    def test_compaction_keeps_latest_change_per_entry(self, tmp_db):
+        a = tmp_db.insert_entry(example_id="A", source_text="a", gloss="g", translation="t")
+        b = tmp_db.insert_entry(example_id="B", source_text="b", gloss="g", translation="t")
+        cursor = tmp_db.latest_change_seq()
+        tmp_db.update_entries([a], notes="n")
+        tmp_db.update_entries([a], notes="m")
+        tmp_db.delete_entry(b)
+        before = tmp_db.changes_since(cursor)
+
+        assert tmp_db.compact_changes() == 3
+        after = tmp_db.changes_since(cursor)
+        assert self._ops(after) == [(a, "U"), (b, "D")]
+        assert [c.seq for c in after] == [before[1].seq, before[2].seq]
+        assert self._ops(tmp_db.changes_since(0)) == [(a, "U"), (b, "D")]
+
+    def test_purge_truncates_older_cursors(self, tmp_db):
+        tmp_db.insert_entry(example_id="A", source_text="a", gloss="g", translation="t")
+        cursor = tmp_db.latest_change_seq()
+        tmp_db.insert_entry(example_id="B", source_text="b", gloss="g", translation="t")
+        tmp_db.compact_changes(through_seq=cursor)
+        with pytest.raises(ChangeLogTruncated):
+            tmp_db.changes_since(0)
+        assert len(tmp_db.changes_since(cursor)) == 1
+        # 清理后序号不复用
+        latest = tmp_db.latest_change_seq()
+        tmp_db.compact_changes(through_seq=latest)
+        assert tmp_db.changes_since(latest) == []
+        tmp_db.insert_entry(example_id="C", source_text="c", gloss="g", translation="t")
+        assert tmp_db.changes_since(latest)[0].seq == latest + 1
+
+    def test_auto_compaction_on_close(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(database, "CHANGE_LOG_COMPACT_ROWS", 2)
+        path = str(tmp_path / "compact.db")
+        db = CorpusDatabase(path)
+        entry_id = db.insert_entry(example_id="A", source_text="a", gloss="g", translation="t")
+        for i in range(3):
+            db.update_entries([entry_id], notes=str(i))
+        db.close()
+        db = CorpusDatabase(path)
+        try:
+            assert db.changes_since(0) == [Change(db.latest_change_seq(), entry_id, "U",
+                                                  db.changes_since(0)[0].ts)]
+        finally:
+            db.close()
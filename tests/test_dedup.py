@@ -0,0 +1,181 @@
+"""Tests for dedup.py - MinHash/LSH fuzzy duplicate detection."""
+import difflib
+import random
+import threading
+
+import pytest
+
+import dedup
+
+
+def _brute_force_groups(entries, threshold):
+    """The original O(n^2) greedy grouping, used as the reference result."""
+    used = set()
+    result = []
+    for i, a in enumerate(entries):
+        if i in used:
+            continue
+        text_a = (a.get("source_text") or "").strip().lower()
+        if not text_a:
+            continue
+        group = [a]
+        for j in range(i + 1, len(entries)):
+            if j in used:
+                continue
+            text_b = (entries[j].get("source_text") or "").strip().lower()
+            if text_b and difflib.SequenceMatcher(None, text_a, text_b).ratio() >= threshold:
+                group.append(entries[j])
+                used.add(j)
+        if len(group) > 1:
+            used.add(i)
+            result.append(group)
+    return result
+
+
+def _ids(groups):
+    return [[entry["id"] for entry in group] for group in groups]
+
+
+class TestSignatures:
+    """Shingling and MinHash signatures."""
+
+    def test_shingles_are_padded(self):
+        grams = dedup.shingles("ab", n=3)
+        assert grams == {"\x02ab", "ab\x03"}
+        assert dedup.shingles("", n=3) == {"\x02\x03"}
+
+    def test_minhash_is_deterministic(self):
+        sig = dedup.minhash("ŋa˧ tə˥")
+        assert len(sig) == dedup.NUM_PERM
+        assert sig == dedup.minhash("ŋa˧ tə˥")
+        assert sig != dedup.minhash("ni˧ kʰɤ˥")
+
+    def test_minhash_many_matches_single(self):
+        texts = ["ŋa˧ tə˥", "ŋa˧ tə˧", "fan˨˩"]
+        assert dedup.minhash_many(texts) == {t: dedup.minhash(t) for t in texts}
+
+    def test_signature_round_trip(self):
+        sig = dedup.minhash("tɕʰi˥ fan˨˩")
+        assert dedup.unpack_signature(dedup.pack_signature(sig)) == sig
+
+    def test_similar_texts_share_bands(self):
+        a = dedup.minhash("the quick brown fox jumps")
+        b = dedup.minhash("the quick brown box jumps")
+        candidates = dedup.candidate_pairs({"a": a, "b": b}, dedup.lsh_rows(0.8))
+        assert candidates["a"] == {"b"}
+
+    def test_lsh_rows_grows_with_threshold(self):
+        assert dedup.lsh_rows(0.5) is None
+        assert dedup.lsh_rows(0.8) < dedup.lsh_rows(0.9) < dedup.lsh_rows(0.95)
+
+
+class TestFindNearDuplicates:
+    """find_duplicates(threshold < 1) through the LSH candidate generator."""
+
+    def test_matches_pairwise_reference(self, tmp_db):
+        rng = random.Random(7)
+        syllables = ["ŋa˧", "tə˥", "tɕʰi˥", "fan˨˩", "ni˧", "kʰɤ˥", "na˧", "li˥", "mu˨", "so˥˧"]
+        texts = [" ".join(rng.choice(syllables) for _ in range(rng.randint(4, 8)))
+                 for _ in range(60)]
+        for i in range(20):
+            chars = list(texts[i])
+            chars[rng.randrange(len(chars))] = "e"
+            texts.append("".join(chars))
+        texts += ["", "   ", texts[0].upper()]
+        tmp_db.bulk_import([{"example_id": str(i), "source_text": t} for i, t in enumerate(texts)])
+
+        entries = tmp_db.get_all_entries()
+        for threshold in (0.8, 0.9):
+            assert _ids(tmp_db.find_duplicates(threshold)) == _ids(_brute_force_groups(entries, threshold))
+
+    def test_signatures_are_persisted_and_incremental(self, tmp_db, monkeypatch):
+        a = tmp_db.insert_entry(example_id="A", source_text="the quick brown fox",
+                                gloss="g", translation="t")
+        tmp_db.insert_entry(example_id="B", source_text="the quick brown box",
+                            gloss="g", translation="t")
+        assert len(tmp_db.find_duplicates(0.8)) == 1
+        assert len(tmp_db.get_minhash_signatures()) == 2
+
+        computed = []
+        original = dedup.minhash_many
+
+        def spy(texts):
+            texts = list(texts)
+            computed.extend(texts)
+            return original(texts)
+
+        monkeypatch.setattr(dedup, "minhash_many", spy)
+        tmp_db.find_duplicates(0.8)
+        assert computed == []
+
+        tmp_db.update_entry(entry_id=a, example_id="A", source_text="something else entirely",
+                            gloss="g", translation="t")
+        assert tmp_db.find_duplicates(0.8) == []
+        assert computed == ["something else entirely"]
+
+    def test_deleted_entries_drop_signatures(self, tmp_db):
+        a = tmp_db.insert_entry(example_id="A", source_text="abc def", gloss="g", translation="t")
+        tmp_db.insert_entry(example_id="B", source_text="abc deg", gloss="g", translation="t")
+        tmp_db.find_duplicates(0.8)
+        tmp_db.delete_entry(a)
+        assert list(tmp_db.get_minhash_signatures()) == [a + 1]
+
+    @pytest.mark.parametrize("threshold", [0.3, 0.5])
+    def test_low_threshold_falls_back_to_all_pairs(self, tmp_db, threshold):
+        tmp_db.insert_entry(example_id="A", source_text="abcd", gloss="g", translation="t")
+        tmp_db.insert_entry(example_id="B", source_text="abxy", gloss="g", translation="t")
+        assert _ids(tmp_db.find_duplicates(threshold)) == [[1, 2]]
+
+
+class TestParallelScoring:
+    """Chunked process-pool scoring with progress and cancellation."""
+
+    PAIRS = [("the quick brown fox", "the quick brown box"),
+             ("abcdef", "uvwxyz"),
+             ("ŋa˧ tə˥", "ŋa˧ tə˧")] * 5
+
+    def test_process_pool_matches_serial(self, monkeypatch):
+        monkeypatch.setattr(dedup, "SCORE_CHUNK_SIZE", 4)
+        monkeypatch.setattr(dedup, "PARALLEL_MIN_PAIRS", 0)
+        progress = []
+        parallel = dedup.score_pairs(self.PAIRS, 0.8, workers=2,
+                                     progress_callback=lambda done, total: progress.append(done))
+        serial = dedup.score_pairs(self.PAIRS, 0.8, workers=1)
+        assert parallel == serial
+        assert serial[("abcdef", "uvwxyz")] is None
+        assert serial[("the quick brown fox", "the quick brown box")] > 0.9
+        assert sorted(progress) == progress and progress[-1] == len(self.PAIRS)
+
+    def test_cancel_stops_scoring(self, monkeypatch):
+        monkeypatch.setattr(dedup, "SCORE_CHUNK_SIZE", 4)
+        cancel = threading.Event()
+        progress = []
+
+        def on_progress(done, total):
+            progress.append(done)
+            cancel.set()
+
+        with pytest.raises(dedup.DetectionCancelled):
+            dedup.score_pairs(self.PAIRS, 0.8, workers=1,
+                              progress_callback=on_progress, cancel_event=cancel)
+        assert progress == [4]
+
+    def test_find_duplicates_in_background_thread(self, tmp_db):
+        tmp_db.insert_entry(example_id="A", source_text="the quick brown fox", gloss="g", translation="t")
+        tmp_db.insert_entry(example_id="B", source_text="the quick brown box", gloss="g", translation="t")
+        results = []
+        thread = threading.Thread(target=lambda: results.append(tmp_db.find_duplicates(0.8)))
+        thread.start()
+        thread.join()
+        assert _ids(results[0]) == [[1, 2]]
+        # 签名由后台线程通过临时写连接保存
+        assert len(tmp_db.get_minhash_signatures()) == 2
+
+    def test_cancelled_detection_keeps_computed_signatures(self, tmp_db):
+        tmp_db.insert_entry(example_id="A", source_text="abc def", gloss="g", translation="t")
+        tmp_db.insert_entry(example_id="B", source_text="abc deg", gloss="g", translation="t")
+        cancel = threading.Event()
+        with pytest.raises(dedup.DetectionCancelled):
+            tmp_db.find_duplicates(0.8, progress_callback=lambda done, total: cancel.set(),
+                                   cancel_event=cancel)
+        assert len(tmp_db.get_minhash_signatures()) == 2
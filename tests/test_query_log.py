@@ -0,0 +1,182 @@
+"""Tests for query_log.py - slow-query log and per-method timing."""
+import logging
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import query_log
+from database import CorpusDatabase
+from logger import SLOW_QUERY_LOG_FILE, setup_slow_query_logger
+
+# A statement that keeps the SQLite VM busy for a while
+SLOW_SQL = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 300000)
+    SELECT SUM(i) FROM n
+"""
+
+
+class _ProfiledDatabase(CorpusDatabase):
+    """CorpusDatabase with one public method that runs SLOW_SQL."""
+
+    def slow_report(self):
+        return self._fetchall(SLOW_SQL)
+
+
+@pytest.fixture
+def slow_log():
+    log = logging.getLogger("test.slow_query")
+    log.setLevel(logging.INFO)
+    return log
+
+
+@pytest.fixture
+def profiled_db(tmp_path, slow_log):
+    profiler = query_log.QueryProfiler(threshold_ms=5, log=slow_log)
+    db = _ProfiledDatabase(str(tmp_path / "profiled.db"), profiler=profiler)
+    yield db
+    db.close()
+
+
+class TestSlowQueryLog:
+    """Statement timing around execute/fetch calls, attributed through the trace callback."""
+
+    def test_slow_statement_is_logged_with_plan(self, profiled_db, caplog):
+        profiled_db.insert_entry(example_id="A", source_text="ŋa˧", gloss="g", translation="t")
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            profiled_db.search_entries("source_text", "ŋa˧")
+            assert caplog.records == []
+            profiled_db._fetchall(SLOW_SQL)
+            profiled_db.profiler.flush()
+        messages = [r.getMessage() for r in caplog.records]
+        assert len(messages) == 1
+        assert "SUM(i)" in messages[0]
+        assert "计划:" in messages[0]
+
+    def test_slow_statement_in_method_names_the_method(self, profiled_db, caplog):
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            profiled_db.slow_report()
+        messages = [r.getMessage() for r in caplog.records]
+        assert any(m.startswith("慢语句") and "（slow_report）" in m for m in messages)
+        assert any(m.startswith("慢方法 slow_report") for m in messages)
+
+    def test_background_reads_are_timed(self, profiled_db, caplog):
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            thread = threading.Thread(target=profiled_db.slow_report)
+            thread.start()
+            thread.join()
+        assert any("（slow_report）" in r.getMessage() for r in caplog.records)
+
+    def test_lock_wait_is_timed(self, profiled_db, caplog):
+        # few VM instructions: the statement spends its time in the busy handler
+        other = sqlite3.connect(profiled_db.db_path, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")
+        release = threading.Timer(0.2, other.commit)
+        release.start()
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            profiled_db.connection.execute("CREATE TABLE waited (x)")
+            profiled_db.connection.commit()
+            profiled_db.profiler.flush()
+        release.join()
+        other.close()
+        durations = {m.split("\n")[1]: float(m.split()[1]) for m in
+                     (r.getMessage() for r in caplog.records)}
+        assert durations["  SQL: CREATE TABLE waited (x)"] >= 150
+
+    def test_statement_shorter_than_progress_interval_is_timed(self, profiled_db, caplog):
+        profiled_db.connection.create_function("pause", 0, lambda: time.sleep(0.05))
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            profiled_db._fetchall("SELECT pause()")
+            profiled_db.profiler.flush()
+        assert any("SELECT pause()" in r.getMessage() for r in caplog.records)
+
+    def test_row_processing_between_statements_is_not_counted(self, profiled_db, caplog):
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            profiled_db._fetchall("SELECT 1")
+            time.sleep(0.05)
+            profiled_db._fetchall("SELECT 2")
+            profiled_db.profiler.flush()
+        assert caplog.records == []
+
+    def test_statements_outside_methods_are_written_without_flush(self, profiled_db, caplog):
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            for _ in range(3):
+                profiled_db._fetchall(SLOW_SQL)
+        # the last statement ends only when the next one starts
+        assert len(caplog.records) == 2
+        assert profiled_db.profiler._state().pending == []
+
+    def test_method_stats(self, profiled_db):
+        profiled_db.insert_entry(example_id="A", source_text="a", gloss="g", translation="t")
+        profiled_db.get_all_entries()
+        profiled_db.get_all_entries()
+        stats = profiled_db.profiler.method_stats()
+        assert stats["get_all_entries"].calls == 2
+        # insert_entry 内部的 transaction() 不单独计时
+        assert "transaction" not in stats
+
+    def test_generator_methods_are_timed_until_exhausted(self, profiled_db):
+        profiled_db.insert_entry(example_id="A", source_text="abc", gloss="g", translation="t")
+        results = list(profiled_db.iter_search_entries("source_text", "abc"))
+        assert len(results) == 1
+        assert profiled_db.profiler.method_stats()["iter_search_entries"].calls == 1
+
+    def test_generator_suspension_is_not_counted(self, profiled_db, caplog):
+        for i in range(3):
+            profiled_db.insert_entry(example_id=f"A{i}", source_text="abc", gloss="g",
+                                     translation="t")
+        with caplog.at_level(logging.INFO, logger="test.slow_query"):
+            for _ in profiled_db.iter_search_entries("source_text", "abc"):
+                time.sleep(0.02)
+                profiled_db.slow_report()
+        stats = profiled_db.profiler.method_stats()
+        assert stats["iter_search_entries"].calls == 1
+        assert stats["iter_search_entries"].total_ms < 50
+        assert stats["slow_report"].calls == 3
+        messages = [r.getMessage() for r in caplog.records]
+        assert sum(m.startswith("慢方法 slow_report") for m in messages) == 3
+        assert not any("（iter_search_entries）" in m for m in messages)
+
+    def test_generator_closed_early_is_counted_once(self, profiled_db):
+        for i in range(3):
+            profiled_db.insert_entry(example_id=f"A{i}", source_text="abc", gloss="g",
+                                     translation="t")
+        for _ in profiled_db.iter_search_entries("source_text", "abc"):
+            break
+        assert profiled_db.profiler.method_stats()["iter_search_entries"].calls == 1
+        assert profiled_db.profiler._state().depth == 0
+
+    def test_disabled_by_default(self, tmp_db):
+        assert tmp_db.profiler is None
+
+
+class TestEnable:
+    """Module-level opt-in and the dedicated rotating log file."""
+
+    def test_enable_writes_slow_query_file(self, tmp_path):
+        log_dir = tmp_path / "logs"
+        query_log.enable(threshold_ms=5, log_dir=str(log_dir))
+        try:
+            db = CorpusDatabase(str(tmp_path / "enabled.db"))
+            assert db.profiler is query_log.default_profiler()
+            db._fetchall(SLOW_SQL)
+            db.close()
+        finally:
+            query_log.disable()
+        assert query_log.default_profiler() is None
+        content = (log_dir / SLOW_QUERY_LOG_FILE).read_text(encoding="utf-8")
+        assert "SUM(i)" in content
+
+    def test_slow_query_logger_does_not_propagate(self, tmp_path):
+        log = setup_slow_query_logger(str(tmp_path))
+        assert log.propagate is False
+        assert len(log.handlers) == 1
+        setup_slow_query_logger(str(tmp_path))
+        assert len(log.handlers) == 1
+
+    def test_explain_indents_plan(self, tmp_db):
+        plan = query_log.explain(tmp_db.db_path,
+                                 "SELECT * FROM corpus WHERE id IN (SELECT entry_id FROM tokens)")
+        assert plan and any(step.startswith("  ") for step in plan)
+        assert query_log.explain(":memory:", "SELECT 1")[0].startswith("（")
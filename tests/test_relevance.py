@@ -0,0 +1,249 @@
+"""Tests for relevance.py - BM25 ranking and character n-gram TF-IDF similarity."""
+import math
+
+import relevance
+from database import CorpusDatabase
+
+
+def _reference_bm25(query, docs, k1=relevance.BM25_K1, b=relevance.BM25_B):
+    """Textbook BM25 over in-memory token lists, used as the reference result."""
+    avg = sum(len(d) for d in docs.values()) / len(docs)
+    scores = {}
+    for doc_id, tokens in docs.items():
+        score = 0.0
+        for term in set(query):
+            tf = tokens.count(term)
+            if not tf:
+                continue
+            n = sum(1 for d in docs.values() if term in d)
+            weight = math.log(1 + (len(docs) - n + 0.5) / (n + 0.5))
+            score += weight * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg))
+        if score:
+            scores[doc_id] = score
+    return scores
+
+
+class TestScoring:
+    """Pure BM25 scoring helpers."""
+
+    def test_tokenize_matches_whitespace_split(self):
+        assert relevance.tokenize("ŋa˧  tə˥\ttɕʰi˥") == ["ŋa˧", "tə˥", "tɕʰi˥"]
+        assert relevance.tokenize(None) == []
+
+    def test_idf_is_positive_and_decreasing(self):
+        assert relevance.idf(100, 1) > relevance.idf(100, 50) > relevance.idf(100, 100) > 0
+
+    def test_scores_match_reference(self):
+        docs = {
+            1: "ŋa˧ tə˥ tɕʰi˥ fan˨˩".split(),
+            2: "ni˧ tə˥ tɕʰi˥ fan˨˩ fan˨˩".split(),
+            3: "kʰɤ˥ na˧".split(),
+            4: "ŋa˧ na˧ li˥ mu˨ so˥˧ tə˥".split(),
+        }
+        query = "ŋa˧ tɕʰi˥ fan˨˩ fan˨˩".split()
+        postings = {}
+        for doc_id, tokens in docs.items():
+            freqs = {t: tokens.count(t) for t in set(tokens) if t in query}
+            if freqs:
+                postings[doc_id] = freqs
+        doc_freqs = {t: sum(1 for d in docs.values() if t in d) for t in set(query)}
+        avg = sum(len(d) for d in docs.values()) / len(docs)
+        scores = relevance.bm25_scores(query, postings, {i: len(d) for i, d in docs.items()},
+                                       doc_freqs, len(docs), avg)
+        expected = _reference_bm25(query, docs)
+        assert scores.keys() == expected.keys()
+        for doc_id, score in expected.items():
+            assert math.isclose(scores[doc_id], score)
+
+    def test_top_k_prefers_newer_on_ties(self):
+        assert relevance.top_k({1: 2.0, 2: 1.0, 3: 2.0}, 2) == [3, 1]
+
+
+class TestContextEntries:
+    """CorpusDatabase.find_relevant_entries / get_context_entries_for_gloss."""
+
+    def _add(self, db, example_id, source_text, gloss="g", tags=""):
+        return db.insert_entry(example_id=example_id, source_text=source_text,
+                               gloss=gloss, translation="t", tags=tags)
+
+    def test_ranks_by_shared_terms(self, tmp_db):
+        self._add(tmp_db, "A", "ŋa˧ tə˥ tɕʰi˥ fan˨˩")
+        self._add(tmp_db, "B", "ni˧ kʰɤ˥ na˧")
+        self._add(tmp_db, "C", "ŋa˧ tə˥ li˥ mu˨")
+        self._add(tmp_db, "D", "ŋa˧ tɕʰi˥ fan˨˩", gloss="")
+        results = tmp_db.find_relevant_entries("tɕʰi˥ fan˨˩ ŋa˧", limit=5)
+        assert [r["example_id"] for r in results] == ["A", "C"]
+        assert tmp_db.find_relevant_entries("", limit=5) == []
+        assert tmp_db.find_relevant_entries("zzz", limit=5) == []
+
+    def test_follows_edits(self, tmp_db):
+        a = self._add(tmp_db, "A", "ŋa˧ tə˥")
+        tmp_db.update_entry(entry_id=a, example_id="A", source_text="so˥˧ mu˨",
+                            gloss="g", translation="t")
+        assert tmp_db.find_relevant_entries("ŋa˧", limit=5) == []
+        assert [r["id"] for r in tmp_db.find_relevant_entries("mu˨", limit=5)] == [a]
+
+    def test_token_totals_follow_writes(self, tmp_db, sample_entries):
+        def totals():
+            return (tmp_db._fetchone("SELECT SUM(tokens) FROM stats_by_type")[0],
+                    tmp_db._fetchone("SELECT COALESCE(SUM(count), 0) FROM word_freq")[0])
+
+        a = self._add(tmp_db, "A", "ŋa˧ tə˥ tɕʰi˥")
+        tmp_db.bulk_import(sample_entries)
+        assert totals()[0] == totals()[1] > 3
+        tmp_db.update_entry(entry_id=a, example_id="A", source_text="so˥˧ mu˨",
+                            gloss="g", translation="t", entry_type="dialogue", group_id="DLG001")
+        assert totals()[0] == totals()[1]
+        assert tmp_db._fetchone(
+            "SELECT tokens FROM stats_by_type WHERE entry_type = 'dialogue'")[0] >= 2
+        tmp_db.delete_entry(a)
+        assert totals()[0] == totals()[1]
+
+    def test_lookup_does_not_scan_vocabulary(self, tmp_db):
+        self._add(tmp_db, "A", "ŋa˧ tə˥ tɕʰi˥")
+        statements = []
+        tmp_db.connection.set_trace_callback(statements.append)
+        assert tmp_db.find_relevant_entries("ŋa˧", limit=5)
+        tmp_db.connection.set_trace_callback(None)
+        assert not any("word_freq" in sql for sql in statements)
+
+    def test_upgrade_backfills_token_totals(self, tmp_path):
+        path = str(tmp_path / "v16.db")
+        db = CorpusDatabase(path)
+        a = self._add(db, "A", "ŋa˧ tə˥ tɕʰi˥")
+        self._add(db, "B", "ni˧ kʰɤ˥")
+        with db.transaction():  # recreate the v16 layout
+            for trigger in ("tokens_ai", "tokens_ad", "tokens_au"):
+                db.cursor.execute(f"DROP TRIGGER {trigger}")
+            db.cursor.execute("ALTER TABLE stats_by_type DROP COLUMN tokens")
+            db.cursor.execute("UPDATE schema_version SET version = 16")
+        db.close()
+
+        db = CorpusDatabase(path)
+        try:
+            assert db._fetchone("SELECT SUM(tokens) FROM stats_by_type")[0] == 5
+            db.delete_entry(a)
+            assert db._fetchone("SELECT SUM(tokens) FROM stats_by_type")[0] == 2
+            assert [r["example_id"] for r in db.find_relevant_entries("ni˧", limit=5)] == ["B"]
+        finally:
+            db.close()
+
+    def test_context_prefers_relevant_reviewed_entries(self, tmp_db):
+        self._add(tmp_db, "R1", "ni˧ kʰɤ˥ na˧", tags="已审核")
+        self._add(tmp_db, "R2", "ŋa˧ tɕʰi˥ fan˨˩", tags="已审核")
+        self._add(tmp_db, "U1", "ŋa˧ tɕʰi˥ fan˨˩ tə˥")
+        self._add(tmp_db, "U2", "li˥ mu˨")
+        editing = self._add(tmp_db, "E", "ŋa˧ tɕʰi˥ fan˨˩", tags="定稿")
+
+        results = tmp_db.get_context_entries_for_gloss(
+            limit=3, source_text="ŋa˧ tɕʰi˥ fan˨˩", exclude_id=editing
+        )
+        assert [r["example_id"] for r in results] == ["R2", "U1", "R1"]
+
+    def test_context_without_source_text_keeps_recency_order(self, tmp_db):
+        self._add(tmp_db, "A", "a", tags="已审核")
+        self._add(tmp_db, "B", "b")
+        results = tmp_db.get_context_entries_for_gloss(limit=2)
+        assert [r["example_id"] for r in results] == ["A", "B"]
+
+
+class TestSimilarEntries:
+    """Character n-gram TF-IDF index and CorpusDatabase.similar_entries."""
+
+    def _add(self, db, example_id, source_text, gloss="", translation=""):
+        return db.insert_entry(example_id=example_id, source_text=source_text,
+                               gloss=gloss, translation=translation)
+
+    def _df_table(self, db):
+        return dict(db._fetchall("SELECT gram, df FROM ngram_df WHERE df > 0"))
+
+    def test_char_ngrams_are_padded_and_folded(self):
+        assert relevance.char_ngrams("Ab") == {"\x02ab": 1, "ab\x03": 1}
+        assert relevance.char_ngrams("  ") == {}
+        assert relevance.char_ngrams("aa  aa")["aa "] == 1
+
+    def test_cosine_top_k(self):
+        query = {1: 1.0, 2: 1.0}
+        docs = {10: {1: 1.0, 2: 1.0}, 11: {1: 1.0, 3: 1.0}, 12: {3: 1.0}}
+        ranked = relevance.cosine_top_k(query, docs, 5)
+        assert [entry_id for entry_id, _ in ranked] == [10, 11]
+        assert math.isclose(ranked[0][1], 1.0)
+        assert math.isclose(ranked[1][1], 0.5)
+
+    def test_ranks_by_similarity(self, tmp_db):
+        a = self._add(tmp_db, "A", "ŋa˧ tə˥ tɕʰi˥ fan˨˩", "1SG CLF eat rice", "I eat rice")
+        self._add(tmp_db, "B", "ŋa˧ tə˥ tɕʰi˥ fan˨˩ lə", "1SG CLF eat rice PFV", "I ate rice")
+        self._add(tmp_db, "C", "ni˧ tɕʰi˥ fan˨˩", "2SG eat rice", "you eat rice")
+        self._add(tmp_db, "D", "kʰɤ˥ mu˨", "dog big", "the dog is big")
+        results = tmp_db.similar_entries(a, k=2)
+        assert [entry["example_id"] for entry, _ in results] == ["B", "C"]
+        assert 1.0 >= results[0][1] > results[1][1] > 0
+        assert tmp_db.similar_entries(9999) == []
+
+    def test_index_follows_writes(self, tmp_db):
+        a = self._add(tmp_db, "A", "ŋa˧ tə˥ tɕʰi˥")
+        b = self._add(tmp_db, "B", "ŋa˧ tə˥ tɕʰi˥")
+        c = self._add(tmp_db, "C", "so mu pɤ")
+        assert [e["id"] for e, _ in tmp_db.similar_entries(a)] == [b]
+
+        tmp_db.update_entry(entry_id=b, example_id="B", source_text="so mu pɤ",
+                            gloss="", translation="")
+        assert [e["id"] for e, _ in tmp_db.similar_entries(c)] == [b]
+        tmp_db.update_entries([a], translation="so mu pɤ")
+        assert {e["id"] for e, _ in tmp_db.similar_entries(c)} == {a, b}
+
+        tmp_db.delete_entries([b])
+        incremental = self._df_table(tmp_db)
+        with tmp_db.transaction():
+            tmp_db._sync_ngrams()
+        assert self._df_table(tmp_db) == incremental
+        assert [e["id"] for e, _ in tmp_db.similar_entries(c)] == [a]
+
+    def test_vector_round_trip(self):
+        counts = {1: 1, 2**32 - 1: 3}
+        blob = relevance.pack_vector(counts)
+        assert len(blob) == 16
+        assert relevance.unpack_vector(blob) == counts
+
+    def test_deletes_leave_no_postings_or_empty_df(self, tmp_db):
+        a = self._add(tmp_db, "A", "ŋa˧ tə˥", "1SG CLF")
+        self._add(tmp_db, "B", "ŋa˧ tə˥", "1SG CLF")
+        tmp_db.create_group("discourse", "语篇")
+        c = tmp_db.insert_entry(example_id="C", source_text="unique words", gloss="", translation="",
+                                entry_type="discourse", group_id="DSC001")
+        tmp_db.delete_entries([a])
+        tmp_db.delete_group("DSC001")
+        for table in ("ngram_postings", "ngram_vectors"):
+            ids = {row[0] for row in tmp_db._fetchall(f"SELECT DISTINCT entry_id FROM {table}")}
+            assert a not in ids and c not in ids
+        assert tmp_db._fetchone("SELECT COUNT(*) FROM ngram_df WHERE df <= 0")[0] == 0
+        assert tmp_db._fetchone("SELECT COUNT(*) FROM ngram_stale")[0] == 0
+        incremental = self._df_table(tmp_db)
+        with tmp_db.transaction():
+            tmp_db._sync_ngrams()
+        assert self._df_table(tmp_db) == incremental
+
+    def test_postings_have_no_entry_index(self, tmp_db):
+        indexes = [row[0] for row in tmp_db._fetchall(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'ngram_postings'")]
+        assert not any(name.startswith("idx_") for name in indexes)
+
+    def test_upgrade_from_entry_indexed_postings(self, tmp_path):
+        path = str(tmp_path / "v15.db")
+        db = CorpusDatabase(path)
+        a = self._add(db, "A", "ŋa˧ tə˥ tɕʰi˥")
+        b = self._add(db, "B", "ŋa˧ tə˥ tɕʰi˥ fan")
+        with db.transaction():  # recreate the v15 layout
+            db.cursor.execute("DROP TABLE ngram_vectors")
+            db.cursor.execute("CREATE INDEX idx_ngram_postings_entry ON ngram_postings(entry_id)")
+            db.cursor.execute("UPDATE schema_version SET version = 15")
+        db.close()
+
+        db = CorpusDatabase(path)
+        try:
+            assert [e["id"] for e, _ in db.similar_entries(a)] == [b]
+            assert db._fetchone("SELECT COUNT(*) FROM ngram_vectors")[0] == 2
+            assert db._fetchone(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_ngram_postings_entry'")[0] == 0
+        finally:
+            db.close()
@@ -0,0 +1,251 @@
+"""Tests for sync.py - two-way sync between corpus files."""
+import re
+import sqlite3
+
+import pytest
+
+import sync
+from database import CorpusDatabase
+
+
+def _add(db, example_id, source_text="ŋa˧", **fields):
+    return db.insert_entry(example_id=example_id, source_text=source_text,
+                           gloss="g", translation="t", **fields)
+
+
+def _contents(db):
+    """{uid: entry dict without local ids} for comparing two files."""
+    rows = db._fetchall("SELECT uid, id FROM corpus")
+    result = {}
+    for uid, entry_id in rows:
+        entry = db.get_entry(entry_id).to_dict()
+        entry.pop("id")
+        result[uid] = entry
+    return result
+
+
+@pytest.fixture
+def peer(tmp_db, tmp_path):
+    """A second corpus file created as a copy of tmp_db (shared uids)."""
+    _add(tmp_db, "A", "ŋa˧ tə˥")
+    _add(tmp_db, "B", "ni˧ kʰɤ˥")
+    _add(tmp_db, "C", "so˥˧ mu˨", entry_type="dialogue", group_id="DLG001",
+         group_name="对话一", speaker="甲", turn_number=1)
+    path = str(tmp_path / "peer.db")
+    tmp_db.backup_to(path)
+    db = CorpusDatabase(path)
+    yield db
+    db.close()
+
+
+def _uid(db, example_id):
+    return db._fetchone("SELECT uid FROM corpus WHERE example_id = ?", (example_id,))[0]
+
+
+def _id(db, example_id):
+    return db._fetchone("SELECT id FROM corpus WHERE example_id = ?", (example_id,))[0]
+
+
+class TestPlan:
+    """Diff rules on digests alone."""
+
+    def test_rules(self):
+        local = {"same": ("t1", b"x"), "newer_here": ("t5", b"a"), "older_here": ("t1", b"a"),
+                 "only_here": ("t3", b"n"), "deleted_there": ("t2", b"d"),
+                 "edited_after_delete": ("t9", b"e")}
+        remote = {"same": ("t1", b"x"), "newer_here": ("t2", b"b"), "older_here": ("t4", b"b"),
+                  "only_there": ("t1", b"m")}
+        remote_tombstones = {"deleted_there": "t3", "edited_after_delete": "t3"}
+        report = sync.plan(local, remote, {}, remote_tombstones)
+        assert report.unchanged == 1
+        assert report.conflicts == 2
+        assert report.push_updates == ["newer_here"]
+        assert report.pull_updates == ["older_here"]
+        assert sorted(report.push_inserts) == ["edited_after_delete", "only_here"]
+        assert report.pull_deletes == ["deleted_there"]
+        assert report.pull_inserts == ["only_there"]
+
+    def test_direction_filters_writes(self):
+        local, remote = {"a": ("t1", b"a")}, {"b": ("t1", b"b")}
+        pull = sync.plan(local, remote, {}, {}, "pull")
+        assert pull.pull_inserts == ["b"] and pull.push_inserts == []
+        push = sync.plan(local, remote, {}, {}, "push")
+        assert push.push_inserts == ["a"] and push.pull_inserts == []
+        with pytest.raises(ValueError):
+            sync.plan(local, remote, {}, {}, "sideways")
+
+    def test_tie_on_timestamp_is_decided_the_same_way_on_both_sides(self):
+        a, b = {"x": ("t1", b"a")}, {"x": ("t1", b"b")}
+        assert sync.plan(a, b, {}, {}).pull_updates == ["x"]
+        assert sync.plan(b, a, {}, {}).push_updates == ["x"]
+
+    def test_timestamps_compare_across_formats(self):
+        # trigger tombstones carry milliseconds; older updated_at values carry microseconds
+        local = {"x": ("2026-01-01T00:00:00.123456+00:00", b"a"),
+                 "y": ("2026-01-01T00:00:00+00:00", b"b")}
+        tombstones = {"x": "2026-01-01T00:00:00.123+00:00", "y": "2026-01-01T00:00:00.001+00:00"}
+        report = sync.plan(local, {}, {}, tombstones)
+        assert sorted(report.pull_deletes) == ["x", "y"]
+        assert sync.timestamp_key("2026-01-01T08:00:00.5+08:00") == "2026-01-01T00:00:00.500"
+
+
+class TestSync:
+    """CorpusDatabase primitives driven by sync.sync."""
+
+    def test_copies_have_matching_uids(self, tmp_db, peer):
+        assert tmp_db.get_sync_digests() == peer.get_sync_digests()
+        report = sync.sync(tmp_db, peer)
+        assert report.total_changes == 0 and report.unchanged == 3
+
+    def test_two_way_merge(self, tmp_db, peer):
+        _add(tmp_db, "L1", "local new")
+        _add(peer, "R1", "remote new", tags="已审核")
+        tmp_db.update_entries([_id(tmp_db, "A")], translation="local edit")
+        peer.update_entries([_id(peer, "B")], translation="remote edit")
+
+        report = sync.sync(tmp_db, peer)
+        assert (len(report.pull_inserts), len(report.push_inserts)) == (1, 1)
+        assert (len(report.pull_updates), len(report.push_updates)) == (1, 1)
+        assert _contents(tmp_db) == _contents(peer)
+        # derived data follows synced rows
+        assert [e["example_id"] for e in tmp_db.search_entries("source_text", "remote")] == ["R1"]
+        assert tmp_db.get_entries_by_tags(["已审核"])[0]["example_id"] == "R1"
+        assert sync.sync(tmp_db, peer).total_changes == 0
+
+    def test_dry_run_writes_nothing(self, tmp_db, peer):
+        _add(peer, "R1")
+        before = tmp_db.get_sync_digests()
+        report = sync.sync(tmp_db, peer, dry_run=True)
+        assert report.dry_run and len(report.pull_inserts) == 1
+        assert "预览" in report.summary()
+        assert tmp_db.get_sync_digests() == before
+
+    def test_newer_edit_wins(self, tmp_db, peer):
+        tmp_db.update_entries([_id(tmp_db, "A")], translation="older")
+        tmp_db.connection.execute("UPDATE corpus SET updated_at = '2000-01-01T00:00:00.000+00:00'")
+        tmp_db.connection.commit()
+        peer.update_entries([_id(peer, "A")], translation="newer")
+        report = sync.sync(tmp_db, peer)
+        assert report.conflicts == 1 and report.pull_updates == [_uid(tmp_db, "A")]
+        assert tmp_db.get_entry(_id(tmp_db, "A"))["translation"] == "newer"
+
+    def test_deletes_propagate_unless_edited_later(self, tmp_db, peer):
+        uid_a, uid_b = _uid(tmp_db, "A"), _uid(tmp_db, "B")
+        peer.delete_entries([_id(peer, "A"), _id(peer, "B")])
+        tmp_db.update_entries([_id(tmp_db, "B")], translation="edited after delete")
+        report = sync.sync(tmp_db, peer)
+        assert report.pull_deletes == [uid_a]
+        assert report.push_inserts == [uid_b]
+        assert _contents(tmp_db) == _contents(peer)
+        assert tmp_db.get_tombstones().keys() == peer.get_tombstones().keys() == {uid_a}
+
+    def test_delete_and_edit_in_the_same_millisecond(self, tmp_db, peer):
+        uid = _uid(tmp_db, "A")
+        peer.delete_entries([_id(peer, "A")])
+        deleted_at = peer.get_tombstones()[uid]
+        tmp_db.update_entries([_id(tmp_db, "A")], translation="same millisecond")
+        tmp_db.connection.execute("UPDATE corpus SET updated_at = ? WHERE uid = ?",
+                                  (deleted_at, uid))
+        tmp_db.connection.commit()
+        assert sync.sync(tmp_db, peer).pull_deletes == [uid]
+        assert tmp_db._fetchone("SELECT 1 FROM corpus WHERE uid = ?", (uid,)) is None
+
+    def test_written_timestamps_match_trigger_format(self, tmp_db, peer):
+        peer.delete_entries([_id(peer, "B")])
+        updated_at = tmp_db.get_entry(_id(tmp_db, "A"))["updated_at"]
+        deleted_at = next(iter(peer.get_tombstones().values()))
+        pattern = r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}\+00:00"
+        assert re.fullmatch(pattern, updated_at) and re.fullmatch(pattern, deleted_at)
+
+    def test_groups_follow_uid_not_code(self, tmp_db, peer):
+        local_code = tmp_db.create_group("dialogue", "本地")
+        remote_code = peer.create_group("dialogue", "对方")
+        assert local_code == remote_code == "DLG002"
+        _add(tmp_db, "L", entry_type="dialogue", group_id=local_code)
+        _add(peer, "R", entry_type="dialogue", group_id=remote_code)
+        peer.rename_group("DLG001", "改名")
+
+        report = sync.sync(tmp_db, peer)
+        assert len(report.pull_group_renames) == 1
+        assert tmp_db.get_entries_by_group("DLG001")[0]["group_name"] == "改名"
+        # the incoming group kept its name and got a free code
+        groups = {g["group_id"]: g["group_name"] for g in tmp_db.get_groups_by_type("dialogue")}
+        assert groups == {"DLG001": "改名", "DLG002": "本地", "DLG003": "对方"}
+        assert tmp_db.get_entries_by_group("DLG003")[0]["example_id"] == "R"
+        assert sync.sync(tmp_db, peer).total_changes == 0
+
+    def test_sync_files(self, tmp_db, peer):
+        _add(peer, "R1")
+        tmp_db.close()
+        peer.close()
+        report = sync.sync_files(tmp_db.db_path, peer.db_path, direction="pull")
+        assert len(report.pull_inserts) == 1
+        with pytest.raises(ValueError):
+            sync.sync_files(tmp_db.db_path, tmp_db.db_path)
+        with pytest.raises(FileNotFoundError):
+            sync.sync_files(tmp_db.db_path, peer.db_path + ".missing")
+
+    def test_sync_files_preview_leaves_both_files_untouched(self, tmp_db, tmp_path):
+        _add(tmp_db, "L1")
+        tmp_db.close()
+        old = tmp_path / "old.db"
+        conn = sqlite3.connect(old)
+        conn.execute("CREATE TABLE corpus (id INTEGER PRIMARY KEY, example_id TEXT, "
+                     "source_text TEXT, gloss TEXT, translation TEXT)")
+        conn.executemany("INSERT INTO corpus (example_id) VALUES (?)", [("O1",), ("O2",)])
+        conn.commit()
+        conn.close()
+
+        def snapshot():
+            # -shm only holds reader marks; readers of a WAL database always update it
+            return {path.name: (path.read_bytes(), path.stat().st_mtime_ns)
+                    for path in tmp_path.iterdir() if not path.name.endswith("-shm")}
+
+        before = snapshot()
+        report = sync.sync_files(tmp_db.db_path, str(old), dry_run=True)
+        assert report.dry_run
+        assert len(report.pull_inserts) == 2 and len(report.push_inserts) == 1
+        assert snapshot() == before
+
+
+class TestUids:
+    """Stable row identity maintained by triggers."""
+
+    def test_every_insert_path_gets_a_unique_uid(self, tmp_db, sample_entries):
+        _add(tmp_db, "A")
+        tmp_db.bulk_import(sample_entries)
+        tmp_db.cursor.execute("INSERT INTO corpus (example_id) VALUES ('raw')")
+        uids = [row[0] for row in tmp_db._fetchall("SELECT uid FROM corpus")]
+        assert None not in uids and len(set(uids)) == len(uids) == len(sample_entries) + 2
+
+    def test_group_rename_updates_timestamp(self, tmp_db):
+        code = tmp_db.create_group("discourse", "旧")
+        before = tmp_db._fetchone("SELECT uid, updated_at FROM groups WHERE code = ?", (code,))
+        assert before[0] and before[1]
+        tmp_db.connection.execute(
+            "UPDATE groups SET updated_at = '2000-01-01' WHERE code = ?", (code,))
+        tmp_db.rename_group(code, "新")
+        after = tmp_db._fetchone("SELECT uid, updated_at FROM groups WHERE code = ?", (code,))
+        assert after[0] == before[0] and after[1] > "2000-01-01"
+
+    def test_migration_backfills_uids(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE corpus (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        example_id TEXT, source_text TEXT, gloss TEXT, translation TEXT,
+                        notes TEXT, entry_type TEXT, group_id TEXT, group_name TEXT, speaker TEXT,
+                        turn_number INTEGER)""")
+        conn.executemany(
+            "INSERT INTO corpus (example_id, source_text, entry_type, group_id) VALUES (?, 'a', ?, ?)",
+            [("E1", "discourse", "DSC001"), ("E2", "sentence", "")])
+        conn.commit()
+        conn.close()
+
+        db = CorpusDatabase(path)
+        try:
+            assert len(db.get_sync_digests()) == 2
+            assert [uid for uid in db.get_sync_groups()][0]
+            db.delete_entries([1])
+            assert len(db.get_tombstones()) == 1
+        finally:
+            db.close()
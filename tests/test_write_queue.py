@@ -0,0 +1,121 @@
+"""Tests for write_queue.py - write-behind queue for interactive edits."""
+import threading
+
+import pytest
+
+from database import CorpusDatabase
+from write_queue import WriteBehindQueue
+
+
+def _entry(i):
+    return {"example_id": f"Q{i}", "source_text": f"ŋa˧ {i}", "gloss": "g", "translation": "t"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "queue.db")
+    CorpusDatabase(path).close()
+    return path
+
+
+class TestWriteBehindQueue:
+    """Coalesced background writes with callbacks and flush-on-close."""
+
+    def test_writes_land_after_flush(self, db_path):
+        batches = []
+        wq = WriteBehindQueue(db_path, on_batch_written=batches.append)
+        try:
+            tickets = [wq.submit("insert_entry", **_entry(i)) for i in range(20)]
+            assert wq.flush(timeout=10)
+            assert wq.pending == 0
+        finally:
+            wq.close()
+        results = dict(pair for batch in batches for pair in batch)
+        assert sorted(results) == tickets
+        db = CorpusDatabase(db_path)
+        assert db.get_count() == 20
+        assert sorted(results.values()) == [e["id"] for e in db.get_all_entries()]
+        db.close()
+
+    def test_rapid_submits_are_grouped_into_few_transactions(self, db_path):
+        batches = []
+        wq = WriteBehindQueue(db_path, on_batch_written=batches.append, delay=0.2)
+        try:
+            for i in range(50):
+                wq.submit("insert_entry", **_entry(i))
+        finally:
+            wq.close()
+        assert sum(len(batch) for batch in batches) == 50
+        assert len(batches) <= 3
+
+    def test_batch_size_limits_transaction(self, db_path):
+        batches = []
+        wq = WriteBehindQueue(db_path, on_batch_written=batches.append, batch_size=5, delay=0.2)
+        try:
+            for i in range(12):
+                wq.submit("insert_entry", **_entry(i))
+        finally:
+            wq.close()
+        assert max(len(batch) for batch in batches) <= 5
+
+    def test_failed_operation_is_isolated(self, db_path):
+        errors = []
+        batches = []
+        wq = WriteBehindQueue(db_path, on_batch_written=batches.append,
+                              on_error=lambda ticket, message: errors.append(ticket), delay=0.2)
+        try:
+            first = wq.submit("insert_entry", **_entry(1))
+            bad = wq.submit("update_entries", [1], bogus="x")
+            last = wq.submit("insert_entry", **_entry(2))
+        finally:
+            wq.close()
+        assert errors == [bad]
+        assert sorted(t for batch in batches for t, _ in batch) == [first, last]
+        db = CorpusDatabase(db_path)
+        assert db.get_count() == 2
+        db.close()
+
+    def test_close_flushes_pending_writes(self, db_path):
+        wq = WriteBehindQueue(db_path, delay=0.5)
+        for i in range(5):
+            wq.submit("insert_entry", **_entry(i))
+        assert wq.close(timeout=10)
+        db = CorpusDatabase(db_path)
+        assert db.get_count() == 5
+        db.close()
+        with pytest.raises(RuntimeError):
+            wq.submit("insert_entry", **_entry(9))
+
+    def test_operations_run_in_submission_order(self, db_path):
+        wq = WriteBehindQueue(db_path)
+        try:
+            wq.submit("insert_entry", **_entry(1))
+            wq.submit("update_entries", [1], speaker="A")
+            wq.submit("update_entries", [1], speaker="B")
+        finally:
+            wq.close()
+        db = CorpusDatabase(db_path)
+        assert db.get_entry(1)["speaker"] == "B"
+        db.close()
+
+    def test_callbacks_run_on_writer_thread(self, db_path):
+        threads = []
+        wq = WriteBehindQueue(db_path, on_batch_written=lambda _: threads.append(threading.get_ident()))
+        try:
+            wq.submit("insert_entry", **_entry(1))
+            wq.flush()
+        finally:
+            wq.close()
+        assert threads and threads[0] != threading.get_ident()
+
+    def test_rejects_non_write_methods(self, db_path):
+        wq = WriteBehindQueue(db_path)
+        try:
+            with pytest.raises(ValueError):
+                wq.submit("get_all_entries")
+        finally:
+            wq.close()
+
+    def test_memory_database_rejected(self):
+        with pytest.raises(ValueError):
+            WriteBehindQueue(":memory:")
@@ -54,7 +54,9 @@ class AICoordinatorMixin:
 
         # 获取 few-shot 上下文
         context_limit = self.ai_manager.config.max_context_entries
-        context_entries = self.db.get_context_entries_for_gloss(limit=context_limit)
+        context_entries = self.db.get_context_entries_for_gloss(
+            limit=context_limit, source_text=source_text, exclude_id=self.current_entry_id
+        )
 
         # 构建 prompt
         from ai_prompts import build_gloss_prompt
@@ -119,7 +121,9 @@ class AICoordinatorMixin:
 
         # 获取 few-shot 上下文
         context_limit = self.ai_manager.config.max_context_entries
-        context_entries = self.db.get_context_entries_for_gloss(limit=context_limit)
+        context_entries = self.db.get_context_entries_for_gloss(
+            limit=context_limit, source_text=source_text, exclude_id=self.current_entry_id
+        )
 
         # 构建 prompt
         from ai_prompts import build_translation_prompt
@@ -5,13 +5,16 @@ import logging
 
 from PyQt6.QtWidgets import (
     QMessageBox, QFileDialog, QMenu, QApplication, QDialog,
-    QVBoxLayout, QHBoxLayout, QPushButton, QLabel
+    QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QProgressDialog, QListWidgetItem
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QAction
 
 logger = logging.getLogger(__name__)
 
+# 「相似条目」列表显示的条目数
+SIMILAR_ENTRIES_LIMIT = 10
+
 
 class DataOperationsMixin:
     """Mixin for CRUD data operations on corpus entries."""
@@ -65,15 +68,16 @@ class DataOperationsMixin:
                 )
                 return
 
+        args = (example_id, source_text, gloss, translation, notes,
+                source_text_cn, gloss_cn, translation_cn)
+        kwargs = dict(entry_type=entry_type, group_id=group_id, group_name=group_name, tags=tags)
+        form = self._form_snapshot(None, args, entry_type, tags)
+        if self.queue_write("insert_entry", args, kwargs, "添加成功", entry_type, form):
+            self.clear_inputs()
+            return
+
         try:
-            self.db.insert_entry(
-                example_id, source_text, gloss, translation, notes,
-                source_text_cn, gloss_cn, translation_cn,
-                entry_type=entry_type,
-                group_id=group_id,
-                group_name=group_name,
-                tags=tags
-            )
+            self.db.insert_entry(*args, **kwargs)
             QMessageBox.information(self, "成功", "语料添加成功！")
             self.clear_inputs()
             self.refresh_table()
@@ -133,15 +137,16 @@ class DataOperationsMixin:
                 )
                 return
 
+        args = (self.current_entry_id, example_id, source_text, gloss, translation, notes,
+                source_text_cn, gloss_cn, translation_cn)
+        kwargs = dict(entry_type=entry_type, group_id=group_id, group_name=group_name, tags=tags)
+        form = self._form_snapshot(self.current_entry_id, args[1:], entry_type, tags)
+        if self.queue_write("update_entry", args, kwargs, "更新成功", entry_type, form):
+            self.clear_inputs()
+            return
+
         try:
-            self.db.update_entry(
-                self.current_entry_id, example_id, source_text, gloss, translation, notes,
-                source_text_cn, gloss_cn, translation_cn,
-                entry_type=entry_type,
-                group_id=group_id,
-                group_name=group_name,
-                tags=tags
-            )
+            self.db.update_entry(*args, **kwargs)
             QMessageBox.information(self, "成功", "语料更新成功！")
             self.clear_inputs()
             self.refresh_table()
@@ -151,6 +156,65 @@ class DataOperationsMixin:
         except Exception as e:
             QMessageBox.critical(self, "错误", f"更新失败: {str(e)}")
 
+    # ---- 写后队列 ----
+
+    def queue_write(self, method: str, args: tuple, kwargs: dict,
+                    message: str, entry_type: str = None, form: dict = None) -> bool:
+        """
+        启用写后队列时提交写操作并立即返回 True；未启用时返回 False，由调用方同步写入
+
+        操作落盘后在 _on_writes_landed 中统一刷新表格和状态栏；
+        form 为提交时的表单内容（_form_snapshot），写入失败时由 _on_write_failed 填回表单。
+        """
+        if self.write_queue is None:
+            return False
+        ticket = self.write_queue.submit(method, *args, **kwargs)
+        self._pending_writes[ticket] = (message, entry_type, form)
+        self.statusBar().showMessage("正在保存...")
+        return True
+
+    def flush_pending_writes(self):
+        """等待写后队列中的操作全部落盘（直接写数据库或读取最新数据前调用）"""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def _on_writes_landed(self, results):
+        """写后队列一批操作已提交：刷新一次表格"""
+        landed = [self._pending_writes.pop(ticket) for ticket, _ in results
+                  if ticket in self._pending_writes]
+        if not landed:
+            return
+        self.refresh_table()
+        for entry_type in {t for _, t, _ in landed if t in ("discourse", "dialogue")}:
+            self.refresh_group_list(entry_type)
+        self.statusBar().showMessage(landed[-1][0], 3000)
+
+    def _on_write_failed(self, ticket: int, message: str):
+        """写后队列中的操作失败（已回滚）：把提交时的表单内容填回，避免输入丢失"""
+        _, _, form = self._pending_writes.pop(ticket, (None, None, None))
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "错误", f"保存失败: {message}")
+        self.refresh_table()
+        if form:
+            tab = self._select_tab(form['entry_type'])
+            if tab:
+                self._fill_form(tab, form)
+
+    @staticmethod
+    def _form_snapshot(entry_id, fields: tuple, entry_type: str, tags: str) -> dict:
+        """排队写入时的表单内容（键与 get_entry 一致，可直接交给 _fill_form）"""
+        names = ('example_id', 'source_text', 'gloss', 'translation', 'notes',
+                 'source_text_cn', 'gloss_cn', 'translation_cn')
+        return dict(zip(names, fields), id=entry_id, entry_type=entry_type, tags=tags)
+
+    def _pending_example_ids(self, exclude_id: int = None) -> set:
+        """写后队列中尚未落盘的新增/更新条目的例句编号（exclude_id 为正在编辑的条目）"""
+        return {
+            form['example_id'] for _, _, form in self._pending_writes.values()
+            if form and form['example_id']
+            and (exclude_id is None or form['id'] != exclude_id)
+        }
+
     def _validate_entry(self, tab, current_id: int = None) -> list:
         """验证输入，返回警告列表（不阻断保存）"""
         warnings = []
@@ -159,7 +223,8 @@ class DataOperationsMixin:
         if src_words and gls_words and len(src_words) != len(gls_words):
             warnings.append(f"词数不匹配: 原文{len(src_words)}词, 词汇分解{len(gls_words)}词")
         eid = tab.example_id_input.text().strip()
-        if eid and self.db.example_id_exists(eid, exclude_id=current_id):
+        if eid and (eid in self._pending_example_ids(exclude_id=current_id)
+                    or self.db.example_id_exists(eid, exclude_id=current_id)):
             warnings.append(f"例句编号 '{eid}' 已存在")
         if not eid:
             warnings.append("建议填写例句编号")
@@ -177,6 +242,9 @@ class DataOperationsMixin:
         )
 
         if reply == QMessageBox.StandardButton.Yes:
+            if self.queue_write("delete_entry", (self.current_entry_id,), {}, "删除成功"):
+                self.clear_inputs()
+                return
             try:
                 self.db.delete_entry(self.current_entry_id)
                 QMessageBox.information(self, "成功", "语料删除成功！")
@@ -203,6 +271,7 @@ class DataOperationsMixin:
         tab.tag_selector.clear()
         tab.validation_label.setText("")
         self._set_validation_style(tab.validation_label, False)
+        tab.similar_list.clear()
 
         self.current_entry_id = None
 
@@ -221,20 +290,61 @@ class DataOperationsMixin:
         entry = self.db.get_entry(entry_id)
 
         if entry:
-            self.current_entry_id = entry_id
-            tab.example_id_input.setText(entry['example_id'] or "")
-            tab.source_text_input.setPlainText(entry['source_text'] or "")
-            tab.gloss_input.setPlainText(entry['gloss'] or "")
-            tab.translation_input.setPlainText(entry['translation'] or "")
-            tab.notes_input.setPlainText(entry['notes'] or "")
-            tab.source_text_cn_input.setPlainText(entry.get('source_text_cn', "") or "")
-            tab.gloss_cn_input.setPlainText(entry.get('gloss_cn', "") or "")
-            tab.translation_cn_input.setPlainText(entry.get('translation_cn', "") or "")
-
-            # 加载标签
-            tags_str = entry.get('tags', '') or ''
-            tags_list = [t.strip() for t in tags_str.split(',') if t.strip()]
-            tab.tag_selector.set_tags(tags_list)
+            self._fill_form(tab, entry)
+
+    def _fill_form(self, tab, entry):
+        """把条目内容填入指定 Tab 的输入表单，并刷新相似条目列表"""
+        self.current_entry_id = entry['id']
+        tab.example_id_input.setText(entry['example_id'] or "")
+        tab.source_text_input.setPlainText(entry['source_text'] or "")
+        tab.gloss_input.setPlainText(entry['gloss'] or "")
+        tab.translation_input.setPlainText(entry['translation'] or "")
+        tab.notes_input.setPlainText(entry['notes'] or "")
+        tab.source_text_cn_input.setPlainText(entry.get('source_text_cn', "") or "")
+        tab.gloss_cn_input.setPlainText(entry.get('gloss_cn', "") or "")
+        tab.translation_cn_input.setPlainText(entry.get('translation_cn', "") or "")
+
+        # 加载标签
+        tags_str = entry.get('tags', '') or ''
+        tags_list = [t.strip() for t in tags_str.split(',') if t.strip()]
+        tab.tag_selector.set_tags(tags_list)
+
+        self.refresh_similar_entries(tab)
+
+    def refresh_similar_entries(self, tab):
+        """按当前条目刷新「相似条目」列表"""
+        tab.similar_list.clear()
+        if self.current_entry_id is None:
+            return
+        try:
+            similar = self.db.similar_entries(self.current_entry_id, k=SIMILAR_ENTRIES_LIMIT)
+        except Exception as e:
+            logger.error("相似条目查询失败: %s", e)
+            return
+        for entry, score in similar:
+            text = (entry['source_text'] or "").replace("\n", " ")
+            item = QListWidgetItem(f"{score:.0%}  {entry['example_id'] or entry['id']}  {text}")
+            item.setData(Qt.ItemDataRole.UserRole, entry['id'])
+            item.setToolTip(f"{entry['gloss'] or ''}\n{entry['translation'] or ''}")
+            tab.similar_list.addItem(item)
+
+    def open_similar_entry(self, item):
+        """打开相似条目：切换到其类型对应的 Tab 并载入表单"""
+        entry = self.db.get_entry(item.data(Qt.ItemDataRole.UserRole))
+        if not entry:
+            return
+        tab = self._select_tab(entry['entry_type'])
+        if tab:
+            self._fill_form(tab, entry)
+
+    def _select_tab(self, entry_type: str):
+        """切换到指定类型对应的 Tab（没有则保持当前 Tab），返回切换后的当前 Tab"""
+        for index in range(self.data_sub_tabs.count()):
+            tab = self.data_sub_tabs.widget(index)
+            if getattr(tab, "entry_type", None) == entry_type:
+                self.data_sub_tabs.setCurrentIndex(index)
+                break
+        return self._get_current_tab()
 
     def refresh_table(self):
         """刷新数据表格（根据当前Tab显示对应类型的数据）"""
@@ -299,9 +409,36 @@ class DataOperationsMixin:
                     reader = csv.DictReader(f)
                     entries = list(reader)
 
-            count = self.db.import_from_list(entries)
-            logger.info("导入完成: %d 条, 来源: %s", count, file_path)
-            QMessageBox.information(self, "导入成功", f"成功导入 {count} 条语料！")
+            progress = QProgressDialog("正在导入语料...", None, 0, len(entries), self)
+            progress.setWindowTitle("导入")
+            progress.setWindowModality(Qt.WindowModality.WindowModal)
+            progress.setMinimumDuration(500)
+
+            def on_progress(done, total):
+                progress.setValue(done)
+                QApplication.processEvents()
+
+            self.flush_pending_writes()
+            try:
+                result = self.db.bulk_import(entries, progress_callback=on_progress)
+            finally:
+                progress.close()
+
+            count = result.imported
+            logger.info("导入完成: %d 条, 失败 %d 条, 来源: %s",
+                        count, len(result.failed), file_path)
+            if result.failed:
+                details = "\n".join(
+                    f"第 {index + 1} 条: {error}" for index, error in result.failed[:10]
+                )
+                if len(result.failed) > 10:
+                    details += f"\n... 共 {len(result.failed)} 条失败"
+                QMessageBox.warning(
+                    self, "部分导入成功",
+                    f"成功导入 {count} 条语料，{len(result.failed)} 条失败：\n\n{details}"
+                )
+            else:
+                QMessageBox.information(self, "导入成功", f"成功导入 {count} 条语料！")
             self.refresh_table()
             self.statusBar().showMessage(f"导入成功: {count} 条", 3000)
 
@@ -399,10 +536,8 @@ class DataOperationsMixin:
                     entry_id = int(data_table.item(row, COL_ID).text())
                     entry_ids.append(entry_id)
 
-                deleted_count = 0
-                for entry_id in entry_ids:
-                    if self.db.delete_entry(entry_id):
-                        deleted_count += 1
+                self.flush_pending_writes()
+                deleted_count = self.db.delete_entries(entry_ids)
 
                 QMessageBox.information(
                     self,
@@ -444,6 +579,7 @@ class DataOperationsMixin:
                 QMessageBox.warning(self, "提示", "请至少选择一个标签！")
                 return
 
+            self.flush_pending_writes()
             if mode == 'add':
                 count = self.db.batch_update_tags(entry_ids, add_tags=tags)
             else:
@@ -1,12 +1,16 @@
 """对话框混入 - DialogsMixin"""
-import os
 import logging
+import os
 from datetime import datetime
 
-from PyQt6.QtWidgets import QMessageBox, QDialog
+from PyQt6.QtWidgets import QMessageBox, QDialog, QProgressDialog, QFileDialog
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QTextDocument
 from PyQt6.QtPrintSupport import QPrintDialog, QPrinter
 
+import backup
+import sync
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,7 +32,8 @@ class DialogsMixin:
     def open_duplicate_detection(self):
         """打开去重检测对话框"""
         from gui import DuplicateDetectionDialog
-        dialog = DuplicateDetectionDialog(self, self.db, self.theme_manager)
+        dialog = DuplicateDetectionDialog(self, self.db, self.theme_manager,
+                                          flush_writes=self.flush_pending_writes)
         dialog.exec()
         self.refresh_table()
 
@@ -42,35 +47,137 @@ class DialogsMixin:
             self.apply_fonts()
             QMessageBox.information(self, "成功", "字体设置已应用！")
 
+    def start_backup_worker(self, task, on_finished, on_error, progress_label=None):
+        """
+        在后台线程执行备份类任务
+
+        Args:
+            task: task(progress_callback, cancel_event)，见 DatabaseWorkerThread
+            on_finished: 成功回调，参数为 task 的返回值
+            on_error: 失败回调，参数为错误信息
+            progress_label: 进度对话框文字，None 表示不显示进度对话框（仅状态栏）
+        """
+        from ui.workers import DatabaseWorkerThread
+
+        worker = DatabaseWorkerThread(task, self)
+        if progress_label:
+            dialog = QProgressDialog(progress_label, None, 0, 0, self)
+            dialog.setWindowTitle("请稍候")
+            dialog.setWindowModality(Qt.WindowModality.WindowModal)
+            dialog.setMinimumDuration(500)
+            dialog.setAutoClose(False)
+            dialog.setAutoReset(False)
+
+            def on_progress(done, total):
+                dialog.setMaximum(total)
+                dialog.setValue(done)
+
+            worker.progress_signal.connect(on_progress)
+            worker.finished.connect(dialog.close)
+        else:
+            worker.progress_signal.connect(
+                lambda done, total: self.statusBar().showMessage(
+                    f"正在备份数据库... {done * 100 // max(total, 1)}%"
+                )
+            )
+        worker.finished_signal.connect(on_finished)
+        worker.error_signal.connect(on_error)
+        worker.finished.connect(lambda: self._backup_workers.remove(worker))
+        self._backup_workers.append(worker)
+        worker.start()
+        return worker
+
+    def wait_for_backup_workers(self):
+        """等待所有后台备份任务结束（关闭数据库前调用）"""
+        for worker in list(self._backup_workers):
+            worker.wait()
+
     def manual_backup(self):
-        """手动备份数据库"""
-        try:
-            backup_path = self.db.create_backup()
+        """手动备份数据库（后台线程在线备份）"""
+        def on_finished(info):
+            kind = "完整快照" if info.is_base else "增量快照"
             QMessageBox.information(
                 self, "备份成功",
-                f"数据库已备份到:\n{backup_path}"
+                f"已创建{kind}: {info.snapshot_id}\n"
+                f"变化页: {info.changed_pages}/{info.page_count}，"
+                f"新增存储: {info.stored_bytes / 1024:.1f} KB\n\n"
+                f"备份目录:\n{backup.DEFAULT_BACKUP_DIR}"
             )
             self.statusBar().showMessage("数据库备份完成", 3000)
-        except Exception as e:
-            logger.error("手动备份失败: %s", e)
-            QMessageBox.critical(self, "备份失败", f"备份过程中发生错误:\n{str(e)}")
+
+        def on_error(message):
+            logger.error("手动备份失败: %s", message)
+            QMessageBox.critical(self, "备份失败", f"备份过程中发生错误:\n{message}")
+
+        self.flush_pending_writes()
+        db = self.db
+        self.start_backup_worker(
+            lambda progress, cancel: db.create_backup(progress),
+            on_finished, on_error, progress_label="正在备份数据库...",
+        )
+
+    def sync_database(self):
+        """与另一个数据库文件双向同步（后台线程先预览差异，确认后写入两边）"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择要同步的数据库", os.path.dirname(self.db.db_path),
+            "数据库文件 (*.db);;所有文件 (*)"
+        )
+        if not file_path:
+            return
+        local_path = self.db.db_path
+
+        def on_error(message):
+            logger.error("数据库同步失败: %s", message)
+            QMessageBox.critical(self, "同步失败", f"同步过程中发生错误:\n{message}")
+
+        def on_synced(report):
+            self.refresh_table()
+            self.update_status_bar()
+            QMessageBox.information(self, "同步完成", report.summary())
+
+        def on_previewed(report):
+            if not report.total_changes:
+                QMessageBox.information(self, "同步", "两个数据库内容一致，无需同步。")
+                return
+            reply = QMessageBox.question(
+                self, "确认同步",
+                f"{report.summary()}\n\n同步会同时修改两个数据库，是否继续？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            self.flush_pending_writes()
+            self.start_backup_worker(
+                lambda progress, cancel: sync.sync_files(local_path, file_path,
+                                                         progress_callback=progress),
+                on_synced, on_error, progress_label="正在同步数据库...",
+            )
+
+        self.flush_pending_writes()
+        self.start_backup_worker(
+            lambda progress, cancel: sync.sync_files(local_path, file_path, dry_run=True),
+            on_previewed, on_error, progress_label="正在比较数据库...",
+        )
 
     def auto_backup_on_startup(self):
-        """启动时自动备份（每天最多一次）"""
-        backup_dir = os.path.join(os.path.expanduser("~"), ".fieldnote", "backups")
-        today = datetime.now().strftime("%Y%m%d")
+        """启动时自动备份（每天最多一次，后台线程执行，不阻塞窗口）"""
         # 检查今日是否已备份
-        if os.path.isdir(backup_dir):
-            import glob as glob_std
-            today_backups = glob_std.glob(os.path.join(backup_dir, f"corpus_{today}_*.db"))
-            if today_backups:
-                return  # 今日已有备份
-        try:
-            backup_path = self.db.create_backup()
-            self.statusBar().showMessage(f"自动备份完成: {os.path.basename(backup_path)}", 5000)
-            logger.info("启动自动备份完成: %s", backup_path)
-        except Exception as e:
-            logger.error("启动自动备份失败: %s", e)
+        latest = backup.SnapshotStore().latest(source=self.db.db_path)
+        if latest and latest.created_at.startswith(datetime.now().date().isoformat()):
+            return  # 今日已有备份
+
+        def on_finished(info):
+            self.statusBar().showMessage(f"自动备份完成: {info.snapshot_id}", 5000)
+            logger.info("启动自动备份完成: %s", info.snapshot_id)
+
+        def on_error(message):
+            self.statusBar().clearMessage()
+            logger.error("启动自动备份失败: %s", message)
+
+        db = self.db
+        self.start_backup_worker(
+            lambda progress, cancel: db.create_backup(progress), on_finished, on_error
+        )
 
     def check_database_integrity(self):
         """数据库完整性检查"""
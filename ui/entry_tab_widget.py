@@ -2,7 +2,7 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QLineEdit, QTextEdit, QTableWidget,
-    QGroupBox, QFormLayout, QCheckBox, QComboBox, QApplication,
+    QGroupBox, QFormLayout, QCheckBox, QComboBox, QApplication, QListWidget,
 )
 from PyQt6.QtCore import Qt
 
@@ -35,6 +35,7 @@ class EntryTabWidget(QWidget):
         self.data_include_chinese: QCheckBox = None
         self.validation_label: QLabel = None
         self.group_combo: QComboBox = None
+        self.similar_list: QListWidget = None
 
         self._build_ui()
 
@@ -191,6 +192,18 @@ class EntryTabWidget(QWidget):
         button_group_layout.addWidget(import_btn)
 
         left_layout.addWidget(button_group)
+
+        # 相似条目（加载条目后按 n-gram TF-IDF 相似度列出，双击打开）
+        similar_group = QGroupBox("相似条目")
+        similar_layout = QVBoxLayout()
+        similar_group.setLayout(similar_layout)
+        self.similar_list = QListWidget()
+        self.similar_list.setMaximumHeight(150)
+        self.similar_list.setToolTip("双击打开该条目")
+        self.similar_list.itemDoubleClicked.connect(self.main_window.open_similar_entry)
+        similar_layout.addWidget(self.similar_list)
+        left_layout.addWidget(similar_group)
+
         left_layout.addStretch()
 
         # ===== 右侧：数据列表区域 =====
@@ -1,6 +1,8 @@
 """导出管理混入 - ExportManagerMixin"""
 import csv
 import json
+import itertools
+import textwrap
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
@@ -110,10 +112,12 @@ class ExportManagerMixin:
 
         return widget
 
-    def _get_export_entries(self):
-        """获取要导出的数据（根据类型筛选）"""
-        from gui import COL_ID
+    def _get_export_entries(self, stream: bool = False):
+        """获取要导出的数据（根据类型筛选）
 
+        Args:
+            stream: 为 True 时返回按页读取的迭代器，导出大语料时不一次性载入内存
+        """
         type_map = {
             "全部类型": None,
             "单词": "word",
@@ -125,13 +129,12 @@ class ExportManagerMixin:
         selected_type = type_map[self.export_type_combo.currentText()]
 
         if self.export_selected_radio.isChecked() and self.search_table.rowCount() > 0:
-            entries = []
-            for row in range(self.search_table.rowCount()):
-                entry_id = int(self.search_table.item(row, COL_ID).text())
-                entry = self.db.get_entry(entry_id)
-                if entry:
-                    if selected_type is None or entry.get('entry_type') == selected_type:
-                        entries.append(entry)
+            entries = [
+                entry for entry in self._get_search_result_entries()
+                if selected_type is None or entry.get('entry_type') == selected_type
+            ]
+        elif stream:
+            entries = self.db.iter_entries(selected_type)
         else:
             if selected_type is None:
                 entries = self.db.get_all_entries()
@@ -579,10 +582,12 @@ class ExportManagerMixin:
 
     def export_to_csv(self):
         """导出全部语料为CSV"""
-        entries = self._get_export_entries()
-        if not entries:
+        entries = iter(self._get_export_entries(stream=True))
+        first = next(entries, None)
+        if first is None:
             QMessageBox.warning(self, "提示", "没有可导出的语料！")
             return
+        entries = itertools.chain([first], entries)
 
         file_path, _ = QFileDialog.getSaveFileName(
             self, "导出CSV", "", "CSV Files (*.csv)"
@@ -594,10 +599,12 @@ class ExportManagerMixin:
 
     def export_to_json(self):
         """导出全部语料为JSON"""
-        entries = self._get_export_entries()
-        if not entries:
+        entries = iter(self._get_export_entries(stream=True))
+        first = next(entries, None)
+        if first is None:
             QMessageBox.warning(self, "提示", "没有可导出的语料！")
             return
+        entries = itertools.chain([first], entries)
 
         file_path, _ = QFileDialog.getSaveFileName(
             self, "导出JSON", "", "JSON Files (*.json)"
@@ -608,7 +615,7 @@ class ExportManagerMixin:
         self._write_json(entries, file_path)
 
     def _write_csv(self, entries, file_path):
-        """将条目列表写入CSV文件"""
+        """将条目（列表或迭代器）逐条写入CSV文件"""
         try:
             fields = [
                 'id', 'example_id', 'source_text', 'source_text_cn',
@@ -619,25 +626,35 @@ class ExportManagerMixin:
             with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
                 writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
                 writer.writeheader()
+                count = 0
                 for entry in entries:
                     writer.writerow(entry)
+                    count += 1
             QMessageBox.information(
                 self, "导出成功",
-                f"成功导出 {len(entries)} 条语料到:\n{file_path}"
+                f"成功导出 {count} 条语料到:\n{file_path}"
             )
-            self.statusBar().showMessage(f"CSV导出成功: {len(entries)} 条", 3000)
+            self.statusBar().showMessage(f"CSV导出成功: {count} 条", 3000)
         except Exception as e:
             QMessageBox.critical(self, "导出失败", f"错误: {str(e)}")
 
     def _write_json(self, entries, file_path):
-        """将条目列表写入JSON文件"""
+        """将条目（列表或迭代器）逐条写入JSON文件，输出格式与 json.dump(indent=2) 一致"""
         try:
+            count = 0
             with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(entries, f, ensure_ascii=False, indent=2)
+                f.write("[")
+                for entry in entries:
+                    f.write(",\n" if count else "\n")
+                    f.write(textwrap.indent(
+                        json.dumps(dict(entry), ensure_ascii=False, indent=2), "  "
+                    ))
+                    count += 1
+                f.write("\n]" if count else "]")
             QMessageBox.information(
                 self, "导出成功",
-                f"成功导出 {len(entries)} 条语料到:\n{file_path}"
+                f"成功导出 {count} 条语料到:\n{file_path}"
             )
-            self.statusBar().showMessage(f"JSON导出成功: {len(entries)} 条", 3000)
+            self.statusBar().showMessage(f"JSON导出成功: {count} 条", 3000)
         except Exception as e:
             QMessageBox.critical(self, "导出失败", f"错误: {str(e)}")
@@ -1,4 +1,8 @@
 """搜索管理混入 - SearchManagerMixin"""
+import os
+import re
+import sqlite3
+
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QLineEdit, QTableWidget, QTableWidgetItem, QMessageBox,
@@ -7,6 +11,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush
 
+from database import fold_key
 from ui.widgets import TagSelectorWidget
 
 
@@ -44,6 +49,14 @@ class SearchManagerMixin:
         self.search_input.setPlaceholderText("输入搜索关键词")
         search_layout.addWidget(self.search_input)
 
+        self.search_regex_check = QCheckBox("正则")
+        self.search_regex_check.setToolTip("按 Python 正则表达式匹配，例如 ˥˧$ 或 -[a-z]+=")
+        search_layout.addWidget(self.search_regex_check)
+
+        self.search_fold_check = QCheckBox("忽略声调/变音符")
+        self.search_fold_check.setToolTip("忽略声调、变音符与大小写，例如 ta 可匹配 ta⁵⁵、tá")
+        search_layout.addWidget(self.search_fold_check)
+
         search_btn = QPushButton("搜索")
         search_btn.clicked.connect(self.search_entries)
         search_layout.addWidget(search_btn)
@@ -69,6 +82,28 @@ class SearchManagerMixin:
         tag_filter_layout.addStretch()
         layout.addWidget(tag_filter_group)
 
+        # 联合检索：只读附加其他语料库，一次检索所有库
+        federation_group = QGroupBox("联合检索")
+        federation_layout = QHBoxLayout()
+        federation_group.setLayout(federation_layout)
+
+        self.federation_label = QLabel()
+        federation_layout.addWidget(self.federation_label)
+        federation_layout.addStretch()
+
+        attach_btn = QPushButton("附加语料库...")
+        attach_btn.setToolTip("以只读方式附加其他语料库文件，检索结果标注来源语料库")
+        attach_btn.clicked.connect(self.attach_corpora)
+        federation_layout.addWidget(attach_btn)
+
+        detach_btn = QPushButton("全部移除")
+        detach_btn.clicked.connect(self.detach_corpora)
+        federation_layout.addWidget(detach_btn)
+
+        layout.addWidget(federation_group)
+        self._federated_results = None
+        self.update_federation_label()
+
         # 搜索结果表格
         self.search_table = QTableWidget()
         self.search_table.setColumnCount(11)
@@ -137,12 +172,31 @@ class SearchManagerMixin:
         # 收集选中的标签
         selected_tags = [tag for tag, cb in self.search_tag_checkboxes.items() if cb.isChecked()]
 
-        results = self.db.search_entries(
-            field, keyword, entry_type=entry_type,
-            tags=selected_tags if selected_tags else None
-        )
+        use_regex = self.search_regex_check.isChecked()
+        ignore_diacritics = self.search_fold_check.isChecked()
+        federated = bool(self.db.attached_corpora())
+        search = self.db.federated_search if federated else self.db.search_entries
+        try:
+            results = search(
+                field, keyword, use_regex=use_regex, entry_type=entry_type,
+                tags=selected_tags if selected_tags else None,
+                ignore_diacritics=ignore_diacritics
+            )
+        except re.error as e:
+            QMessageBox.warning(self, "提示", f"正则表达式无效：{e}")
+            return
+
+        # 联合检索的结果来自不同的库，行表头标注来源，导出时直接使用检索结果
+        if federated:
+            labels = [label for label, _ in results]
+            results = [entry for _, entry in results]
+            self._federated_results = results
+        else:
+            self._federated_results = None
 
         self.search_table.setRowCount(len(results))
+        if federated:
+            self.search_table.setVerticalHeaderLabels(labels)
 
         for row, entry in enumerate(results):
             self.search_table.setItem(row, COL_ID, QTableWidgetItem(str(entry['id'])))
@@ -169,10 +223,19 @@ class SearchManagerMixin:
 
         # 搜索结果高亮
         highlight = self.theme_manager.get_highlight_color()
+        normalize = fold_key if ignore_diacritics else (lambda text: text)
+        if use_regex:
+            pattern = re.compile(keyword)
+            matches = lambda text: pattern.search(normalize(text)) is not None
+        elif ignore_diacritics:
+            folded = fold_key(keyword)
+            matches = lambda text: folded in fold_key(text)
+        else:
+            matches = lambda text: keyword.lower() in text.lower()
         for row in range(self.search_table.rowCount()):
             for col in range(self.search_table.columnCount()):
                 item = self.search_table.item(row, col)
-                if item and keyword.lower() in item.text().lower():
+                if item and matches(item.text()):
                     item.setBackground(QBrush(highlight))
 
         self.search_table.resizeColumnsToContents()
@@ -184,15 +247,56 @@ class SearchManagerMixin:
         self.search_input.clear()
         self.search_type_combo.setCurrentIndex(0)
         self.search_field_combo.setCurrentIndex(0)
+        self.search_regex_check.setChecked(False)
+        self.search_fold_check.setChecked(False)
         self.search_table.setRowCount(0)
+        self._federated_results = None
         self.search_stats_label.setText("搜索结果: 0 条")
         # 清空标签筛选
         for cb in self.search_tag_checkboxes.values():
             cb.setChecked(False)
 
+    def attach_corpora(self):
+        """选择并以只读方式附加其他语料库文件"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "附加语料库", os.path.expanduser("~"),
+            "数据库文件 (*.db);;所有文件 (*)"
+        )
+        errors = []
+        for file_path in file_paths:
+            try:
+                self.db.attach_corpus(file_path)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                errors.append(f"{os.path.basename(file_path)}: {e}")
+        self.update_federation_label()
+        if errors:
+            QMessageBox.warning(self, "附加失败", "\n".join(errors))
+
+    def detach_corpora(self):
+        """移除所有附加的语料库"""
+        for source in self.db.attached_corpora():
+            self.db.detach_corpus(source.label)
+        self.update_federation_label()
+
+    def update_federation_label(self):
+        """刷新联合检索区域的已附加语料库列表（切换数据库后也需调用）"""
+        sources = self.db.attached_corpora()
+        if sources:
+            self.federation_label.setText(
+                "已附加: " + ", ".join(source.label for source in sources)
+            )
+            self.federation_label.setToolTip(
+                "\n".join(f"{source.label}: {source.path}" for source in sources)
+            )
+        else:
+            self.federation_label.setText("未附加其他语料库（仅检索当前数据库）")
+            self.federation_label.setToolTip("")
+
     def _get_search_result_entries(self) -> list:
         """获取搜索结果中的所有条目"""
         from gui import COL_ID
+        if self._federated_results is not None:
+            return list(self._federated_results)
         entries = []
         for row in range(self.search_table.rowCount()):
             item = self.search_table.item(row, COL_ID)
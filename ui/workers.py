@@ -0,0 +1,78 @@
+"""后台工作线程 - 在 QThread 中执行耗时的数据库任务"""
+import logging
+import threading
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from write_queue import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWorkerThread(QThread):
+    """
+    数据库后台任务线程，防止阻塞 UI
+
+    task 以 task(progress_callback, cancel_event) 的形式调用：
+    progress_callback(done, total) 转发为 progress_signal，
+    cancel() 置位 cancel_event，由任务自行检查并提前结束。
+    """
+    progress_signal = pyqtSignal(int, int)     # (已完成, 总数)
+    finished_signal = pyqtSignal(object)       # 任务返回值
+    error_signal = pyqtSignal(str)             # 错误信息
+    cancelled_signal = pyqtSignal()
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消任务"""
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            result = self.task(self.progress_signal.emit, self.cancel_event)
+        except Exception as e:
+            if self.cancel_event.is_set():
+                self.cancelled_signal.emit()
+                return
+            logger.error("后台任务异常: %s", e)
+            self.error_signal.emit(str(e))
+            return
+        if self.cancel_event.is_set():
+            self.cancelled_signal.emit()
+        else:
+            self.finished_signal.emit(result)
+
+
+class WriteBehindWorker(QObject):
+    """
+    写后队列的 Qt 封装：写线程的回调转发为信号，由界面线程的槽函数处理
+
+    submit() 立即返回操作编号；一批操作提交后发出 batch_written_signal，
+    单个操作失败时发出 error_signal。
+    """
+    batch_written_signal = pyqtSignal(object)  # [(操作编号, 返回值), ...]
+    error_signal = pyqtSignal(int, str)        # (操作编号, 错误信息)
+
+    def __init__(self, db_path: str, parent=None):
+        super().__init__(parent)
+        self.queue = WriteBehindQueue(
+            db_path,
+            on_batch_written=self.batch_written_signal.emit,
+            on_error=self.error_signal.emit,
+        )
+
+    def submit(self, method: str, *args, **kwargs) -> int:
+        """提交写操作，见 WriteBehindQueue.submit"""
+        return self.queue.submit(method, *args, **kwargs)
+
+    def flush(self, timeout=None) -> bool:
+        """等待已提交的操作全部写入"""
+        return self.queue.flush(timeout)
+
+    def close(self):
+        """写入全部待写操作并停止写线程"""
+        self.queue.close()
@@ -0,0 +1,174 @@
+"""
+写后队列 - 在后台写线程中合并执行交互式编辑
+
+界面线程把增删改操作提交到队列后立即返回；写线程使用独立的数据库连接，
+把短时间内连续提交的操作合并到一个事务中执行（每个操作一个 SAVEPOINT，
+单个操作失败只回滚它自己），提交后通过回调通知调用方。
+close() 会等待队列中所有操作写入完成后再停止写线程。
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from database import CorpusDatabase
+
+logger = logging.getLogger(__name__)
+
+# 一个事务最多合并的操作数
+WRITE_BATCH_SIZE = 100
+
+# 收到第一个操作后继续等待合并后续操作的时间（秒）
+COALESCE_DELAY = 0.05
+
+# 允许通过队列执行的 CorpusDatabase 写方法
+QUEUEABLE_METHODS = frozenset({
+    "insert_entry", "update_entry", "delete_entry",
+    "delete_entries", "update_entries", "batch_update_tags",
+    "delete_group", "rename_group", "bulk_import",
+})
+
+
+class WriteBehindQueue:
+    """
+    后台写线程 + 操作队列
+
+    回调均在写线程中调用：
+        on_batch_written([(ticket, 返回值), ...])：一批操作提交后调用
+        on_error(ticket, 错误信息)：某个操作失败（已回滚）时调用
+    """
+
+    def __init__(self, db_path: str,
+                 on_batch_written: Optional[Callable[[List[Tuple[int, object]]], None]] = None,
+                 on_error: Optional[Callable[[int, str], None]] = None,
+                 batch_size: int = WRITE_BATCH_SIZE, delay: float = COALESCE_DELAY):
+        if db_path == ":memory:":
+            raise ValueError("内存数据库无法在写线程中共享")
+        self.db_path = db_path
+        self.on_batch_written = on_batch_written
+        self.on_error = on_error
+        self.batch_size = max(1, batch_size)
+        self.delay = delay
+
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._next_ticket = 0
+        self._pending = 0
+        self._closed = False
+
+        self._ready = threading.Event()
+        self._open_error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._open_error is not None:
+            raise self._open_error
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未写入的操作数"""
+        with self._lock:
+            return self._pending
+
+    def submit(self, method: str, *args, **kwargs) -> int:
+        """
+        提交一个写操作，立即返回
+
+        Args:
+            method: CorpusDatabase 写方法名（见 QUEUEABLE_METHODS）
+            *args, **kwargs: 传给该方法的参数
+
+        Returns:
+            操作编号（回调中用于对应结果）
+        """
+        if method not in QUEUEABLE_METHODS:
+            raise ValueError(f"不支持排队执行的方法: {method}")
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("写后队列已关闭")
+            self._next_ticket += 1
+            ticket = self._next_ticket
+            self._pending += 1
+        self._queue.put((ticket, method, args, kwargs))
+        return ticket
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的操作全部写入（回调已执行），超时返回 False"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """写入所有已提交的操作后停止写线程；返回写线程是否已结束"""
+        with self._lock:
+            already_closed = self._closed
+            self._closed = True
+        if not already_closed:
+            self._queue.put(None)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            db = CorpusDatabase(self.db_path)
+        except Exception as e:
+            self._open_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                batch = []
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                # 合并窗口内继续取操作，凑成一个事务
+                deadline = time.monotonic() + self.delay
+                while not stopping and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    self._write_batch(db, batch)
+        finally:
+            db.close()
+
+    def _write_batch(self, db: CorpusDatabase, batch: list):
+        """在一个事务中执行一批操作，提交后回调"""
+        results = []
+        errors = []
+        try:
+            with db.transaction():
+                for ticket, method, args, kwargs in batch:
+                    try:
+                        with db.transaction():
+                            results.append((ticket, getattr(db, method)(*args, **kwargs)))
+                    except Exception as e:
+                        logger.error("写后队列操作失败 (%s): %s", method, e)
+                        errors.append((ticket, str(e)))
+        except Exception as e:
+            logger.error("写后队列提交失败: %s", e)
+            errors = [(ticket, str(e)) for ticket, *_ in batch]
+            results = []
+
+        try:
+            if results and self.on_batch_written:
+                self.on_batch_written(results)
+            if self.on_error:
+                for ticket, message in errors:
+                    self.on_error(ticket, message)
+        except Exception as e:
+            logger.error("写后队列回调异常: %s", e)
+        finally:
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()